@@ -1,29 +1,48 @@
 import http
+import http.client
+import asyncio
+import functools
+import inspect
+import weakref
+import uuid
 import json
+import base64
+import hashlib
+import gzip
+import heapq
+import random
+import ssl
+import zlib
 from langchain_core.tools import tool
 import os
 import time
-from typing import Any, Dict, List, Optional
+from typing import Annotated, Any, Dict, FrozenSet, List, Literal, Optional, Set, Tuple
 from dotenv import load_dotenv
-import requests
 from urllib.parse import quote
 import traceback
+import re
 import sqlite3
+import threading
+import atexit
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import OrderedDict
 from pydantic import BaseModel, Field
-from langchain_core.messages import BaseMessage
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, BaseMessage
-from langchain_core.messages import AIMessage
+from langchain_core.messages import AIMessage, AIMessageChunk, SystemMessage, ToolMessage, RemoveMessage
+from langchain_core.messages.utils import count_tokens_approximately
 from langsmith import utils
 from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.config import get_config
 from langgraph.graph import START, MessagesState, StateGraph, END
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langgraph.prebuilt import ToolNode, tools_condition
-from langchain.tools import StructuredTool
-import streamlit as st
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from langchain_core.runnables import RunnableLambda
+from langgraph.prebuilt import InjectedState, ToolNode, tools_condition
+from langchain_core.tools import StructuredTool
+# langchain_openai, httpx, smtplib and email.mime are imported where they are
+# first needed: together they account for most of the import time of this module
 
 load_dotenv()
 
@@ -34,16 +53,339 @@ os.environ["LANGCHAIN_PROJECT"] = os.getenv("LANGCHAIN_PROJECT")
 #LANGSMITH_ENDPOINT=os.getenv("LANGSMITH_ENDPOINT")
 
 
+###################################
+class RapidAPIClient:
+    """
+    Keep-alive HTTPS connection pool for a single RapidAPI host
+
+    Connections are reused across requests (and threads), responses may be
+    gzip-encoded, and 429/5xx responses are retried with exponential backoff
+    that honors Retry-After and the RapidAPI rate-limit headers.
+    aget_json offers the same policy to asyncio callers over an
+    httpx.AsyncClient kept per event loop.
+    """
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    # Errors meaning the server closed an idle keep-alive connection; anything
+    # else (timeouts included) goes through the counted retries with backoff
+    STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError)
+
+    def __init__(
+        self,
+        host: str,
+        headers: Dict[str, str],
+        pool_size: int = 4,
+        timeout: float = 15.0,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 10.0,
+        port: Optional[int] = None,
+        ssl_context: Optional[ssl.SSLContext] = None
+    ):
+        self.host = host
+        self.port = port
+        self.headers = {**headers, 'Accept-Encoding': 'gzip', 'Connection': 'keep-alive'}
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.ssl_context = ssl_context
+        self._lock = threading.Lock()
+        self._idle: List[http.client.HTTPSConnection] = []
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._blocked_until = 0.0
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        conn = http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=self.ssl_context)
+        return conn, False
+
+    def _release(self, conn: http.client.HTTPSConnection) -> None:
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def _retry_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                pass
+        return min(self.backoff * (2 ** attempt), self.max_backoff) * random.uniform(0.5, 1.0)
+
+    def _wait_for_rate_limit(self) -> None:
+        delay = self._blocked_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _track_rate_limit(self, headers) -> None:
+        remaining = headers.get('X-RateLimit-Requests-Remaining')
+        reset = headers.get('X-RateLimit-Requests-Reset')
+        if remaining is not None and reset is not None:
+            try:
+                if int(remaining) <= 0:
+                    with self._lock:
+                        self._blocked_until = time.monotonic() + min(float(reset), self.max_backoff)
+            except ValueError:
+                pass
+
+    @staticmethod
+    def _url(path: str, params: Optional[Dict] = None) -> str:
+        if params:
+            path += "?" + "&".join([f"{k}={quote(str(v))}" for k, v in params.items()])
+        return path
+
+    def get_json(self, path: str, params: Optional[Dict] = None) -> Dict:
+        """
+        GET a JSON document from the API
+
+        Args:
+            path: Request path, e.g. /api/v1/hotels/searchHotels
+            params: Query parameters
+
+        Returns:
+            Decoded JSON response; raises http.client.HTTPException once retries are exhausted
+        """
+        url = self._url(path, params)
+
+        attempt = 0
+        while True:
+            self._wait_for_rate_limit()
+            conn, reused = self._acquire()
+            try:
+                conn.request("GET", url, headers=self.headers)
+                res = conn.getresponse()
+                body = res.read()
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                if reused and isinstance(e, self.STALE_CONNECTION_ERRORS):
+                    # The server dropped an idle keep-alive connection; retry on another one
+                    continue
+                if attempt >= self.max_retries:
+                    raise
+                print(f"Request to {path} failed ({str(e)}), retrying...")
+                time.sleep(self._retry_delay(attempt))
+                attempt += 1
+                continue
+
+            if res.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            self._track_rate_limit(res.headers)
+
+            if res.status in self.RETRY_STATUSES and attempt < self.max_retries:
+                print(f"Request to {path} returned HTTP {res.status}, retrying...")
+                time.sleep(self._retry_delay(attempt, res.getheader('Retry-After')))
+                attempt += 1
+                continue
+
+            if res.getheader('Content-Encoding', '').lower() == 'gzip':
+                body = gzip.decompress(body)
+            if res.status >= 400:
+                raise http.client.HTTPException(f"HTTP {res.status} from {path}: {body[:200]!r}")
+            return json.loads(body.decode("utf-8"))
+
+    def _async_client(self) -> "httpx.AsyncClient":
+        import httpx
+
+        # httpx clients are bound to the loop they were first used on
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(
+                    base_url=f"https://{self.host}" + (f":{self.port}" if self.port else ""),
+                    headers=self.headers,
+                    timeout=self.timeout,
+                    verify=self.ssl_context or True,
+                    limits=httpx.Limits(max_keepalive_connections=self.pool_size)
+                )
+                self._async_clients[loop] = client
+        return client
+
+    async def aget_json(self, path: str, params: Optional[Dict] = None) -> Dict:
+        """Async variant of get_json with the same retry and rate-limit handling"""
+        import httpx
+
+        client = self._async_client()
+        url = self._url(path, params)
+
+        attempt = 0
+        while True:
+            delay = self._blocked_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                res = await client.get(url)
+            except httpx.TransportError as e:
+                if attempt >= self.max_retries:
+                    raise
+                print(f"Request to {path} failed ({str(e)}), retrying...")
+                await asyncio.sleep(self._retry_delay(attempt))
+                attempt += 1
+                continue
+
+            self._track_rate_limit(res.headers)
+
+            if res.status_code in self.RETRY_STATUSES and attempt < self.max_retries:
+                print(f"Request to {path} returned HTTP {res.status_code}, retrying...")
+                await asyncio.sleep(self._retry_delay(attempt, res.headers.get('Retry-After')))
+                attempt += 1
+                continue
+
+            # httpx decodes gzip bodies itself
+            if res.status_code >= 400:
+                raise http.client.HTTPException(f"HTTP {res.status_code} from {path}: {res.content[:200]!r}")
+            return res.json()
+
+    def close(self) -> None:
+        """Close every idle connection"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+###################################
+class HotelResultCache:
+    """
+    Short-TTL, size-bounded cache of hotel search results
+
+    Concurrent lookups for the same key are coalesced: the first caller
+    fetches from upstream and the others wait for its result, so identical
+    searches from several sessions cost a single set of API calls.
+    Results that are None or flagged partial are returned but not cached.
+    """
+    def __init__(self, ttl: float = 300.0, max_entries: int = 128):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self._inflight: Dict[Any, Future] = {}
+        self._stats = {'hits': 0, 'misses': 0, 'coalesced': 0}
+
+    def _claim(self, key):
+        # Returns (cache entry, None, False) on a hit, otherwise (None, future, leader)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry, None, False
+            self._entries.pop(key, None)
+
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self._stats['misses'] += 1
+            else:
+                self._stats['coalesced'] += 1
+            return None, future, leader
+
+    def _fail(self, key, future: Future, error: BaseException) -> None:
+        with self._lock:
+            self._inflight.pop(key, None)
+        future.set_exception(error)
+
+    def _store(self, key, future: Future, value) -> None:
+        with self._lock:
+            self._inflight.pop(key, None)
+            if value is not None and not (isinstance(value, dict) and value.get('partial')):
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        future.set_result(value)
+
+    def get_or_fetch(self, key, fetch):
+        """Return the cached value for key, calling fetch() at most once across threads on a miss"""
+        entry, future, leader = self._claim(key)
+        if entry:
+            return entry[1]
+        if not leader:
+            return future.result()
+
+        try:
+            value = fetch()
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+        self._store(key, future, value)
+        return value
+
+    async def aget_or_fetch(self, key, afetch):
+        """Async variant of get_or_fetch; coalesces with both async and threaded callers"""
+        entry, future, leader = self._claim(key)
+        if entry:
+            return entry[1]
+        if not leader:
+            return await asyncio.wrap_future(future)
+
+        try:
+            value = await afetch()
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+        self._store(key, future, value)
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss/coalesced counters since startup"""
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
 ###################################
 class HotelSearchAPI:
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        max_concurrency: int = 4,
+        timeout: float = 15.0,
+        client: Optional[RapidAPIClient] = None,
+        destination_cache: Optional["DestinationCache"] = None,
+        result_cache: Optional["HotelResultCache"] = None,
+        max_records: int = 2000
+    ):
         self.api_key = api_key
         self.base_url = "booking-com15.p.rapidapi.com"
         self.headers = {
             'X-RapidAPI-Key': api_key,
             'X-RapidAPI-Host': self.base_url
         }
+        # Per-destination searches run in parallel, bounded by max_concurrency
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.client = client or RapidAPIClient(self.base_url, self.headers, pool_size=max_concurrency + 1, timeout=timeout)
+        self.destination_cache = destination_cache or DestinationCache()
+        self.result_cache = result_cache or HotelResultCache()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="hotel-search")
+        # Legs of a batch get their own pool: each leg fans out on _executor,
+        # so sharing it could leave every worker waiting on queued work
+        self._leg_executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="hotel-legs")
+        # Full records of hotels sent to the model in compact form, by hotel_id
+        self.max_records = max_records
+        self._records: OrderedDict = OrderedDict()
+        self._records_lock = threading.Lock()
     
+    def _parse_destinations(self, city: str, data: Dict) -> List[str]:
+        dest_ids = []
+        if data.get('status') and data.get('data'):
+            # Collect all destination IDs related to the city
+            for location in data['data']:
+                # Include both city and district level destinations
+                if location.get('dest_type') in ['city', 'district']:
+                    dest_ids.append(location['dest_id'])
+                    print(f"Found {location['dest_type']} destination: {location['name']} (ID: {location['dest_id']})")
+        
+        if not dest_ids:
+            print(f"No destination IDs found for {city}")
+        return dest_ids
+
     def search_destination(self, city: str) -> list[str]:
         """
         Search for all destination IDs using city name
@@ -54,34 +396,193 @@ class HotelSearchAPI:
         Returns:
             List of dest_ids found for the city
         """
+        cached = self.destination_cache.get(city)
+        if cached:
+            print(f"Using cached destination IDs for {city}: {cached}")
+            return cached
+
         try:
-            conn = http.client.HTTPSConnection(self.base_url)
-            encoded_city = quote(city)
-            
-            conn.request("GET", f"/api/v1/hotels/searchDestination?query={encoded_city}", 
-                        headers=self.headers)
-            
-            res = conn.getresponse()
-            data = json.loads(res.read().decode("utf-8"))
-            
-            dest_ids = []
-            if data.get('status') and data.get('data'):
-                # Collect all destination IDs related to the city
-                for location in data['data']:
-                    # Include both city and district level destinations
-                    if location.get('dest_type') in ['city', 'district']:
-                        dest_ids.append(location['dest_id'])
-                        print(f"Found {location['dest_type']} destination: {location['name']} (ID: {location['dest_id']})")
-            
-            if not dest_ids:
-                print(f"No destination IDs found for {city}")
-            
+            data = self.client.get_json("/api/v1/hotels/searchDestination", {"query": city})
+            dest_ids = self._parse_destinations(city, data)
+            if dest_ids:
+                self.destination_cache.put(city, dest_ids)
             return dest_ids
             
         except Exception as e:
             print(f"Error searching destination: {str(e)}")
             return []
+
+    async def asearch_destination(self, city: str) -> List[str]:
+        """Async variant of search_destination"""
+        cached = await self.destination_cache.aget(city)
+        if cached:
+            print(f"Using cached destination IDs for {city}: {cached}")
+            return cached
+
+        try:
+            data = await self.client.aget_json("/api/v1/hotels/searchDestination", {"query": city})
+            dest_ids = self._parse_destinations(city, data)
+            if dest_ids:
+                await self.destination_cache.aput(city, dest_ids)
+            return dest_ids
+
+        except Exception as e:
+            print(f"Error searching destination: {str(e)}")
+            return []
+
+    @staticmethod
+    def _hotel_params(
+        dest_id: str,
+        arrival_date: str,
+        departure_date: str,
+        adults: int,
+        children: int = 0,
+        rooms: int = 1
+    ) -> Dict[str, str]:
+        return {
+            "dest_id": dest_id,
+            "search_type": "CITY",
+            "adults": str(adults),
+            "children_age": ",".join(['0'] * children),
+            "room_qty": str(rooms),
+            "arrival_date": arrival_date,
+            "departure_date": departure_date,
+            "units": "metric",
+            "currency_code": "AED"
+        }
+
+    @staticmethod
+    def _format_hotels(dest_id: str, data: Dict, min_rating: float = 0.0) -> List[Dict]:
+        if not data.get('status'):
+            print(f"API Error for dest_id {dest_id}: {data.get('message', 'Unknown error')}")
+            return []
+            
+        hotels = data.get('data', {}).get('hotels', [])
+        print(f"Found {len(hotels)} hotels for destination ID {dest_id}")
+        
+        # Format and filter results
+        results = []
+        for hotel in hotels:
+            property_data = hotel.get('property', {})
+            if property_data.get('reviewScore', 0) >= min_rating:
+                results.append({
+                    'hotel_id': str(hotel.get('hotel_id') or property_data.get('id') or property_data.get('name')),
+                    'name': property_data.get('name'),
+                    'rating': property_data.get('reviewScore'),
+                    'rating_word': property_data.get('reviewScoreWord'),
+                    'description': hotel.get('accessibilityLabel', ''),
+                    'image_url': property_data.get('photoUrls', [''])[0],
+                    'price': {
+                        'original': property_data.get('priceBreakdown', {}).get('strikethroughPrice', {}).get('value'),
+                        'current': property_data.get('priceBreakdown', {}).get('grossPrice', {}).get('value'),
+                        'currency': property_data.get('currency')
+                    },
+                    'location': {
+                        'latitude': property_data.get('latitude'),
+                        'longitude': property_data.get('longitude'),
+                        'distance_to_center': property_data.get('distanceFromCenter', 'N/A')
+                    }
+                })
+        return results
+
+    def search_destination_hotels(
+        self,
+        dest_id: str,
+        arrival_date: str,
+        departure_date: str,
+        adults: int,
+        children: int = 0,
+        rooms: int = 1,
+        min_rating: float = 0.0
+    ) -> List[Dict]:
+        """
+        Search for hotels in a single destination ID
+
+        Returns:
+            List of formatted hotels (unsorted); raises on network errors
+        """
+        print(f"Searching hotels for destination ID {dest_id}...")
+        params = self._hotel_params(dest_id, arrival_date, departure_date, adults, children, rooms)
+        data = self.client.get_json("/api/v1/hotels/searchHotels", params)
+        return self._format_hotels(dest_id, data, min_rating)
+
+    async def asearch_destination_hotels(
+        self,
+        dest_id: str,
+        arrival_date: str,
+        departure_date: str,
+        adults: int,
+        children: int = 0,
+        rooms: int = 1,
+        min_rating: float = 0.0
+    ) -> List[Dict]:
+        """Async variant of search_destination_hotels"""
+        print(f"Searching hotels for destination ID {dest_id}...")
+        params = self._hotel_params(dest_id, arrival_date, departure_date, adults, children, rooms)
+        data = await self.client.aget_json("/api/v1/hotels/searchHotels", params)
+        return self._format_hotels(dest_id, data, min_rating)
+
+    @staticmethod
+    def _result_key(city: str, arrival_date: str, departure_date: str, adults: int, children: int, rooms: int):
+        return (
+            DestinationCache.normalize(city), arrival_date, departure_date,
+            int(adults), int(children), int(rooms)
+        )
+
+    @staticmethod
+    def _filter_rating(results: Optional[Dict], min_rating: float) -> Optional[Dict]:
+        if results is None:
+            return None
+
+        # Results are cached unfiltered so every min_rating shares one upstream fetch
+        hotels = [hotel for hotel in results['hotels'] if (hotel['rating'] or 0) >= min_rating]
+        return {**results, 'hotels': hotels}
     
+    @staticmethod
+    def _price_key(hotel: Dict) -> float:
+        return hotel['price']['current'] if hotel['price']['current'] else float('inf')
+
+    @classmethod
+    def _sort_by_price(cls, results: Optional[Dict]) -> Optional[Dict]:
+        if results is None:
+            return None
+        return {**results, 'hotels': sorted(results['hotels'], key=cls._price_key)}
+
+    def _lookup_hotels(
+        self,
+        city: str,
+        arrival_date: str,
+        departure_date: str,
+        adults: int,
+        children: int = 0,
+        rooms: int = 1,
+        min_rating: float = 0.0
+    ) -> Optional[Dict]:
+        # Deduplicated, unsorted hotels of a city from the result cache or upstream
+        key = self._result_key(city, arrival_date, departure_date, adults, children, rooms)
+        results = self.result_cache.get_or_fetch(
+            key,
+            lambda: self._fetch_hotels(city, arrival_date, departure_date, adults, children, rooms)
+        )
+        return self._filter_rating(results, min_rating)
+
+    async def _alookup_hotels(
+        self,
+        city: str,
+        arrival_date: str,
+        departure_date: str,
+        adults: int,
+        children: int = 0,
+        rooms: int = 1,
+        min_rating: float = 0.0
+    ) -> Optional[Dict]:
+        key = self._result_key(city, arrival_date, departure_date, adults, children, rooms)
+        results = await self.result_cache.aget_or_fetch(
+            key,
+            lambda: self._afetch_hotels(city, arrival_date, departure_date, adults, children, rooms)
+        )
+        return self._filter_rating(results, min_rating)
+
     def search_hotels(
         self,
         city: str,
@@ -94,80 +595,276 @@ class HotelSearchAPI:
     ) -> Optional[Dict]:
         """
         Search for hotels in a city across all destination IDs
+
+        Returns:
+            {'hotels': [...]} with every matching hotel, cheapest first
+        """
+        return self._sort_by_price(
+            self._lookup_hotels(city, arrival_date, departure_date, adults, children, rooms, min_rating)
+        )
+
+    async def asearch_hotels(
+        self,
+        city: str,
+        arrival_date: str,
+        departure_date: str,
+        adults: int,
+        children: int = 0,
+        rooms: int = 1,
+        min_rating: float = 0.0
+    ) -> Optional[Dict]:
+        """Async variant of search_hotels; shares its result cache"""
+        return self._sort_by_price(
+            await self._alookup_hotels(city, arrival_date, departure_date, adults, children, rooms, min_rating)
+        )
+
+    def search_hotels_ranked(
+        self,
+        city: str,
+        arrival_date: str,
+        departure_date: str,
+        adults: int,
+        children: int = 0,
+        rooms: int = 1,
+        min_rating: float = 0.0,
+        top_k: int = 3
+    ) -> Dict:
+        """
+        Search for hotels in a city and return only the best options
+
+        Returns:
+            Compact payload with the `top_k` cheapest and best rated hotels;
+            full records are available from get_hotel_details by hotel_id
         """
+        leg = {'city': city, 'arrival_date': arrival_date, 'departure_date': departure_date}
+        results = self._lookup_hotels(city, arrival_date, departure_date, adults, children, rooms, min_rating)
+        return self._rank_leg(leg, results, top_k)
+
+    async def asearch_hotels_ranked(
+        self,
+        city: str,
+        arrival_date: str,
+        departure_date: str,
+        adults: int,
+        children: int = 0,
+        rooms: int = 1,
+        min_rating: float = 0.0,
+        top_k: int = 3
+    ) -> Dict:
+        """Async variant of search_hotels_ranked"""
+        leg = {'city': city, 'arrival_date': arrival_date, 'departure_date': departure_date}
+        results = await self._alookup_hotels(city, arrival_date, departure_date, adults, children, rooms, min_rating)
+        return self._rank_leg(leg, results, top_k)
+
+    def get_hotel_details(self, hotel_id: str) -> Dict:
+        """Full record (description, images, location) of a hotel from an earlier search"""
+        with self._records_lock:
+            record = self._records.get(str(hotel_id))
+            if record is not None:
+                self._records.move_to_end(str(hotel_id))
+        if record is None:
+            return {'error': f"Hotel {hotel_id} not found; search hotels again"}
+        return record
+
+    @classmethod
+    def _merge_hotels(cls, dest_ids: List[str], outcomes: List) -> Dict:
+        # A property listed under several dest_ids (city and district) is kept once, at its
+        # lowest price; merging in dest_id order keeps ties in the serial search's order
+        by_id: Dict[str, Dict] = {}
+        partial = False
+        for dest_id, outcome in zip(dest_ids, outcomes):
+            if isinstance(outcome, Exception):
+                partial = True
+                print(f"Error searching hotels for destination ID {dest_id}: {str(outcome)}")
+                continue
+            for hotel in outcome:
+                seen = by_id.get(hotel['hotel_id'])
+                if seen is None or cls._price_key(hotel) < cls._price_key(seen):
+                    by_id[hotel['hotel_id']] = hotel
+        all_results = list(by_id.values())
+        
+        if partial:
+            return {'hotels': all_results, 'partial': True}
+        return {'hotels': all_results}
+
+    def _fetch_hotels(
+        self,
+        city: str,
+        arrival_date: str,
+        departure_date: str,
+        adults: int,
+        children: int = 0,
+        rooms: int = 1
+    ) -> Optional[Dict]:
         try:
             dest_ids = self.search_destination(city)
             if not dest_ids:
                 return None
             
-            all_results = []
-            
-            # Search hotels for each destination ID
-            for dest_id in dest_ids:
-                conn = http.client.HTTPSConnection(self.base_url)
-                
-                # Build query parameters
-                params = {
-                    "dest_id": dest_id,
-                    "search_type": "CITY",
-                    "adults": str(adults),
-                    "children_age": ",".join(['0'] * children),
-                    "room_qty": str(rooms),
-                    "arrival_date": arrival_date,
-                    "departure_date": departure_date,
-                    "units": "metric",
-                    "currency_code": "AED"
-                }
-                
-                params_str = "&".join([f"{k}={quote(str(v))}" for k, v in params.items()])
-                
-                print(f"Searching hotels for destination ID {dest_id}...")
-                
-                conn.request("GET", f"/api/v1/hotels/searchHotels?{params_str}", 
-                            headers=self.headers)
-                
-                res = conn.getresponse()
-                data = json.loads(res.read().decode("utf-8"))
-                
-                if not data.get('status'):
-                    print(f"API Error for dest_id {dest_id}: {data.get('message', 'Unknown error')}")
-                    continue
-                    
-                hotels = data.get('data', {}).get('hotels', [])
-                print(f"Found {len(hotels)} hotels for destination ID {dest_id}")
-                
-                # Format and filter results
-                for hotel in hotels:
-                    property_data = hotel.get('property', {})
-                    if property_data.get('reviewScore', 0) >= min_rating:
-                        all_results.append({
-                            'name': property_data.get('name'),
-                            'rating': property_data.get('reviewScore'),
-                            'rating_word': property_data.get('reviewScoreWord'),
-                            'description': hotel.get('accessibilityLabel', ''),
-                            'image_url': property_data.get('photoUrls', [''])[0],
-                            'price': {
-                                'original': property_data.get('priceBreakdown', {}).get('strikethroughPrice', {}).get('value'),
-                                'current': property_data.get('priceBreakdown', {}).get('grossPrice', {}).get('value'),
-                                'currency': property_data.get('currency')
-                            },
-                            'location': {
-                                'latitude': property_data.get('latitude'),
-                                'longitude': property_data.get('longitude'),
-                                'distance_to_center': property_data.get('distanceFromCenter', 'N/A')
-                            }
-                        })
-            
-            # Sort results by price
-            all_results.sort(key=lambda x: x['price']['current'] if x['price']['current'] else float('inf'))
-            
-            return {'hotels': all_results}
+            # Search hotels for each destination ID concurrently
+            futures = [
+                self._executor.submit(
+                    self.search_destination_hotels,
+                    dest_id, arrival_date, departure_date, adults, children, rooms
+                )
+                for dest_id in dest_ids
+            ]
+            outcomes = []
+            for future in futures:
+                try:
+                    outcomes.append(future.result())
+                except Exception as e:
+                    outcomes.append(e)
+            return self._merge_hotels(dest_ids, outcomes)
 
         except Exception as e:
             print(f"Error searching hotels: {str(e)}")
             print(f"Full error: {traceback.format_exc()}")
             return None
 
+    async def _afetch_hotels(
+        self,
+        city: str,
+        arrival_date: str,
+        departure_date: str,
+        adults: int,
+        children: int = 0,
+        rooms: int = 1
+    ) -> Optional[Dict]:
+        try:
+            dest_ids = await self.asearch_destination(city)
+            if not dest_ids:
+                return None
+
+            # Same bounded fan-out as the thread pool, on the event loop
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            async def search(dest_id):
+                async with semaphore:
+                    return await self.asearch_destination_hotels(
+                        dest_id, arrival_date, departure_date, adults, children, rooms
+                    )
+
+            outcomes = await asyncio.gather(*(search(dest_id) for dest_id in dest_ids), return_exceptions=True)
+            return self._merge_hotels(dest_ids, outcomes)
+
+        except Exception as e:
+            print(f"Error searching hotels: {str(e)}")
+            print(f"Full error: {traceback.format_exc()}")
+            return None
+
+    @staticmethod
+    def _compact_hotel(hotel: Dict) -> Dict:
+        return {
+            'hotel_id': hotel['hotel_id'],
+            'name': hotel['name'],
+            'rating': hotel['rating'],
+            'price': hotel['price']['current'],
+            'currency': hotel['price']['currency'],
+            'distance_to_center': hotel['location']['distance_to_center'],
+            'image_url': hotel['image_url']
+        }
+
+    def _remember_records(self, hotels: List[Dict]) -> None:
+        with self._records_lock:
+            for hotel in hotels:
+                self._records[hotel['hotel_id']] = hotel
+                self._records.move_to_end(hotel['hotel_id'])
+            while len(self._records) > self.max_records:
+                self._records.popitem(last=False)
+
+    def _rank_leg(self, leg: Dict, results: Optional[Dict], top_n: int) -> Dict:
+        summary = {
+            'city': leg['city'],
+            'arrival_date': leg['arrival_date'],
+            'departure_date': leg['departure_date']
+        }
+        if not results or not results.get('hotels'):
+            return {**summary, 'error': 'No hotels found'}
+
+        # Only top_n of each ranking are needed, so heaps replace full sorts;
+        # rating ties are broken by price
+        hotels = results['hotels']
+        cheapest = heapq.nsmallest(top_n, hotels, key=self._price_key)
+        top_rated = heapq.nsmallest(
+            top_n,
+            (hotel for hotel in hotels if hotel['rating']),
+            key=lambda hotel: (-hotel['rating'], self._price_key(hotel))
+        )
+        self._remember_records(cheapest + top_rated)
+        summary.update({
+            'total_found': len(hotels),
+            'cheapest': [self._compact_hotel(hotel) for hotel in cheapest],
+            'top_rated': [self._compact_hotel(hotel) for hotel in top_rated]
+        })
+        if results.get('partial'):
+            summary['partial'] = True
+        return summary
+
+    def search_hotels_batch(
+        self,
+        legs: List[Dict],
+        adults: int,
+        children: int = 0,
+        rooms: int = 1,
+        min_rating: float = 0.0,
+        top_n: int = 3
+    ) -> Dict:
+        """
+        Search hotels for every city of a multi-city itinerary at once
+
+        Args:
+            legs: List of {'city', 'arrival_date', 'departure_date'} dicts, one per stay
+
+        Returns:
+            {'cities': [...]} in leg order, each with the `top_n` cheapest and
+            best rated hotels in compact form (see search_hotels_ranked), or an
+            'error' if nothing was found for that city
+        """
+        futures = [
+            self._leg_executor.submit(
+                self._lookup_hotels,
+                leg['city'], leg['arrival_date'], leg['departure_date'], adults, children, rooms, min_rating
+            )
+            for leg in legs
+        ]
+        cities = []
+        for leg, future in zip(legs, futures):
+            try:
+                results = future.result()
+            except Exception as e:
+                print(f"Error searching hotels in {leg['city']}: {str(e)}")
+                results = None
+            cities.append(self._rank_leg(leg, results, top_n))
+        return {'cities': cities}
+
+    async def asearch_hotels_batch(
+        self,
+        legs: List[Dict],
+        adults: int,
+        children: int = 0,
+        rooms: int = 1,
+        min_rating: float = 0.0,
+        top_n: int = 3
+    ) -> Dict:
+        """Async variant of search_hotels_batch"""
+        outcomes = await asyncio.gather(
+            *(
+                self._alookup_hotels(
+                    leg['city'], leg['arrival_date'], leg['departure_date'], adults, children, rooms, min_rating
+                )
+                for leg in legs
+            ),
+            return_exceptions=True
+        )
+        cities = []
+        for leg, outcome in zip(legs, outcomes):
+            if isinstance(outcome, Exception):
+                print(f"Error searching hotels in {leg['city']}: {str(outcome)}")
+                outcome = None
+            cities.append(self._rank_leg(leg, outcome, top_n))
+        return {'cities': cities}
+
     def format_results(self, results: Dict) -> None:
         """Print formatted hotel results"""
         if not results or not results.get('hotels'):
@@ -188,12 +885,954 @@ class HotelSearchAPI:
             print("-" * 80 + "\n")
 
 ###################################
+class SQLiteConnectionManager:
+    """
+    Shared connection pool for the SQLite databases used by the assistant
+
+    Connections are checked out by one thread at a time and returned to a
+    per-database idle pool, so concurrent sessions reuse open connections
+    instead of connecting on every tool call. Each connection runs in WAL
+    mode with a busy timeout, and schema setup runs once per database.
+    Write transactions opened with transaction() queue on a per-database
+    lock, so writers in this process never collide in SQLite's busy handler.
+    Async callers go through run_async, which runs the blocking calls on a
+    small worker pool sized to the idle pool.
+    """
+    def __init__(self, busy_timeout_ms: int = 5000, cached_statements: int = 256, max_idle: int = 8):
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle: Dict[str, List[sqlite3.Connection]] = {}
+        self._schema_setup: Dict[str, List] = {}
+        self._initialized: set = set()
+        self._write_locks: Dict[str, threading.Lock] = {}
+        self._init_locks: Dict[str, threading.Lock] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def register_schema(self, db_path: str, setup) -> None:
+        """Register a setup(conn) callable to run once before the database is first used"""
+        with self._lock:
+            self._schema_setup.setdefault(db_path, []).append(setup)
+            self._initialized.discard(db_path)
+
+    def initialize(self, db_path: Optional[str] = None) -> None:
+        """Run pending schema setup for one database, or for all registered ones"""
+        paths = [db_path] if db_path else list(self._schema_setup)
+        for path in paths:
+            # Per database, so a long migration doesn't hold up the other databases
+            with self._lock:
+                init_lock = self._init_locks.setdefault(path, threading.Lock())
+            with init_lock:
+                with self._lock:
+                    if path in self._initialized:
+                        continue
+                    setups = list(self._schema_setup.get(path, []))
+                conn = self._connect(path)
+                try:
+                    for setup in setups:
+                        setup(conn)
+                    conn.commit()
+                finally:
+                    conn.close()
+                with self._lock:
+                    self._initialized.add(path)
+
+    def _connect(self, db_path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            cached_statements=self.cached_statements,
+            check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self, db_path: str):
+        """Check out a pooled connection for the duration of a with-block"""
+        if db_path not in self._initialized:
+            self.initialize(db_path)
+
+        with self._lock:
+            idle = self._idle.get(db_path)
+            conn = idle.pop() if idle else None
+        if conn is None:
+            conn = self._connect(db_path)
+
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                idle = self._idle.setdefault(db_path, [])
+                if len(idle) < self.max_idle:
+                    idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    @contextmanager
+    def transaction(self, db_path: str):
+        """
+        Check out a pooled connection and run the with-block as one write transaction
+
+        SQLite lets one writer in at a time and a blocked writer polls with
+        growing sleeps (busy handler), which wastes most of the time when
+        many sessions book at once. Writers in this process wait on a lock
+        instead and take turns as soon as the previous commit is done.
+        """
+        with self._lock:
+            write_lock = self._write_locks.setdefault(db_path, threading.Lock())
+        with write_lock:
+            with self.connection(db_path) as conn:
+                with conn:
+                    yield conn
+
+    async def run_async(self, func, *args, **kwargs):
+        """Run a blocking database call without blocking the event loop"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_idle, thread_name_prefix="sqlite")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def close_all(self) -> None:
+        """Close every idle connection"""
+        with self._lock:
+            pools = list(self._idle.values())
+            self._idle.clear()
+        for pool in pools:
+            for conn in pool:
+                conn.close()
+
+db_manager = SQLiteConnectionManager()
+atexit.register(db_manager.close_all)
+
+###################################
+DESTINATION_CACHE_DB_PATH = "destination_cache.db"
+
+DESTINATION_CACHE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS destination_cache (
+        city_key TEXT PRIMARY KEY,
+        dest_ids TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_destination_cache_last_used ON destination_cache (last_used)",
+]
+
+def setup_destination_cache_schema(conn: sqlite3.Connection) -> None:
+    """Create the destination cache table"""
+    for statement in DESTINATION_CACHE_SCHEMA:
+        conn.execute(statement)
+
+class DestinationCache:
+    """
+    Two-tier TTL cache for city name -> dest_id lookups
+
+    An in-process LRU dict sits in front of a SQLite table, so destination IDs
+    survive restarts and repeat searches for a city skip the network entirely.
+    Keys are normalized city names; entries expire after `ttl` seconds and the
+    least recently used rows are evicted once `max_entries` is exceeded.
+    """
+    def __init__(
+        self,
+        db_path: str = DESTINATION_CACHE_DB_PATH,
+        ttl: float = 30 * 24 * 3600,
+        max_entries: int = 5000,
+        memory_entries: int = 256,
+        db: Optional[SQLiteConnectionManager] = None
+    ):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.db = db or db_manager
+        self.db.register_schema(self.db_path, setup_destination_cache_schema)
+        self._lock = threading.Lock()
+        self._memory: OrderedDict = OrderedDict()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+    @staticmethod
+    def normalize(city: str) -> str:
+        return " ".join(city.casefold().split())
+
+    def _remember(self, key: str, dest_ids: List[str], created_at: float) -> None:
+        with self._lock:
+            self._memory[key] = (dest_ids, created_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, city: str) -> Optional[List[str]]:
+        """Return cached dest_ids for a city, or None on a miss"""
+        key = self.normalize(city)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and now - entry[1] < self.ttl:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return list(entry[0])
+            self._memory.pop(key, None)
+
+        try:
+            with self.db.connection(self.db_path) as conn:
+                row = conn.execute(
+                    "SELECT dest_ids, created_at FROM destination_cache WHERE city_key = ?", (key,)
+                ).fetchone()
+                if row and now - row[1] >= self.ttl:
+                    conn.execute("DELETE FROM destination_cache WHERE city_key = ?", (key,))
+                    row = None
+                elif row:
+                    conn.execute("UPDATE destination_cache SET last_used = ? WHERE city_key = ?", (now, key))
+                conn.commit()
+        except Exception as e:
+            print(f"Error reading destination cache: {str(e)}")
+            row = None
+
+        if row is None:
+            with self._lock:
+                self._stats['misses'] += 1
+            return None
+
+        dest_ids = json.loads(row[0])
+        self._remember(key, dest_ids, row[1])
+        with self._lock:
+            self._stats['disk_hits'] += 1
+        return list(dest_ids)
+
+    def put(self, city: str, dest_ids: List[str]) -> None:
+        """Cache the dest_ids found for a city"""
+        key = self.normalize(city)
+        now = time.time()
+        self._remember(key, list(dest_ids), now)
+
+        try:
+            with self.db.connection(self.db_path) as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO destination_cache (city_key, dest_ids, created_at, last_used) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(dest_ids), now, now)
+                )
+                excess = conn.execute("SELECT COUNT(*) FROM destination_cache").fetchone()[0] - self.max_entries
+                if excess > 0:
+                    conn.execute(
+                        "DELETE FROM destination_cache WHERE city_key IN "
+                        "(SELECT city_key FROM destination_cache ORDER BY last_used LIMIT ?)",
+                        (excess,)
+                    )
+                    with self._lock:
+                        self._stats['evictions'] += excess
+                conn.commit()
+        except Exception as e:
+            print(f"Error writing destination cache: {str(e)}")
+
+    async def aget(self, city: str) -> Optional[List[str]]:
+        """Async variant of get; memory hits are answered on the event loop"""
+        key = self.normalize(city)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and time.time() - entry[1] < self.ttl:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return list(entry[0])
+        return await self.db.run_async(self.get, city)
+
+    async def aput(self, city: str, dest_ids: List[str]) -> None:
+        """Async variant of put"""
+        await self.db.run_async(self.put, city, dest_ids)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters since startup"""
+        with self._lock:
+            return dict(self._stats, memory_entries=len(self._memory))
+
+###################################
+
+# Normalized copies of the display columns. Prices are stored as text with
+# Indian digit grouping ("1 02 100"), so they are cast to integers here.
+CATALOG_NORMALIZED_COLUMNS = {
+    "price_value": "INTEGER",
+    "duration_days": "INTEGER",
+    "location_lc": "TEXT",
+    "destination_type_lc": "TEXT",
+}
+
+CATALOG_NORMALIZE_SET = """
+    price_value = CAST(NULLIF(REPLACE(REPLACE(TRIM(price), ' ', ''), ',', ''), '') AS INTEGER),
+    duration_days = CAST(NULLIF(TRIM(duration), '') AS INTEGER),
+    location_lc = LOWER(TRIM(location)),
+    destination_type_lc = LOWER(TRIM(destination_type))
+"""
+
+CATALOG_SCHEMA = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS tour_packages_normalize_insert
+    AFTER INSERT ON tour_packages
+    BEGIN
+        UPDATE tour_packages SET {CATALOG_NORMALIZE_SET} WHERE id = NEW.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS tour_packages_normalize_update
+    AFTER UPDATE OF price, duration, location, destination_type ON tour_packages
+    BEGIN
+        UPDATE tour_packages SET {CATALOG_NORMALIZE_SET} WHERE id = NEW.id;
+    END
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_tour_packages_price ON tour_packages (price_value, duration_days)",
+    "CREATE INDEX IF NOT EXISTS idx_tour_packages_duration ON tour_packages (duration_days, price_value)",
+    "CREATE INDEX IF NOT EXISTS idx_tour_packages_location ON tour_packages (location_lc, duration_days, price_value)",
+    "CREATE INDEX IF NOT EXISTS idx_tour_packages_destination_type ON tour_packages (destination_type_lc, duration_days, price_value)",
+    "CREATE INDEX IF NOT EXISTS idx_tour_packages_trip_id ON tour_packages (trip_id)",
+]
+
+# External-content FTS5 index over the free-text columns, kept in sync with
+# tour_packages by triggers (rowid = tour_packages.id)
+CATALOG_FTS_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS tour_packages_fts USING fts5(
+        package_name, location, cities_included, itinerary_data,
+        content='tour_packages', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tour_packages_fts_insert
+    AFTER INSERT ON tour_packages
+    BEGIN
+        INSERT INTO tour_packages_fts (rowid, package_name, location, cities_included, itinerary_data)
+        VALUES (NEW.id, NEW.package_name, NEW.location, NEW.cities_included, NEW.itinerary_data);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tour_packages_fts_delete
+    AFTER DELETE ON tour_packages
+    BEGIN
+        INSERT INTO tour_packages_fts (tour_packages_fts, rowid, package_name, location, cities_included, itinerary_data)
+        VALUES ('delete', OLD.id, OLD.package_name, OLD.location, OLD.cities_included, OLD.itinerary_data);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tour_packages_fts_update
+    AFTER UPDATE OF package_name, location, cities_included, itinerary_data ON tour_packages
+    BEGIN
+        INSERT INTO tour_packages_fts (tour_packages_fts, rowid, package_name, location, cities_included, itinerary_data)
+        VALUES ('delete', OLD.id, OLD.package_name, OLD.location, OLD.cities_included, OLD.itinerary_data);
+        INSERT INTO tour_packages_fts (rowid, package_name, location, cities_included, itinerary_data)
+        VALUES (NEW.id, NEW.package_name, NEW.location, NEW.cities_included, NEW.itinerary_data);
+    END
+    """,
+]
+
+# bm25 column weights: package_name, location, cities_included, itinerary_data
+CATALOG_FTS_WEIGHTS = (10.0, 5.0, 5.0, 1.0)
+
+# search_packages orderings. Every one is ascending on a single number with the
+# row id as tie-breaker, so (number, id) of the last result is a keyset cursor;
+# packages without the sorted value come last
+PACKAGE_SORTS = ("relevance", "price", "price_desc", "duration", "closest_duration")
+SEARCH_PACKAGES_LIMIT = 10
+SEARCH_PACKAGES_MAX_LIMIT = 50
+# Above this many packages the default catalog engine searches the indexed database
+# instead of scanning an in-memory copy
+CATALOG_SNAPSHOT_MAX_ROWS = int(os.getenv("CATALOG_SNAPSHOT_MAX_ROWS", "50000"))
+
+# Change counter bumped by every write to tour_packages; caches derived from
+# the catalog compare it to decide whether they are still valid
+CATALOG_VERSION_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS catalog_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )
+    """,
+    "INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)",
+    """
+    CREATE TRIGGER IF NOT EXISTS tour_packages_version_insert
+    AFTER INSERT ON tour_packages
+    BEGIN
+        UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tour_packages_version_delete
+    AFTER DELETE ON tour_packages
+    BEGIN
+        UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tour_packages_version_update
+    AFTER UPDATE OF location, trip_id, package_name, url, duration, tour_type, cities_included,
+        price, itinerary_data, destination_type, hotel ON tour_packages
+    BEGIN
+        UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+    END
+    """,
+]
+
+def migrate_catalog(conn: sqlite3.Connection) -> None:
+    """
+    Add the normalized, indexed columns to the tour_packages table
+
+    Safe to run on every startup: missing columns are added and backfilled,
+    and the triggers keep them in sync for rows written afterwards.
+    """
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(tour_packages)")}
+    added = [name for name in CATALOG_NORMALIZED_COLUMNS if name not in existing]
+    for name in added:
+        conn.execute(f"ALTER TABLE tour_packages ADD COLUMN {name} {CATALOG_NORMALIZED_COLUMNS[name]}")
+
+    fts_exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'tour_packages_fts'"
+    ).fetchone() is not None
+
+    for statement in CATALOG_SCHEMA + CATALOG_FTS_SCHEMA + CATALOG_VERSION_SCHEMA:
+        conn.execute(statement)
+
+    if added:
+        conn.execute(f"UPDATE tour_packages SET {CATALOG_NORMALIZE_SET}")
+        conn.execute("ANALYZE tour_packages")
+    if not fts_exists:
+        conn.execute("INSERT INTO tour_packages_fts (tour_packages_fts) VALUES ('rebuild')")
+    conn.commit()
+
+def build_fts_query(text: str) -> Optional[str]:
+    """
+    Turn free text into an FTS5 MATCH expression
+
+    Every word becomes a quoted prefix term, so "Ubud monkey forest" matches
+    packages mentioning all three (and "monk" still matches "monkey").
+    """
+    terms = re.findall(r"\w+", text.lower())
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+def load_packages(conn: sqlite3.Connection, packages: List[Dict]) -> int:
+    """
+    Bulk load tour packages into the catalog
+
+    Args:
+        conn: Open connection to the catalog database
+        packages: Package dicts using the tour_packages column names
+
+    Returns:
+        Number of rows inserted
+    """
+    migrate_catalog(conn)
+    rows = [
+        (
+            package.get('location'),
+            package.get('trip_id'),
+            package.get('package_name'),
+            package.get('url'),
+            str(package.get('duration', '')),
+            package.get('tour_type'),
+            '|'.join(package['cities_included']) if isinstance(package.get('cities_included'), list) else package.get('cities_included'),
+            str(package.get('price', '')),
+            package.get('itinerary_data'),
+            package.get('destination_type'),
+            package.get('hotel')
+        )
+        for package in packages
+    ]
+    with conn:
+        conn.executemany('''
+            INSERT INTO tour_packages
+            (location, trip_id, package_name, url, duration, tour_type, cities_included,
+            price, itinerary_data, destination_type, hotel)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+    return len(rows)
+
+class CatalogSnapshot:
+    """
+    In-memory copy of the tour_packages table at one catalog version
+
+    Holds the filter columns and compact summary of every package, so
+    searches don't query the database. Itineraries are most of the table's
+    size and are read one package at a time, so they stay in the database.
+    """
+    # Columns of the rows passed in, in order
+    COLUMNS = (
+        "id", "trip_id", "package_name", "price", "duration", "cities_included", "hotel", "url", "location",
+        "destination_type", "location_lc", "price_value", "duration_days", "destination_type_lc"
+    )
+
+    def __init__(self, version: int, rows: List[tuple]):
+        self.version = version
+        self._index(rows)
+        self.packages: List[Dict] = []
+        self.by_id: Dict[int, Dict] = {}
+        for (row_id, trip_id, package_name, price, duration, cities_included, hotel, url, location,
+             destination_type, location_lc, price_value, duration_days, destination_type_lc) in rows:
+            package = {
+                'id': row_id,
+                'summary': {
+                    'trip_id': trip_id,
+                    'package_name': package_name,
+                    'price': price,
+                    'duration': duration,
+                    'cities_included': cities_included.split('|') if cities_included else [],
+                    'hotel': hotel,
+                    'url': url
+                },
+                'location_lc': location_lc or '',
+                'price_value': price_value,
+                'duration_days': duration_days,
+                'destination_type_lc': destination_type_lc
+            }
+            self.packages.append(package)
+            self.by_id[row_id] = package
+
+    def _index(self, rows: List[tuple]) -> None:
+        # Distinct locations, in catalog order
+        self.locations: List[str] = []
+        seen_locations = set()
+        for row in rows:
+            location = row[8]
+            if location is not None and location not in seen_locations:
+                seen_locations.add(location)
+                self.locations.append(location)
+
+    def search(
+        self,
+        location: Optional[str] = None,
+        duration: Optional[int] = None,
+        price: Optional[float] = None,
+        destination_type: Optional[str] = None,
+        ranked: Optional[List[Tuple[int, float]]] = None,
+        sort_by: str = "price",
+        target_duration: Optional[int] = None,
+        after: Optional[Tuple[float, int]] = None,
+        limit: Optional[int] = None
+    ) -> Tuple[int, List[Dict], Optional[Tuple[float, int]]]:
+        """
+        Matching packages (same filter semantics as the SQL search), sorted and paged
+
+        Args:
+            ranked: (rowid, bm25 score) of the full-text matches, None for no query
+            sort_by: One of PACKAGE_SORTS; "relevance" needs `ranked`,
+                     "closest_duration" needs `target_duration`
+            after: Sort key of the last package of the previous page
+            limit: Page size, None for all
+
+        Returns:
+            (number of matches, page of summaries, sort key of the last package
+            of the page if more follow, else None). Summaries are copies and may
+            be modified by the caller.
+        """
+        if ranked is None:
+            candidates = self.packages
+            scores = None
+        else:
+            scores = dict(ranked)
+            candidates = [self.by_id[row_id] for row_id, _ in ranked if row_id in self.by_id]
+
+        location_lc = location.strip().lower() if location else None
+        max_price = int(price) if price is not None else None
+        days = int(duration) if duration else None
+        destination_type_lc = destination_type.strip().lower() if destination_type else None
+
+        matches = [
+            package for package in candidates
+            if (location_lc is None or location_lc in package['location_lc'])
+            and (max_price is None or (package['price_value'] is not None and package['price_value'] <= max_price))
+            and (days is None or package['duration_days'] == days)
+            and (destination_type_lc is None or package['destination_type_lc'] == destination_type_lc)
+        ]
+
+        primary = self._sort_value(sort_by, target_duration, scores)
+        keyed = [((primary(package), package['id']), package) for package in matches]
+        if after is not None:
+            keyed = [entry for entry in keyed if entry[0] > after]
+        # Only one page is needed, so a heap replaces the full sort
+        if limit:
+            page = heapq.nsmallest(limit + 1, keyed, key=lambda entry: entry[0])
+        else:
+            page = sorted(keyed, key=lambda entry: entry[0])
+        next_key = None
+        if limit and len(page) > limit:
+            page = page[:limit]
+            next_key = page[-1][0]
+
+        return len(matches), [
+            {**package['summary'], 'cities_included': list(package['summary']['cities_included'])}
+            for _, package in page
+        ], next_key
+
+    @staticmethod
+    def _sort_value(sort_by: str, target_duration: Optional[int], scores: Optional[Dict[int, float]]):
+        inf = float('inf')
+        if sort_by == "relevance":
+            return lambda package: scores[package['id']]
+        if sort_by == "price":
+            return lambda package: inf if package['price_value'] is None else package['price_value']
+        if sort_by == "price_desc":
+            return lambda package: inf if package['price_value'] is None else -package['price_value']
+        if sort_by == "duration":
+            return lambda package: inf if package['duration_days'] is None else package['duration_days']
+        if sort_by == "closest_duration":
+            return lambda package: inf if package['duration_days'] is None else abs(package['duration_days'] - target_duration)
+        raise ValueError(f"Unknown sort order: {sort_by}")
+
+class ColumnarCatalog(CatalogSnapshot):
+    """
+    Columnar variant of CatalogSnapshot whose filters run as NumPy masks
+
+    Price and duration are typed arrays, location and destination type are
+    dictionary-encoded into integer codes, and cities are split once at
+    load time. Summary dicts are only built for the rows a search returns.
+    Selected with CATALOG_ENGINE=columnar; pays off on large catalogs.
+    """
+    def __init__(self, version: int, rows: List[tuple]):
+        import numpy as np
+
+        self._np = np
+        self.version = version
+        self._index(rows)
+        columns = dict(zip(self.COLUMNS, zip(*rows))) if rows else {name: () for name in self.COLUMNS}
+
+        # Row id -> position, -1 for ids not in the catalog
+        self.row_ids = np.array(columns['id'], dtype=np.int64)
+        self.position = np.full(int(self.row_ids.max()) + 1 if len(self.row_ids) else 0, -1, dtype=np.int64)
+        self.position[self.row_ids] = np.arange(len(self.row_ids))
+        self.trip_ids = list(columns['trip_id'])
+        self.package_names = list(columns['package_name'])
+        self.prices = list(columns['price'])
+        self.durations = list(columns['duration'])
+        self.cities = [cities.split('|') if cities else [] for cities in columns['cities_included']]
+        self.hotels = list(columns['hotel'])
+        self.urls = list(columns['url'])
+
+        # Missing prices are NaN and missing durations -1, so they never match a filter
+        self.price_value = np.array(
+            [np.nan if value is None else value for value in columns['price_value']], dtype=np.float64
+        )
+        self.duration_days = np.array(
+            [-1 if value is None else value for value in columns['duration_days']], dtype=np.int32
+        )
+        # Sort columns, with missing values last
+        self.price_order = np.where(np.isnan(self.price_value), np.inf, self.price_value)
+        self.duration_order = np.where(self.duration_days < 0, np.inf, self.duration_days)
+        self.location_values, self.location_codes = self._encode(columns['location_lc'])
+        self.destination_type_values, self.destination_type_codes = self._encode(columns['destination_type_lc'])
+        self.destination_type_index = {value: code for code, value in enumerate(self.destination_type_values)}
+
+    def _encode(self, values):
+        """Dictionary-encode a string column into (distinct values, int32 codes)"""
+        index: Dict[str, int] = {}
+        codes = self._np.fromiter(
+            (index.setdefault(value or '', len(index)) for value in values), dtype=self._np.int32, count=len(values)
+        )
+        return list(index), codes
+
+    def search(
+        self,
+        location: Optional[str] = None,
+        duration: Optional[int] = None,
+        price: Optional[float] = None,
+        destination_type: Optional[str] = None,
+        ranked: Optional[List[Tuple[int, float]]] = None,
+        sort_by: str = "price",
+        target_duration: Optional[int] = None,
+        after: Optional[Tuple[float, int]] = None,
+        limit: Optional[int] = None
+    ) -> Tuple[int, List[Dict], Optional[Tuple[float, int]]]:
+        np = self._np
+        mask = np.ones(len(self.trip_ids), dtype=bool)
+
+        if location:
+            location_lc = location.strip().lower()
+            # The substring test runs once per distinct location, not once per row
+            matched = [code for code, value in enumerate(self.location_values) if location_lc in value]
+            mask &= np.isin(self.location_codes, matched)
+
+        if price is not None:
+            mask &= self.price_value <= int(price)
+
+        if duration:
+            mask &= self.duration_days == int(duration)
+
+        if destination_type:
+            code = self.destination_type_index.get(destination_type.strip().lower())
+            if code is None:
+                return 0, [], None
+            mask &= self.destination_type_codes == code
+
+        if ranked is None:
+            positions = np.flatnonzero(mask)
+            scores = None
+        else:
+            ranked_ids = np.array([row_id for row_id, _ in ranked], dtype=np.int64)
+            scores = np.array([score for _, score in ranked], dtype=np.float64)
+            known = ranked_ids < len(self.position)
+            positions, scores = self.position[ranked_ids[known]], scores[known]
+            keep = positions >= 0
+            positions, scores = positions[keep], scores[keep]
+            keep = mask[positions]
+            positions, scores = positions[keep], scores[keep]
+        total = len(positions)
+
+        if sort_by == "relevance":
+            primary = scores
+        elif sort_by == "price":
+            primary = self.price_order[positions]
+        elif sort_by == "price_desc":
+            primary = np.where(np.isnan(self.price_value[positions]), np.inf, -self.price_value[positions])
+        elif sort_by == "duration":
+            primary = self.duration_order[positions]
+        elif sort_by == "closest_duration":
+            primary = np.abs(self.duration_order[positions] - target_duration)
+        else:
+            raise ValueError(f"Unknown sort order: {sort_by}")
+        ids = self.row_ids[positions]
+
+        if after is not None:
+            keep = (primary > after[0]) | ((primary == after[0]) & (ids > after[1]))
+            positions, primary, ids = positions[keep], primary[keep], ids[keep]
+        if limit and len(positions) > limit + 1:
+            # Partition first so only candidates for the page are fully sorted
+            keep = primary <= np.partition(primary, limit)[limit]
+            positions, primary, ids = positions[keep], primary[keep], ids[keep]
+        order = np.lexsort((ids, primary))
+        next_key = None
+        if limit and len(order) > limit:
+            order = order[:limit]
+            next_key = (float(primary[order[-1]]), int(ids[order[-1]]))
+        positions = positions[order]
+
+        return total, [
+            {
+                'trip_id': self.trip_ids[i],
+                'package_name': self.package_names[i],
+                'price': self.prices[i],
+                'duration': self.durations[i],
+                'cities_included': list(self.cities[i]),
+                'hotel': self.hotels[i],
+                'url': self.urls[i]
+            }
+            for i in positions.tolist()
+        ], next_key
+
+class IndexedCatalog(CatalogSnapshot):
+    """
+    Catalog engine that leaves the packages in SQLite
+
+    Only the distinct locations are held in memory. Each search is a COUNT
+    and a keyset-paged query on the normalized columns, so the filters use
+    the idx_tour_packages_* indexes; a location substring is first resolved
+    against the distinct locations and becomes an IN lookup. Full-text
+    matches are joined in with their bm25 scores. Selected with
+    CATALOG_ENGINE=sql, and by the default "auto" engine for catalogs of
+    more than CATALOG_SNAPSHOT_MAX_ROWS packages.
+    """
+    # Sort key per PACKAGE_SORTS entry; missing values last (9e999 is +inf in SQLite)
+    SORT_KEYS = {
+        "relevance": "r.score",
+        "price": "CASE WHEN p.price_value IS NULL THEN 9e999 ELSE p.price_value END",
+        "price_desc": "CASE WHEN p.price_value IS NULL THEN 9e999 ELSE -p.price_value END",
+        "duration": "CASE WHEN p.duration_days IS NULL THEN 9e999 ELSE p.duration_days END",
+        "closest_duration": "CASE WHEN p.duration_days IS NULL THEN 9e999 ELSE ABS(p.duration_days - :target) END",
+    }
+
+    def __init__(self, version: int, conn: sqlite3.Connection, db: "SQLiteConnectionManager", db_path: str):
+        self.version = version
+        self.db = db
+        self.db_path = db_path
+        rows = conn.execute(
+            "SELECT location, location_lc FROM tour_packages WHERE location IS NOT NULL GROUP BY location ORDER BY MIN(id)"
+        ).fetchall()
+        self.locations: List[str] = [location for location, _ in rows]
+        self.location_values: List[str] = sorted({location_lc or '' for _, location_lc in rows})
+
+    def search(
+        self,
+        location: Optional[str] = None,
+        duration: Optional[int] = None,
+        price: Optional[float] = None,
+        destination_type: Optional[str] = None,
+        ranked: Optional[List[Tuple[int, float]]] = None,
+        sort_by: str = "price",
+        target_duration: Optional[int] = None,
+        after: Optional[Tuple[float, int]] = None,
+        limit: Optional[int] = None
+    ) -> Tuple[int, List[Dict], Optional[Tuple[float, int]]]:
+        if sort_by not in self.SORT_KEYS:
+            raise ValueError(f"Unknown sort order: {sort_by}")
+        where, params = [], {'target': target_duration}
+        if location:
+            location_lc = location.strip().lower()
+            matched = [value for value in self.location_values if location_lc in value]
+            if not matched:
+                return 0, [], None
+            names = [f":location{i}" for i in range(len(matched))]
+            where.append(f"p.location_lc IN ({', '.join(names)})")
+            params.update({name[1:]: value for name, value in zip(names, matched)})
+        if price is not None:
+            where.append("p.price_value <= :price")
+            params['price'] = int(price)
+        if duration:
+            where.append("p.duration_days = :duration")
+            params['duration'] = int(duration)
+        if destination_type:
+            where.append("p.destination_type_lc = :destination_type")
+            params['destination_type'] = destination_type.strip().lower()
+
+        source = "tour_packages p"
+        if ranked is not None:
+            # The full-text matches arrive as one JSON parameter rather than thousands of placeholders
+            source = (
+                "(SELECT json_extract(value, '$[0]') AS id, json_extract(value, '$[1]') AS score "
+                "FROM json_each(:ranked)) r JOIN tour_packages p ON p.id = r.id"
+            )
+            params['ranked'] = json.dumps(ranked)
+        condition = " AND ".join(where) or "1=1"
+        key = self.SORT_KEYS[sort_by]
+
+        page_condition = condition
+        if after is not None:
+            page_condition += f" AND ({key} > :after_key OR ({key} = :after_key AND p.id > :after_id))"
+            params.update(after_key=after[0], after_id=after[1])
+        page_query = f"""
+            SELECT {key}, p.id, p.trip_id, p.package_name, p.price, p.duration, p.cities_included, p.hotel, p.url
+            FROM {source} WHERE {page_condition} ORDER BY {key}, p.id
+        """
+        if limit:
+            page_query += " LIMIT :limit"
+            params['limit'] = limit + 1
+
+        with self.db.connection(self.db_path) as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM {source} WHERE {condition}", params).fetchone()[0]
+            rows = conn.execute(page_query, params).fetchall()
+
+        next_key = None
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            next_key = (float(rows[-1][0]), rows[-1][1])
+        return total, [
+            {
+                'trip_id': trip_id,
+                'package_name': package_name,
+                'price': package_price,
+                'duration': package_duration,
+                'cities_included': cities_included.split('|') if cities_included else [],
+                'hotel': hotel,
+                'url': url
+            }
+            for _, _, trip_id, package_name, package_price, package_duration, cities_included, hotel, url in rows
+        ], next_key
 
 class TourPackageAPI:
-    def __init__(self, db_path: str = "tour_packages.db"):
+    def __init__(
+        self,
+        db_path: str = "tour_packages.db",
+        db: Optional[SQLiteConnectionManager] = None,
+        engine: Optional[str] = None
+    ):
         self.db_path = db_path
-    
-    def search_packages(self, location: Optional[str] = None, duration: Optional[int] = None, price: Optional[float] = None, destination_type: Optional[str] = None) -> Optional[Dict]:
+        self.db = db or db_manager
+        # "rows" or "columnar" (NumPy) in-memory catalog, "sql" for the indexed
+        # database, or "auto" (default): rows up to CATALOG_SNAPSHOT_MAX_ROWS packages, sql above
+        self.engine = (engine or os.getenv("CATALOG_ENGINE", "auto")).lower()
+        self.db.register_schema(self.db_path, migrate_catalog)
+        try:
+            self.db.initialize(self.db_path)
+        except Exception as e:
+            print(f"Error migrating tour package catalog: {str(e)}")
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._snapshot_stamp = None
+        self._snapshot_lock = threading.Lock()
+
+    def _file_stamp(self):
+        # Writes land in the WAL first, so its mtime and size change before the database file's
+        stamp = []
+        for path in (self.db_path, f"{self.db_path}-wal"):
+            try:
+                stat = os.stat(path)
+                stamp.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def snapshot(self) -> CatalogSnapshot:
+        """
+        The in-memory catalog, reloaded when the catalog version changes
+
+        While the database files are untouched the snapshot is returned
+        after two stat() calls; otherwise the version stamp is read and the
+        table only reloaded if it actually changed. One caller reloads at a
+        time; the others keep using the current snapshot meanwhile and only
+        wait when there is none yet.
+        """
+        stamp = self._file_stamp()
+        snapshot = self._snapshot
+        if snapshot is not None and stamp == self._snapshot_stamp:
+            return snapshot
+
+        if not self._snapshot_lock.acquire(blocking=snapshot is None):
+            return snapshot
+        try:
+            if self._snapshot is not None and stamp == self._snapshot_stamp:
+                return self._snapshot
+            with self.db.connection(self.db_path) as conn:
+                version = conn.execute("SELECT version FROM catalog_version WHERE id = 1").fetchone()[0]
+                if self._snapshot is None or self._snapshot.version != version:
+                    self._snapshot = self._build_snapshot(version, conn)
+            self._snapshot_stamp = stamp
+            return self._snapshot
+        finally:
+            self._snapshot_lock.release()
+
+    def _catalog_engine(self, conn: sqlite3.Connection) -> str:
+        if self.engine != "auto":
+            return self.engine
+        # A full scan of the in-memory rows costs more than the indexed queries on large catalogs
+        count = conn.execute("SELECT COUNT(*) FROM tour_packages").fetchone()[0]
+        return "rows" if count <= CATALOG_SNAPSHOT_MAX_ROWS else "sql"
+
+    def _build_snapshot(self, version: int, conn: sqlite3.Connection) -> CatalogSnapshot:
+        engine = self._catalog_engine(conn)
+        if engine == "sql":
+            return IndexedCatalog(version, conn, self.db, self.db_path)
+        rows = conn.execute(
+            f"SELECT {', '.join(CatalogSnapshot.COLUMNS)} FROM tour_packages ORDER BY id"
+        ).fetchall()
+        if engine == "columnar":
+            try:
+                return ColumnarCatalog(version, rows)
+            except ImportError:
+                print("NumPy is not installed, using the row-based catalog engine")
+                self.engine = "rows"
+        return CatalogSnapshot(version, rows)
+
+    def reload(self) -> CatalogSnapshot:
+        """Drop the in-memory catalog and load it again from the database"""
+        with self._snapshot_lock:
+            self._snapshot = None
+            self._snapshot_stamp = None
+        return self.snapshot()
+
+    def search_packages(
+        self,
+        location: Optional[str] = None,
+        duration: Optional[int] = None,
+        price: Optional[float] = None,
+        destination_type: Optional[str] = None,
+        query: Optional[str] = None,
+        sort_by: Optional[str] = None,
+        limit: int = SEARCH_PACKAGES_LIMIT,
+        cursor: Optional[str] = None
+    ) -> Optional[Dict]:
         """
         Search for tour packages based on given criteria
         
@@ -202,78 +1841,163 @@ class TourPackageAPI:
             duration: Number of days for the tour (int, optional)
             price: Maximum price for the tour (float, optional)
             destination_type: Type of destination (str, optional)
+            query: Free-text keywords matched against package name, cities and itinerary,
+                   results ranked by relevance (str, optional)
+            sort_by: One of PACKAGE_SORTS; defaults to relevance for queries and price
+                     otherwise. With "closest_duration", duration is the preferred length
+                     instead of an exact filter (str, optional)
+            limit: Maximum number of packages returned, up to SEARCH_PACKAGES_MAX_LIMIT (int)
+            cursor: next_cursor of the previous page of the same search (str, optional)
             
         Returns:
-            Dictionary containing matching tour packages
+            Dictionary containing compact summaries of one page of matching tour packages,
+            the total number of matches and, if more follow, a next_cursor
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            query = """
-                SELECT 
-                    id,
-                    location,
-                    trip_id,
-                    package_name,
-                    url,
-                    duration,
-                    tour_type,
-                    cities_included,
-                    price,
-                    created_at,
-                    itinerary_data,
-                    destination_type,
-                    hotel
-                FROM tour_packages
-                WHERE 1=1
-            """
-            params = []
-            
-            if location :
-                query += " AND LOWER(Location) LIKE LOWER(?)"
-                params.append(f"%{location}%")
-                
-            if price is not None:
-                query += " AND Price <= ?"
-                params.append(price)
-                
-            if duration:
-                query += " AND Duration = ?"
-                params.append(duration)
-            
-            if destination_type:
-                query += " AND destination_type = ?"
-                params.append(destination_type)
+            if sort_by is None or (sort_by == "relevance" and not query):
+                sort_by = "relevance" if query else "price"
+            if sort_by not in PACKAGE_SORTS:
+                return {'error': f"Unknown sort_by {sort_by!r}; use one of {', '.join(PACKAGE_SORTS)}"}
+            if sort_by == "closest_duration" and not duration:
+                sort_by = "duration"
+            fts_query = build_fts_query(query) if query else None
+            if query and query.strip() and not fts_query:
+                return {'error': f"The query {query!r} has no words to search for; use keywords such as sights, activities or cities"}
+            limit = max(1, min(int(limit or SEARCH_PACKAGES_LIMIT), SEARCH_PACKAGES_MAX_LIMIT))
 
-            cursor.execute(query, params)
-            results = cursor.fetchall()
-            
-            packages = []
-            for row in results:
-                packages.append({
-                    'id': row[0],
-                    'location': row[1],
-                    'trip_id': row[2],
-                    'package_name': row[3],
-                    'url': row[4],
-                    'duration': row[5],
-                    'tour_type': row[6],
-                    'cities_included': row[7].split('|') if row[7] else [],
-                    'price': row[8],
-                    'created_at': row[9],
-                    'itinerary_data': row[10],
-                    'destination_type': row[11],
-                    'hotel': row[12]
-                })
-            
-            conn.close()
-            return {'packages': packages}
+            # A cursor is only valid for the search that produced it
+            search_key = hashlib.sha256(
+                json.dumps([location, duration, price, destination_type, query, sort_by]).encode()
+            ).hexdigest()[:16]
+            after = None
+            if cursor:
+                after = self._decode_cursor(cursor, search_key)
+                if after is None:
+                    return {'error': "Invalid cursor for this search; repeat the search without a cursor"}
+
+            snapshot = self.snapshot()
+
+            # Only free-text queries need the database: FTS5 scores the matching
+            # rows, the structured filters run on the in-memory snapshot
+            ranked = None
+            if fts_query:
+                weights = ", ".join(str(w) for w in CATALOG_FTS_WEIGHTS)
+                with self.db.connection(self.db_path) as conn:
+                    ranked = conn.execute(
+                        f"SELECT rowid, bm25(tour_packages_fts, {weights}) FROM tour_packages_fts WHERE tour_packages_fts MATCH ?",
+                        (fts_query,)
+                    ).fetchall()
+            elif sort_by == "relevance":
+                sort_by = "price"
+
+            closest = sort_by == "closest_duration"
+            total, packages, next_key = snapshot.search(
+                location, None if closest else duration, price, destination_type, ranked,
+                sort_by=sort_by, target_duration=int(duration) if closest else None, after=after, limit=limit
+            )
+            results = {'packages': packages, 'total_found': total}
+            if next_key is not None:
+                results['next_cursor'] = self._encode_cursor(search_key, next_key)
+            return results
             
         except Exception as e:
             print(f"Error searching tour packages: {str(e)}")
             return None
 
+    def get_package_itinerary(self, trip_id: str) -> Optional[Dict]:
+        """
+        Load the day-by-day itinerary of a single tour package
+
+        Args:
+            trip_id: Trip ID of the package as returned by search_packages (str)
+
+        Returns:
+            Dictionary with the package name and its itinerary days
+        """
+        try:
+            # A point query on the trip_id index; itineraries are not kept in memory
+            with self.db.connection(self.db_path) as conn:
+                row = conn.execute(
+                    """
+                    SELECT trip_id, package_name, tour_type, destination_type, itinerary_data
+                    FROM tour_packages WHERE trip_id = ? ORDER BY id LIMIT 1
+                    """,
+                    (trip_id.strip(),)
+                ).fetchone()
+
+            if row is None:
+                print(f"No tour package found with trip ID {trip_id}")
+                return None
+
+            try:
+                days = json.loads(row[4]) if row[4] else []
+            except ValueError:
+                days = [{'day_number': None, 'text': row[4]}]
+
+            itinerary = []
+            for day in days:
+                # Collapse the non-breaking spaces and blank lines scraped from the source pages
+                text = " ".join(str(day.get('text', '')).split())
+                itinerary.append({'day_number': day.get('day_number'), 'text': text})
+
+            return {
+                'trip_id': row[0],
+                'package_name': row[1],
+                'tour_type': row[2],
+                'destination_type': row[3],
+                'itinerary': itinerary
+            }
+
+        except Exception as e:
+            print(f"Error loading tour package itinerary: {str(e)}")
+            return None
+
+    def catalog_version(self) -> int:
+        """Change counter of the catalog, bumped on every insert, update or delete"""
+        with self.db.connection(self.db_path) as conn:
+            return conn.execute("SELECT version FROM catalog_version WHERE id = 1").fetchone()[0]
+
+    def list_locations(self) -> List[str]:
+        """Distinct package locations in the catalog"""
+        return list(self.snapshot().locations)
+
+    async def asearch_packages(
+        self,
+        location: Optional[str] = None,
+        duration: Optional[int] = None,
+        price: Optional[float] = None,
+        destination_type: Optional[str] = None,
+        query: Optional[str] = None,
+        sort_by: Optional[str] = None,
+        limit: int = SEARCH_PACKAGES_LIMIT,
+        cursor: Optional[str] = None
+    ) -> Optional[Dict]:
+        """Async variant of search_packages"""
+        return await self.db.run_async(
+            self.search_packages, location, duration, price, destination_type, query, sort_by, limit, cursor
+        )
+
+    @staticmethod
+    def _encode_cursor(search_key: str, key: Tuple[float, int]) -> str:
+        """Opaque keyset cursor: the search it belongs to and the sort key of the last package"""
+        payload = json.dumps([search_key, key[0], key[1]]).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+    @staticmethod
+    def _decode_cursor(cursor: str, search_key: str) -> Optional[Tuple[float, int]]:
+        try:
+            payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            cursor_search, value, row_id = json.loads(payload)
+            if cursor_search != search_key:
+                return None
+            return float(value), int(row_id)
+        except (ValueError, TypeError):
+            return None
+
+    async def aget_package_itinerary(self, trip_id: str) -> Optional[Dict]:
+        """Async variant of get_package_itinerary"""
+        return await self.db.run_async(self.get_package_itinerary, trip_id)
+
     def format_results(self, results: Dict) -> None:
         """Print formatted tour package results"""
         if not results or not results.get('packages'):
@@ -298,141 +2022,1049 @@ class TourPackageAPI:
         #     print("-" * 80 + "\n")
 
 ########################################################
-class StateManager:
-    _current_state = None
+BOOKING_DB_PATH = "BookingInfo.db"
 
-    @classmethod
-    def set_state(cls, state):
-        cls._current_state = state
+BOOKING_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS tour_packages (
+        Cust_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        Customer_name TEXT,
+        Customer_email TEXT,
+        Customer_mobile TEXT,
+        Package_name TEXT,
+        Package_id TEXT,       
+        Trip_Start_date TEXT,
+        Origin_city TEXT,
+        Tot_adults INTEGER,
+        Tot_children INTEGER,
+        Tot_cost TEXT,
+        Hotel_bookings TEXT,
+        Booking_key TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS email_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        recipient TEXT NOT NULL,
+        subject TEXT NOT NULL,
+        body TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL DEFAULT 0,
+        last_error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        sent_at TIMESTAMP
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_email_outbox_pending ON email_outbox (status, next_attempt_at)",
+]
 
-    @classmethod
-    def get_state(cls):
-        return cls._current_state
+# Created after Booking_key has been added to booking tables from older versions
+BOOKING_INDEXES = [
+    # A booking retried by the model (same conversation, package and start date) is stored once
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_bookings_key ON tour_packages (Booking_key)",
+    "CREATE INDEX IF NOT EXISTS idx_bookings_email ON tour_packages (Customer_email)",
+    "CREATE INDEX IF NOT EXISTS idx_bookings_start_date ON tour_packages (Trip_Start_date)",
+]
+
+def setup_booking_schema(conn: sqlite3.Connection) -> None:
+    """Create the booking tables"""
+    for statement in BOOKING_SCHEMA:
+        conn.execute(statement)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(tour_packages)")}
+    if 'Booking_key' not in columns:
+        conn.execute("ALTER TABLE tour_packages ADD COLUMN Booking_key TEXT")
+    for statement in BOOKING_INDEXES:
+        conn.execute(statement)
+
+db_manager.register_schema(BOOKING_DB_PATH, setup_booking_schema)
+
+class EmailOutboxWorker:
+    """
+    Background sender for the email_outbox table
+
+    Bookings only enqueue their confirmation email; this worker delivers
+    pending messages in batches over a single SMTP connection and retries
+    failures with exponential backoff until max_attempts is reached.
+    """
+    def __init__(
+        self,
+        db_path: str = BOOKING_DB_PATH,
+        batch_size: int = 20,
+        max_attempts: int = 5,
+        retry_backoff: float = 60.0,
+        poll_interval: float = 30.0,
+        db: Optional[SQLiteConnectionManager] = None
+    ):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.poll_interval = poll_interval
+        self.db = db or db_manager
+        self.smtp_host = os.getenv("SMTP_HOST", "smtp.gmail.com")
+        self.smtp_port = int(os.getenv("SMTP_PORT", "587"))
+        self.use_starttls = os.getenv("SMTP_STARTTLS", "true").lower() != "false"
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def enqueue(self, conn: sqlite3.Connection, recipient: str, subject: str, body: str) -> None:
+        """Queue a message inside the caller's transaction"""
+        conn.execute(
+            "INSERT INTO email_outbox (recipient, subject, body) VALUES (?, ?, ?)",
+            (recipient, subject, body)
+        )
+
+    def start(self) -> None:
+        """Start the sender thread if it is not already running"""
+        with self._thread_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+            self._thread.start()
+
+    def notify(self) -> None:
+        """Wake the sender after new messages were committed"""
+        self.start()
+        self._wake.set()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                while self.send_pending() and not self._stop.is_set():
+                    pass
+            except Exception as e:
+                print(f"Error in email outbox worker: {str(e)}")
+            self._wake.wait(self.poll_interval)
+
+    def _mark_failed(self, conn: sqlite3.Connection, outbox_id: int, attempts: int, error: str) -> None:
+        attempts += 1
+        status = 'failed' if attempts >= self.max_attempts else 'pending'
+        conn.execute(
+            "UPDATE email_outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+            (status, attempts, time.time() + self.retry_backoff * (2 ** (attempts - 1)), error[:500], outbox_id)
+        )
+
+    def send_pending(self) -> int:
+        """
+        Send one batch of due messages
+
+        Returns:
+            Number of messages attempted (0 when nothing was due or SMTP was unreachable)
+        """
+        import smtplib
+        from email.mime.multipart import MIMEMultipart
+        from email.mime.text import MIMEText
+
+        with self.db.connection(self.db_path) as conn:
+            rows = conn.execute(
+                "SELECT id, recipient, subject, body, attempts FROM email_outbox "
+                "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (time.time(), self.batch_size)
+            ).fetchall()
+            if not rows:
+                return 0
+
+            sender_email = os.getenv("SMTP_EMAIL")
+            sender_password = os.getenv("SMTP_PASSWORD")
+            try:
+                server = smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=30)
+                if self.use_starttls:
+                    server.starttls()
+                if sender_password:
+                    server.login(sender_email, sender_password)
+            except Exception as e:
+                print(f"Error connecting to SMTP server: {str(e)}")
+                with conn:
+                    for row in rows:
+                        self._mark_failed(conn, row[0], row[4], str(e))
+                return 0
+
+            with server:
+                for outbox_id, recipient, subject, body, attempts in rows:
+                    try:
+                        msg = MIMEMultipart()
+                        msg['From'] = sender_email
+                        msg['To'] = recipient
+                        msg['Subject'] = subject
+                        msg.attach(MIMEText(body, 'plain'))
+                        server.send_message(msg)
+                        with conn:
+                            conn.execute(
+                                "UPDATE email_outbox SET status = 'sent', attempts = ?, sent_at = CURRENT_TIMESTAMP, last_error = NULL WHERE id = ?",
+                                (attempts + 1, outbox_id)
+                            )
+                    except Exception as e:
+                        print(f"Error sending confirmation email {outbox_id}: {str(e)}")
+                        with conn:
+                            self._mark_failed(conn, outbox_id, attempts, str(e))
+            return len(rows)
+
+email_outbox = EmailOutboxWorker()  # started with the assistant, see build_travel_assistant
+atexit.register(email_outbox.stop)
+
+def build_confirmation_email(current_state: Dict, data: List[Dict]) -> str:
+    """Render the booking confirmation email body"""
+    email_body = f"""
+    Dear {current_state.get('user_name') or 'Valued Customer'},
+    
+    Thank you for booking with BlingDestinations! Here are your trip details:
+    
+    BOOKING DETAILS:
+    """
+    for package in data:
+        email_body += f"""
+        TOUR PACKAGE:
+        Package Name: {package['Package_name']}
+        Package ID: {package['Package_id']}
+        Trip Start Date: {package['Trip_Start_date']}
+        Origin City: {package['Origin_city']}
+        Number of Adults: {package['Tot_adults']}
+        Number of Children: {package.get('Tot_children') or 0}
+        Total Cost: {package['Tot_cost']}
+        """
+        
+        # Add hotel booking details if any
+        hotel_bookings = package.get('Hotel_bookings')
+        if hotel_bookings:
+            email_body += "\nHOTEL BOOKINGS:\n"
+            if isinstance(hotel_bookings, dict):
+                for hotel in hotel_bookings.values():
+                    email_body += f"""
+                    Hotel Name: {hotel.get('name')}
+                    Check-in: {hotel.get('check_in')}
+                    Check-out: {hotel.get('check_out')}
+                    Price per Night: {hotel.get('price', 'N/A')}
+                    """
+            else:
+                email_body += f"""
+                    {hotel_bookings}
+                    """
+    
+    email_body += f"""
+    
+    For any queries or assistance, please feel free to contact us.
+    
+    Best Regards,
+    BlingDestinations Team
+    """
+    return email_body
+
+def current_thread_id() -> Optional[str]:
+    """thread_id of the graph run calling this, if any"""
+    try:
+        return get_config().get("configurable", {}).get("thread_id")
+    except RuntimeError:
+        return None
 
-def write_to_database(data):
-    """Write the customer details and booking information to the database and send confirmation email"""
+def booking_key(owner: Optional[str], package: Dict) -> Optional[str]:
+    """Idempotency key of a booking: conversation + package id + start date"""
+    if not owner:
+        return None
+    return f"{str(owner).strip()}|{str(package['Package_id']).strip()}|{str(package['Trip_Start_date']).strip()}".lower()
+
+def write_to_database(data, current_state: Optional[Dict] = None, thread_id: Optional[str] = None):
+    """
+    Write the customer details and booking information to the database and queue the confirmation email
+
+    All bookings are inserted with one executemany in a single transaction.
+    A booking whose key (thread_id, or the customer's email outside a
+    conversation, + package id + start date) is already stored is skipped,
+    so a retried tool call neither duplicates the booking nor the email.
+
+    Args:
+        data: Booking dict, or a list of them
+        current_state: Graph state of the conversation making the booking; the
+                       customer's name, email and mobile are read from it
+        thread_id: Conversation making the booking
+    """
     # Wrap single dictionary in a list if it's not already a list
     if not isinstance(data, list):
         data = [data]
     
     try:
-        # Database operations
-        conn = sqlite3.connect("BookingInfo.db")
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tour_packages (
-                Cust_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                Customer_name TEXT,
-                Customer_email TEXT,
-                Customer_mobile TEXT,
-                Package_name TEXT,
-                Package_id TEXT,       
-                Trip_Start_date TEXT,
-                Origin_city TEXT,
-                Tot_adults INTEGER,
-                Tot_children INTEGER,
-                Tot_cost TEXT,
-                Hotel_bookings TEXT
+        current_state = current_state or {}
+        user_email = current_state.get("user_email")
+        owner = thread_id or user_email
+        print("Data: ", data)
+
+        rows = [
+            (
+                current_state.get("user_name"),
+                user_email,
+                current_state.get("user_mobile"),
+                package['Package_name'],
+                package['Package_id'],
+                package['Trip_Start_date'],
+                package['Origin_city'],
+                package['Tot_adults'],
+                package.get('Tot_children', 0),
+                package['Tot_cost'],
+                # Convert hotel_bookings dictionary to JSON string if it exists
+                json.dumps(package.get('Hotel_bookings', {})) if package.get('Hotel_bookings') else None,
+                booking_key(owner, package)
             )
-        ''')
+            for package in data
+        ]
+        # Rendered before the transaction so the write lock is held for the inserts only
+        email_body = build_confirmation_email(current_state, data) if user_email else None
 
-        current_state = StateManager.get_state()
-        
-        # Send email for each package booking
-        sender_email = os.getenv("SMTP_EMAIL")
-        sender_password = os.getenv("SMTP_PASSWORD")
-        
-        if current_state and current_state.get("user_email"):
-            try:
-                msg = MIMEMultipart()
-                msg['From'] = sender_email
-                msg['To'] = current_state.get("user_email")
-                msg['Subject'] = "Your BlingDestinations Tour Package Confirmation"
-                
-                email_body = f"""
-                Dear {current_state.get('user_name', 'Valued Customer')},
-                
-                Thank you for booking with BlingDestinations! Here are your trip details:
-                
-                BOOKING DETAILS:
-                """
-                for package in data:
-                    # Convert hotel_bookings dictionary to JSON string if it exists
-                    print("Data: ", package)
-                    hotel_bookings_json = json.dumps(package.get('Hotel_bookings', {})) if package.get('Hotel_bookings') else None
-                    
-                    # Database insert
-                    cursor.execute('''
-                        INSERT INTO tour_packages 
-                        (Customer_name, Customer_email, Customer_mobile, Package_name, Package_id, 
-                        Trip_Start_date, Origin_city, Tot_adults, Tot_children, Tot_cost, Hotel_bookings)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        current_state.get("user_name"),
-                        current_state.get("user_email"),
-                        current_state.get("user_mobile"),
-                        package['Package_name'],
-                        package['Package_id'],
-                        package['Trip_Start_date'],
-                        package['Origin_city'],
-                        package['Tot_adults'],
-                        package.get('Tot_children', 0),
-                        package['Tot_cost'],
-                        hotel_bookings_json
-                    ))
-                    
-                    # Add package details to email
-                    email_body += f"""
-                    TOUR PACKAGE:
-                    Package Name: {package['Package_name']}
-                    Package ID: {package['Package_id']}
-                    Trip Start Date: {package['Trip_Start_date']}
-                    Origin City: {package['Origin_city']}
-                    Number of Adults: {package['Tot_adults']}
-                    Number of Children: {package.get('Tot_children', 0)}
-                    Total Cost: {package['Tot_cost']}
-                    """
-                    
-                    # Add hotel booking details if any
-                    if hotel_bookings_json:
-                        hotel_bookings = json.loads(hotel_bookings_json)
-                        email_body += "\nHOTEL BOOKINGS:\n"
-                        for hotel in hotel_bookings.values():
-                            email_body += f"""
-                            Hotel Name: {hotel.get('name')}
-                            Check-in: {hotel.get('check_in')}
-                            Check-out: {hotel.get('check_out')}
-                            Price per Night: {hotel.get('price', 'N/A')}
-                            """
-                
-                email_body += f"""
-                
-                For any queries or assistance, please feel free to contact us.
-                
-                Best Regards,
-                BlingDestinations Team
-                """
-                
-                msg.attach(MIMEText(email_body, 'plain'))
-                print("Email body: ", email_body)
-                # Send email
-                with smtplib.SMTP('smtp.gmail.com', 587) as server:
-                    server.starttls()
-                    server.login(sender_email, sender_password)
-                    server.send_message(msg)
-                
-            except Exception as e:
-                print(f"Error sending confirmation email: {str(e)}")
-                # Continue with database operations even if email fails
-        
-        conn.commit()
-        conn.close()
+        with db_manager.transaction(BOOKING_DB_PATH) as conn:
+            changes = conn.total_changes
+            conn.executemany('''
+                INSERT INTO tour_packages 
+                (Customer_name, Customer_email, Customer_mobile, Package_name, Package_id, 
+                Trip_Start_date, Origin_city, Tot_adults, Tot_children, Tot_cost, Hotel_bookings, Booking_key)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (Booking_key) DO NOTHING
+            ''', rows)
+            inserted = conn.total_changes - changes
+
+            # The confirmation email commits atomically with the booking and is sent in the background
+            if user_email and inserted:
+                email_outbox.enqueue(
+                    conn,
+                    user_email,
+                    "Your BlingDestinations Tour Package Confirmation",
+                    email_body
+                )
+
+        if inserted < len(rows):
+            print(f"Skipped {len(rows) - inserted} booking(s) that were already recorded")
+        if user_email and inserted:
+            email_outbox.notify()
         return True
         
     except Exception as e:
         print(f"Error in database operation: {str(e)}")
         return False
 
+async def awrite_to_database(data, current_state: Optional[Dict] = None, thread_id: Optional[str] = None):
+    """Async variant of write_to_database"""
+    return await db_manager.run_async(write_to_database, data, current_state, thread_id)
+
+#########################################################
+CHECKPOINT_DB_PATH = "checkpoints.db"
+
+class CompressedSerializer:
+    """Checkpoint serializer that zlib-compresses payloads above min_size bytes"""
+    def __init__(self, serde=None, min_size: int = 512, level: int = 6):
+        self.serde = serde or JsonPlusSerializer()
+        self.min_size = min_size
+        self.level = level
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.serde.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return self.serde.loads(data)
+
+    def dumps_typed(self, obj: Any):
+        type_, data = self.serde.dumps_typed(obj)
+        if data is not None and len(data) >= self.min_size:
+            return f"{type_}+zlib", zlib.compress(data, self.level)
+        return type_, data
+
+    def loads_typed(self, data) -> Any:
+        type_, payload = data
+        if type_ and type_.endswith("+zlib"):
+            return self.serde.loads_typed((type_[:-len("+zlib")], zlib.decompress(payload)))
+        return self.serde.loads_typed(data)
+
+class BoundedSqliteSaver(SqliteSaver):
+    """
+    SQLite checkpointer with bounded retention
+
+    Only the newest `keep_last` checkpoints (and their pending writes) are
+    kept per thread, and once more than `max_threads` threads exist the
+    least recently active ones are evicted. Conversation state lives on
+    disk, so process memory stays flat however many threads are served,
+    and history survives restarts. The async methods run the synchronous
+    ones on the shared SQLite worker pool.
+    """
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        keep_last: int = 10,
+        max_threads: int = 50000,
+        serde=None
+    ):
+        super().__init__(conn, serde=serde or CompressedSerializer())
+        self.keep_last = keep_last
+        self.max_threads = max_threads
+
+    @classmethod
+    def from_path(cls, db_path: str = CHECKPOINT_DB_PATH, **kwargs) -> "BoundedSqliteSaver":
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return cls(conn, **kwargs)
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS thread_activity (
+                thread_id TEXT PRIMARY KEY,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_thread_activity_last_used ON thread_activity (last_used);
+            """
+        )
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+
+        with self.cursor() as cur:
+            # Checkpoint ids are time-ordered, so the newest keep_last sort last
+            cur.execute(
+                """
+                DELETE FROM checkpoints
+                WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN (
+                    SELECT checkpoint_id FROM checkpoints
+                    WHERE thread_id = ? AND checkpoint_ns = ?
+                    ORDER BY checkpoint_id DESC LIMIT ?
+                )
+                """,
+                (thread_id, checkpoint_ns, thread_id, checkpoint_ns, self.keep_last)
+            )
+            if cur.rowcount:
+                cur.execute(
+                    """
+                    DELETE FROM writes
+                    WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN (
+                        SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?
+                    )
+                    """,
+                    (thread_id, checkpoint_ns, thread_id, checkpoint_ns)
+                )
+
+            cur.execute(
+                "INSERT OR REPLACE INTO thread_activity (thread_id, last_used) VALUES (?, ?)",
+                (thread_id, time.time())
+            )
+            excess = cur.execute("SELECT COUNT(*) FROM thread_activity").fetchone()[0] - self.max_threads
+            if excess > 0:
+                idle = [row[0] for row in cur.execute(
+                    "SELECT thread_id FROM thread_activity ORDER BY last_used LIMIT ?", (excess,)
+                ).fetchall()]
+                for idle_thread in idle:
+                    cur.execute("DELETE FROM checkpoints WHERE thread_id = ?", (idle_thread,))
+                    cur.execute("DELETE FROM writes WHERE thread_id = ?", (idle_thread,))
+                    cur.execute("DELETE FROM thread_activity WHERE thread_id = ?", (idle_thread,))
+        return next_config
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),))
+
+    async def aget_tuple(self, config):
+        return await db_manager.run_async(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await db_manager.run_async(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await db_manager.run_async(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await db_manager.run_async(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await db_manager.run_async(self.delete_thread, thread_id)
+
+def create_checkpointer():
+    """Build the checkpointer selected by the CHECKPOINTER env var ("sqlite" by default, or "memory")"""
+    if os.getenv("CHECKPOINTER", "sqlite").lower() == "memory":
+        return MemorySaver()
+    return BoundedSqliteSaver.from_path(
+        os.getenv("CHECKPOINT_DB_PATH", CHECKPOINT_DB_PATH),
+        keep_last=int(os.getenv("CHECKPOINT_KEEP_LAST", "10")),
+        max_threads=int(os.getenv("CHECKPOINT_MAX_THREADS", "50000"))
+    )
+
+#########################################################
+# Context compaction: stale tool results are replaced by digests and, once the
+# conversation exceeds the token budget, older turns are folded into a summary
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "4"))
+TOOL_DIGEST_MAX_CHARS = 600
+
+SUMMARY_PROMPT = '''Summarize the earlier part of this travel booking conversation for the travel planner who continues it.
+Keep the customer's preferences, shortlisted packages (with trip IDs), travel dates, origin city, travellers, hotel choices,
+prices quoted and any open questions. Be concise and factual.'''
+
+def digest_tool_result(name: Optional[str], content: Any) -> str:
+    """Reduce a tool result to the few fields later turns still refer to"""
+    text = content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+
+    if isinstance(data, dict) and name == "search_packages" and isinstance(data.get('packages'), list):
+        packages = [
+            f"{p.get('trip_id')}: {p.get('package_name')} ({p.get('price')}, {p.get('duration')} days)"
+            for p in data['packages']
+        ]
+        digest = f"search_packages returned {len(packages)} of {data.get('total_found', len(packages))} packages: " + "; ".join(packages)
+        if data.get('next_cursor'):
+            digest += f" (next_cursor {data['next_cursor']})"
+    elif isinstance(data, dict) and name == "search_hotels" and isinstance(data.get('cheapest'), list):
+        hotels = [
+            f"{h.get('name')} [{h.get('hotel_id')}] ({h.get('price')} {h.get('currency')}, rating {h.get('rating')})"
+            for h in data['cheapest']
+        ]
+        digest = f"search_hotels found {data.get('total_found')} hotels in {data.get('city')}, cheapest: " + "; ".join(hotels)
+    elif isinstance(data, dict) and name == "search_hotels_batch" and isinstance(data.get('cities'), list):
+        cities = [
+            f"{c.get('city')}: " + (c.get('error') or ", ".join(
+                f"{h.get('name')} [{h.get('hotel_id')}] ({h.get('price')} {h.get('currency')})"
+                for h in c.get('cheapest', [])
+            ))
+            for c in data['cities']
+        ]
+        digest = "search_hotels_batch cheapest per city - " + "; ".join(cities)
+    elif isinstance(data, dict) and name == "get_package_itinerary" and isinstance(data.get('itinerary'), list):
+        digest = (
+            f"Itinerary of {data.get('package_name')} ({data.get('trip_id')}), {len(data['itinerary'])} days; "
+            "call get_package_itinerary again for the full text"
+        )
+    else:
+        digest = text
+
+    if len(digest) > TOOL_DIGEST_MAX_CHARS:
+        digest = digest[:TOOL_DIGEST_MAX_CHARS] + "..."
+    return f"[digest of an earlier {name} result] {digest}"
+
+def collect_trip_details(messages: List[BaseMessage], trip_details: Optional[Dict] = None) -> Dict:
+    """Merge the arguments of the assistant's tool calls into the structured trip details"""
+    details = dict(trip_details or {})
+    for message in messages:
+        for call in getattr(message, 'tool_calls', None) or []:
+            args = {k: v for k, v in (call.get('args') or {}).items() if v is not None}
+            if call['name'] == 'search_packages':
+                details['package_search'] = {k: v for k, v in args.items() if k not in ('limit', 'cursor')}
+            elif call['name'] == 'get_package_itinerary' and args.get('trip_id'):
+                details['package_trip_id'] = args['trip_id']
+            elif call['name'] == 'search_hotels' and args.get('city'):
+                details['hotel_searches'] = {**details.get('hotel_searches', {}), args.pop('city'): args}
+            elif call['name'] == 'search_hotels_batch' and args.get('legs'):
+                shared = {k: v for k, v in args.items() if k != 'legs'}
+                details['hotel_searches'] = {
+                    **details.get('hotel_searches', {}),
+                    **{leg['city']: {**shared, **{k: v for k, v in leg.items() if k != 'city'}}
+                       for leg in args['legs'] if leg.get('city')}
+                }
+            elif call['name'] == 'write_to_database':
+                details['booking'] = args
+    return details
+
+def summarize_turns(messages: List[BaseMessage], previous_summary: Optional[str] = None) -> Optional[str]:
+    """Summarize older turns with the chat model; returns None if summarization failed"""
+    transcript = "\n".join(
+        f"{message.type}: {message.content}" for message in messages if message.content
+    )
+    if previous_summary:
+        transcript = f"Summary so far:\n{previous_summary}\n\nLater messages:\n{transcript}"
+    try:
+        return get_model().invoke([SystemMessage(SUMMARY_PROMPT), HumanMessage(transcript)]).content
+    except Exception as e:
+        print(f"Error summarizing conversation: {str(e)}")
+        return None
+
+def compact_context(state: Dict) -> Dict:
+    """Graph node run at the start of every turn to keep the model context bounded"""
+    messages = state["messages"]
+    human_indexes = [i for i, message in enumerate(messages) if isinstance(message, HumanMessage)]
+    last_human = human_indexes[-1] if human_indexes else 0
+
+    # Tool results from earlier turns are only needed in digest form
+    digests = {}
+    for message in messages[:last_human]:
+        if isinstance(message, ToolMessage) and not message.additional_kwargs.get('compacted'):
+            digests[message.id] = ToolMessage(
+                content=digest_tool_result(message.name, message.content),
+                tool_call_id=message.tool_call_id,
+                name=message.name,
+                id=message.id,
+                additional_kwargs={'compacted': True}
+            )
+    compacted = [digests.get(message.id, message) for message in messages]
+
+    result = {"trip_details": collect_trip_details(messages, state.get("trip_details"))}
+    updates = list(digests.values())
+
+    # Fold everything before the last CONTEXT_KEEP_TURNS turns into the summary.
+    # Cutting at a HumanMessage never separates a tool call from its result.
+    if count_tokens_approximately(compacted) > CONTEXT_TOKEN_BUDGET and len(human_indexes) > CONTEXT_KEEP_TURNS:
+        cut = human_indexes[-CONTEXT_KEEP_TURNS]
+        summary = summarize_turns(compacted[:cut], state.get("summary"))
+        if summary:
+            removed = {message.id for message in compacted[:cut]}
+            updates = [message for message in updates if message.id not in removed]
+            updates += [RemoveMessage(id=message_id) for message_id in removed]
+            result["summary"] = summary
+
+    result["messages"] = updates
+    return result
+
+def conversation_context(state: Dict) -> Optional[str]:
+    """Render the conversation summary and trip details for the model"""
+    parts = []
+    if state.get("summary"):
+        parts.append(f"Summary of the earlier conversation:\n{state['summary']}")
+    if state.get("trip_details"):
+        parts.append(f"Trip details gathered so far:\n{json.dumps(state['trip_details'], ensure_ascii=False)}")
+    return "\n\n".join(parts) or None
+
+#########################################################
+# Fast path: plain package filter requests opening a conversation ("beach packages
+# under 50k for 6 days") are answered from search_packages directly, without a
+# model round trip
+FAST_PATH_ENABLED = os.getenv("FAST_PATH", "true").lower() != "false"
+FAST_PATH_MAX_PACKAGES = 5
+
+DESTINATION_TYPE_KEYWORDS = {
+    "Beach/Island": ("beach", "beaches", "island", "islands"),
+    "Wildlife/Nature": ("wildlife", "nature", "safari", "safaris", "jungle"),
+    "Culture": ("culture", "cultural"),
+    "Heritage": ("heritage", "historic", "historical"),
+    "Shopping": ("shopping",),
+}
+
+PACKAGE_INTENT_WORDS = {
+    "package", "packages", "tour", "tours", "trip", "trips", "holiday", "holidays",
+    "vacation", "vacations", "options", "deals", "getaway", "getaways",
+}
+
+# Words that may accompany a filter request without changing its meaning.
+# Anything else (itinerary, hotel, book, these, ...) sends the turn to the model.
+FAST_PATH_FILLER = {
+    "show", "me", "list", "find", "search", "any", "some", "the", "a", "an", "i", "we", "want",
+    "need", "looking", "look", "for", "with", "in", "to", "of", "please", "pls", "do", "you",
+    "have", "what", "are", "is", "there", "available", "get", "give", "suggest", "can", "could",
+    "all", "your", "hi", "hello", "and", "or", "at", "on", "per", "person", "pp", "price",
+    "priced", "budget", "destinations", "destination", "long", "duration", "around", "about",
+    "approx", "approximately", "rs", "inr", "only", "would", "like", "interested", "my", "our",
+}
+
+PRICE_PATTERN = re.compile(
+    r"(?:under|below|within|less than|upto|up to|max(?:imum)?|budget(?: of| is)?|not more than|at most)\s*"
+    r"(?:rs\.?|inr|₹)?\s*(\d+(?:[.,]\d+)*)\s*(k|thousand|l|lakhs?|lacs?)?\b"
+)
+DURATION_PATTERN = re.compile(r"\b(\d+)\s*-?\s*(days?|nights?|d|n)\b")
+WEEK_PATTERN = re.compile(r"\b(a|one|1|two|2)\s*-?\s*weeks?\b")
+
+class PackageQueryRouter:
+    """
+    Rule-based intent and slot extractor for package filter requests
+
+    extract() returns search_packages arguments only when the whole message
+    is a filter request with a location or destination type; anything it
+    cannot account for word by word is left to the model.
+    """
+    def __init__(self, package_api: "TourPackageAPI"):
+        self.package_api = package_api
+        self._locations: Optional[List[str]] = None
+        self._locations_version: Optional[int] = None
+
+    def refresh(self) -> None:
+        """Reload the known locations from the catalog"""
+        self._locations = None
+
+    def locations(self) -> List[str]:
+        try:
+            snapshot = self.package_api.snapshot()
+        except Exception as e:
+            print(f"Error loading package locations: {str(e)}")
+            return []
+        # Rebuilt whenever the catalog changes
+        if self._locations is None or self._locations_version != snapshot.version:
+            # Longest first so "South Africa" wins over "Africa"
+            self._locations = sorted(snapshot.locations, key=len, reverse=True)
+            self._locations_version = snapshot.version
+        return self._locations
+
+    @staticmethod
+    def parse_price(amount: str, unit: Optional[str]) -> int:
+        value = float(amount.replace(",", ""))
+        if unit in ("k", "thousand"):
+            value *= 1000
+        elif unit:
+            value *= 100000
+        return int(value)
+
+    def extract(self, text: str) -> Optional[Dict]:
+        """Return search_packages arguments for a plain filter request, else None"""
+        text = " ".join(text.lower().split())
+        args: Dict[str, Any] = {}
+
+        match = PRICE_PATTERN.search(text)
+        if match:
+            args['price'] = self.parse_price(match.group(1), match.group(2))
+            text = text[:match.start()] + " " + text[match.end():]
+
+        match = DURATION_PATTERN.search(text)
+        if match:
+            args['duration'] = int(match.group(1))
+        else:
+            match = WEEK_PATTERN.search(text)
+            if match:
+                args['duration'] = 14 if match.group(1) in ("two", "2") else 7
+        if match:
+            text = text[:match.start()] + " " + text[match.end():]
+
+        for location in self.locations():
+            match = re.search(rf"\b{re.escape(location.lower())}\b", text)
+            if match:
+                args['location'] = location
+                text = text[:match.start()] + " " + text[match.end():]
+                break
+
+        words = re.findall(r"[a-z]+|\d+", text)
+        for destination_type, keywords in DESTINATION_TYPE_KEYWORDS.items():
+            if any(word in keywords for word in words):
+                args['destination_type'] = destination_type
+                words = [word for word in words if word not in keywords]
+                break
+
+        if not (args.get('location') or args.get('destination_type')):
+            return None
+        if not any(word in PACKAGE_INTENT_WORDS for word in words):
+            return None
+        if any(word not in PACKAGE_INTENT_WORDS and word not in FAST_PATH_FILLER for word in words):
+            return None
+
+        # Location is more specific; the two are never combined (same rule as the prompt)
+        if args.get('location'):
+            args.pop('destination_type', None)
+        return args
+
+def describe_package_search(args: Dict) -> str:
+    """Human readable summary of search_packages arguments"""
+    text = f"{args['destination_type']} packages" if args.get('destination_type') else "packages"
+    if args.get('location'):
+        text += f" in {args['location']}"
+    if args.get('duration'):
+        text += f" for {args['duration']} days"
+    if args.get('price') is not None:
+        text += f" under ₹{args['price']:,} per person"
+    return text
+
+def render_package_results(args: Dict, results: Optional[Dict]) -> str:
+    """Template reply listing the packages found by the fast path"""
+    criteria = describe_package_search(args)
+    if results is None:
+        return f"I'm sorry, I couldn't search for {criteria} just now. Could you please try again in a moment?"
+
+    packages = results.get('packages') or []
+    if not packages:
+        return (
+            f"I couldn't find any {criteria}. We offer a wide range of options, so I'd be happy to look "
+            "with a different budget, duration or destination. What would you like to change?"
+        )
+
+    # The search returns the cheapest packages first
+    total = results.get('total_found', len(packages))
+    shown = packages[:FAST_PATH_MAX_PACKAGES]
+    if total == 1:
+        header = f"I found one match for {criteria}:"
+    elif total > len(shown):
+        header = f"I found {total} {criteria}. Here are the {len(shown)} best priced:"
+    else:
+        header = f"Here are the {total} {criteria} I found:"
+    lines = [header, ""]
+    for idx, package in enumerate(shown, 1):
+        lines.append(
+            f"{idx}. **{package['package_name']}** - Cities: {', '.join(package['cities_included'])} | "
+            f"Price: ₹{package['price']} per person | Duration: {package['duration']} days | "
+            f"Hotels: {package['hotel']} | [View details]({package['url']})"
+        )
+    lines.append("")
+    lines.append("Would you like the itinerary of any of these packages, or should I refine the search?")
+    return "\n".join(lines)
+
+#########################################################
+# Semantic response cache: near-identical catalog questions ("do you have Dubai
+# tours") reuse an earlier answer instead of another model round trip
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "true").lower() != "false"
+
+# Only turns that read the catalog (and nothing else) are context independent
+CACHEABLE_TOOLS = {"search_packages", "get_package_itinerary"}
+
+# Questions that refer back to the conversation can't be answered from another one
+REFERENTIAL_WORDS = {
+    "it", "its", "this", "that", "these", "those", "them", "they", "one", "ones", "first",
+    "second", "third", "fourth", "fifth", "last", "above", "same", "previous", "earlier",
+    "other", "yes", "no", "ok", "okay", "sure", "book", "booking", "confirm", "hotel", "hotels",
+}
+
+CACHE_STOPWORDS = {
+    "the", "a", "an", "of", "for", "is", "are", "what", "whats", "s", "do", "does", "you",
+    "have", "please", "can", "could", "me", "show", "tell", "about", "any", "there", "to",
+    "in", "on", "i", "we", "want", "would", "like", "know", "your", "some", "give",
+}
+
+# Tool arguments that only shape the answer, not what it is about
+CACHE_NEUTRAL_ARGS = {"limit", "sort_by"}
+
+QUESTION_NUMBER_PATTERN = re.compile(r"(\d+(?:[.,]\d+)*)\s*(k|thousand|l|lakhs?|lacs?)?\b")
+
+# Which way a price comparison points; upper bounds are matched (and removed) first,
+# so "not more than" is not read as a lower bound
+UPPER_BOUND_PATTERN = re.compile(
+    r"\b(?:under|below|within|less than|lower than|cheaper than|upto|up to|max(?:imum)?|"
+    r"not more than|no more than|at most|budget)\b"
+)
+LOWER_BOUND_PATTERN = re.compile(
+    r"\b(?:over|above|more than|greater than|higher than|costlier than|at least|min(?:imum)?|"
+    r"upwards of|starting (?:at|from))\b"
+)
+
+def question_amounts(question: str) -> Set[int]:
+    """Numbers stated in a question with their unit applied (50k -> 50000, 2 lakh -> 200000, a week -> 7)"""
+    text = " ".join(question.lower().split())
+    amounts = {
+        PackageQueryRouter.parse_price(amount, unit or None)
+        for amount, unit in QUESTION_NUMBER_PATTERN.findall(text)
+    }
+    for count in WEEK_PATTERN.findall(text):
+        amounts.add(14 if count in ("two", "2") else 7)
+    return amounts
+
+def price_bounds(question: str) -> FrozenSet[str]:
+    """"max" and/or "min" for the price comparisons in a question ("under 50k", "over 2 lakh")"""
+    text = " ".join(question.lower().split())
+    bounds = set()
+    if UPPER_BOUND_PATTERN.search(text):
+        bounds.add("max")
+        text = UPPER_BOUND_PATTERN.sub(" ", text)
+    if LOWER_BOUND_PATTERN.search(text):
+        bounds.add("min")
+    return frozenset(bounds)
+
+def question_terms(question: str):
+    """Numbers (plain, in thousands/lakhs and weeks as days) and words stated in a question"""
+    text = " ".join(question.lower().split())
+    numbers = question_amounts(text)
+    for amount, _ in QUESTION_NUMBER_PATTERN.findall(text):
+        numbers.add(PackageQueryRouter.parse_price(amount, None))
+    return numbers, set(re.findall(r"[a-z0-9]+", text))
+
+def grounded_in_question(question: str, turn: List[BaseMessage]) -> bool:
+    """
+    True when every tool argument of the turn was taken from the question
+
+    A trip_id may also come from a tool result earlier in the same turn. An
+    argument the model brought in from anywhere else (the conversation, the
+    trip details, a guess) makes the turn unfit to answer someone else.
+    """
+    numbers, words = question_terms(question)
+    results = ""
+    for message in turn:
+        if isinstance(message, ToolMessage):
+            results += f" {message.content}"
+            continue
+        for call in getattr(message, 'tool_calls', None) or []:
+            for name, value in (call.get('args') or {}).items():
+                if value is None or name in CACHE_NEUTRAL_ARGS:
+                    continue
+                if name == 'cursor' or isinstance(value, bool):
+                    return False
+                if name == 'trip_id':
+                    if str(value).lower() not in question.lower() and str(value) not in results:
+                        return False
+                elif name == 'destination_type':
+                    keywords = set(DESTINATION_TYPE_KEYWORDS.get(value, ()))
+                    if not (keywords & words or set(re.findall(r"[a-z0-9]+", str(value).lower())) <= words):
+                        return False
+                elif isinstance(value, (int, float)):
+                    if value not in numbers:
+                        return False
+                elif isinstance(value, str):
+                    terms = set(re.findall(r"[a-z0-9]+", value.lower()))
+                    if not terms or not terms <= words:
+                        return False
+                else:
+                    return False
+    return True
+
+def normalize_question(text: str) -> List[str]:
+    """Lowercased content words of a question"""
+    return [word for word in re.findall(r"[a-z0-9]+", text.lower()) if word not in CACHE_STOPWORDS]
+
+def embed_text(words: List[str], dims: int = 1024) -> Dict[int, float]:
+    """
+    Offline hashing embedding: words and character trigrams are hashed into
+    `dims` buckets and the sparse vector is L2-normalized
+    """
+    vector: Dict[int, float] = {}
+    features = [(f"w:{word}", 1.0) for word in words]
+    padded = f" {' '.join(words)} "
+    features += [(f"c:{padded[i:i + 3]}", 0.5) for i in range(len(padded) - 2)]
+    for feature, weight in features:
+        index = zlib.crc32(feature.encode("utf-8")) % dims
+        vector[index] = vector.get(index, 0.0) + weight
+    norm = sum(value * value for value in vector.values()) ** 0.5 or 1.0
+    return {index: value / norm for index, value in vector.items()}
+
+def cosine(a: Dict[int, float], b: Dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(index, 0.0) for index, value in a.items())
+
+class ResponseCache:
+    """
+    LRU cache of catalog answers keyed by question similarity
+
+    A lookup hits when an entry's embedding is within `threshold` cosine
+    similarity of the question and both mention the same amounts, price
+    comparison and catalog locations ("6 day Bali" never matches "7 day
+    Bali", "under 50k" never matches "under 90k" or "over 50k"). Only turns
+    whose tool arguments all come from the question are stored. Every
+    entry is tagged with the catalog version; when tour_packages changes,
+    the whole cache is dropped.
+    """
+    def __init__(
+        self,
+        package_api: "TourPackageAPI",
+        router: "PackageQueryRouter",
+        threshold: float = 0.85,
+        max_entries: int = 1000
+    ):
+        self.package_api = package_api
+        self.router = router
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self._version: Optional[int] = None
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'invalidations': 0}
+
+    def _signature(self, text: str):
+        """Amounts (unit applied), price comparison direction and catalog locations of a question"""
+        lowered = text.lower()
+        locations = frozenset(
+            location for location in self.router.locations()
+            if re.search(rf"\b{re.escape(location.lower())}\b", lowered)
+        )
+        return frozenset(question_amounts(text)), price_bounds(text), locations
+
+    def _check_version(self) -> int:
+        version = self.package_api.snapshot().version
+        with self._lock:
+            if version != self._version:
+                if self._entries:
+                    self._stats['invalidations'] += 1
+                self._entries.clear()
+                self._version = version
+        return version
+
+    @staticmethod
+    def cacheable(question: str) -> bool:
+        return not any(word in REFERENTIAL_WORDS for word in re.findall(r"[a-z]+", question.lower()))
+
+    def lookup(self, question: str) -> Optional[List[BaseMessage]]:
+        """Return the cached messages of a similar earlier turn, or None"""
+        if not self.cacheable(question):
+            return None
+        try:
+            self._check_version()
+        except Exception as e:
+            print(f"Error checking catalog version: {str(e)}")
+            return None
+
+        words = normalize_question(question)
+        vector = embed_text(words)
+        signature = self._signature(question)
+        with self._lock:
+            best_key, best_score = None, self.threshold
+            for key, entry in self._entries.items():
+                if entry['signature'] != signature:
+                    continue
+                score = cosine(vector, entry['vector'])
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self._stats['hits'] += 1
+            return self._entries[best_key]['messages']
+
+    def remember(self, question: str, turn: List[BaseMessage]) -> None:
+        """Cache a completed turn if it only read the catalog, with arguments taken from the question"""
+        tool_calls = [call for message in turn for call in (getattr(message, 'tool_calls', None) or [])]
+        if not tool_calls or any(call['name'] not in CACHEABLE_TOOLS for call in tool_calls):
+            return
+        if not self.cacheable(question) or not grounded_in_question(question, turn):
+            return
+        try:
+            version = self._check_version()
+        except Exception as e:
+            print(f"Error checking catalog version: {str(e)}")
+            return
+
+        words = normalize_question(question)
+        key = " ".join(words)
+        with self._lock:
+            if version != self._version:
+                return
+            self._entries[key] = {
+                'vector': embed_text(words),
+                'signature': self._signature(question),
+                'messages': list(turn)
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._stats['stores'] += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters since startup"""
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+def replay_turn(messages: List[BaseMessage]) -> List[BaseMessage]:
+    """Copy cached turn messages with fresh message and tool call ids"""
+    call_ids = {}
+    replayed = []
+    for message in messages:
+        if isinstance(message, ToolMessage):
+            replayed.append(message.model_copy(update={
+                'id': None,
+                'tool_call_id': call_ids.get(message.tool_call_id, message.tool_call_id)
+            }))
+        elif getattr(message, 'tool_calls', None):
+            tool_calls = []
+            for call in message.tool_calls:
+                call_ids[call['id']] = f"call_{uuid.uuid4().hex[:24]}"
+                tool_calls.append({**call, 'id': call_ids[call['id']]})
+            replayed.append(AIMessage(content=message.content, tool_calls=tool_calls))
+        else:
+            replayed.append(AIMessage(content=message.content))
+    return replayed
+
 #########################################################
 prompt1 = ChatPromptTemplate.from_messages(
     [
@@ -445,12 +3077,15 @@ prompt1 = ChatPromptTemplate.from_messages(
                The information about the tour packages can be accessed using the search_packages tool. Only the packages that are part of the search_packages tool should be proposed to customer
                You can call the search packages tool giving the following arguments: location (City, Country or Region), destination_type (Beach/Island, Wildlife/Nature, Culture, Heritage, 
                Shopping, Other), duration (approximate number of days), price (Maximum price per person). Do not leave arguments blank when making search packages tool call
+               - When customers mention specific sights, activities or smaller cities (e.g. "Ubud monkey forest"), pass those words in the query argument.
                - Do not use both location and destination_type arguments together in the search_packages tool call. Location is more specific and destination_type is more general.
-               The search_packages tool will return a list of packages that match the search criteria. 
-               From the list of packages, propose the packages that best fit customer's preferences (It has other details like  tour type (value, premium, standard), cities included, 
-               destination_type, and itinerary data (which can be used to propose the packages)
-               Share the package name, cities included, price per person, duration, tour type, destination_type, hotels: Included/Not Included, View details link (url)
-               When customers ask about itinerary of a package, share the details from 'itinerary_data' for the specific itinerary, Do not respond with generic information.
+               The search_packages tool will return a compact list of packages that match the search criteria (trip_id, package name, price, duration, cities included, hotel, url). 
+               - Results come sorted (cheapest first by default, most relevant first for query searches) and limited; total_found tells how many matched. Pass next_cursor as cursor
+                 to see more. When the duration is approximate, use sort_by closest_duration instead of an exact duration match.
+               From the list of packages, propose the packages that best fit customer's preferences.
+               Share the package name, cities included, price per person, duration, hotels: Included/Not Included, View details link (url)
+               When customers ask about itinerary of a package, call the get_package_itinerary tool with the package's trip_id and share the details for the specific itinerary, 
+               Do not respond with generic information.
                Flow of conversation:
                - Keep the welcome message short (3-4 sentences). Ask how you could help them 
                - While asking for preferences be sure to mention that you offer a wide range of options and you would be happy to help them finalize the trip within any required budget
@@ -461,8 +3096,11 @@ prompt1 = ChatPromptTemplate.from_messages(
                - If the selected itinerary does not include hotel accommodation (indicated by 'Not Included' or 'Included' status in 'hotel' column of tour package table), ask customer 
                  if they want you to help with booking the hotel. If they are interested inform the customer that you will get back shortly after checking hotel availability details 
                  and call search_hotels tool (with appropriate search_params format) for gathering hotel details and call Search_hotels_tool to get the hotel availability details.
+                    - When there are multiple cities included in the itinerary, call the search_hotels_batch tool once with one leg (city, arrival date, departure date) per city 
+                      instead of calling search_hotels for each city. It returns the cheapest and best rated hotels for every city.
                     - Once you receive the hotel search results, Inform the customer of first, second, third cheapest options (as best priced options) and the best rated options,
                       along with information like Hotel name, location and facilities, price and display the pictures. Ask the customer's choice for the hotel.
+                    - Hotel search results are compact; call get_hotel_details with a hotel_id when the customer wants more details about a hotel.
                     - When there are multiple cities included in the itinerary, do this for all the cities.
                     - Once all the hotels are finalized, inform that you will be proceeding with the booking and they will be receiving confirmation and payment links via email. 
                - Once the tour package, and hotel bookings are confirmed, Share all these details (package name, cities included, duration, start date of trip, Total cost of trip 
@@ -478,11 +3116,40 @@ prompt1 = ChatPromptTemplate.from_messages(
     ]
 )
 
+# prompt1 has no variables besides the history, so the system message is
+# rendered once. Together with the tool schemas (bound once in bind_tools)
+# it forms a byte-identical prefix for every request, which the provider's
+# prompt cache can reuse.
+SYSTEM_MESSAGE = prompt1.format_messages(messages=[])[0]
+
 class SearchPackagesParams(BaseModel):
     location: Optional[str] = Field(None, description="Name of the destination")
     duration: Optional[int] = Field(None, description="Number of days for the tour")
     price: Optional[float] = Field(None, description="Maximum price per person")
     destination_type: Optional[str] = Field(None, description="Type of destination (Beach/Island, Wildlife/Nature, etc.)")
+    query: Optional[str] = Field(None, description="Free-text keywords such as sights, activities or cities (e.g. 'Ubud monkey forest')")
+    sort_by: Optional[Literal["relevance", "price", "price_desc", "duration", "closest_duration"]] = Field(
+        None,
+        description="Order of the results. Default: relevance with a query, else price (cheapest first). "
+                    "closest_duration treats duration as the preferred length instead of an exact match"
+    )
+    limit: int = Field(SEARCH_PACKAGES_LIMIT, description=f"Maximum number of packages to return (up to {SEARCH_PACKAGES_MAX_LIMIT})")
+    cursor: Optional[str] = Field(None, description="next_cursor from the previous search_packages result, to get the next page of the same search")
+
+class HotelLeg(BaseModel):
+    city: str = Field(..., description="City of this stay")
+    arrival_date: str = Field(..., description="Check-in date (YYYY-MM-DD)")
+    departure_date: str = Field(..., description="Check-out date (YYYY-MM-DD)")
+
+class SearchHotelsBatchParams(BaseModel):
+    legs: List[HotelLeg] = Field(..., description="One stay per city of the itinerary, in travel order")
+    adults: int = Field(..., description="Number of adults")
+    children: int = Field(0, description="Number of children")
+    rooms: int = Field(1, description="Number of rooms")
+    min_rating: float = Field(0.0, description="Minimum review score")
+
+class PackageItineraryParams(BaseModel):
+    trip_id: str = Field(..., description="Trip ID of the package (from search_packages)")
 
 class WriteToDatabaseParams(BaseModel):
     #Customer_name: str = Field(..., description="Name of the Customer")
@@ -494,52 +3161,176 @@ class WriteToDatabaseParams(BaseModel):
     Tot_children: Optional[int] = Field(None, description="Number of children in the trip")
     Tot_cost: str = Field(..., description="Total cost of the trip")
     Hotel_bookings: Optional[str] = Field(None, description="Details of the hotel bookings (Hotel name, check in date, check out date)")
+    # Injected by ToolNode from the conversation's own graph state (hidden from the model)
+    state: Annotated[Dict, InjectedState]
 
 #Initiating LLM Model
 
-model = ChatOpenAI(model = 'gpt-4o-mini', temperature=0.1)
+@functools.lru_cache(maxsize=None)
+def get_model():
+    """Chat model, created on first use"""
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(model = 'gpt-4o-mini', temperature=0.1, stream_usage=True)  # usage (incl. cached tokens) on streamed replies too
 
 class State(MessagesState):    # First define State
     trip_details: Optional[Dict] = None
+    summary: Optional[str] = None
     user_email: Optional[str] = None
     user_mobile: Optional[str] = None
     user_name: Optional[str] = None
 
 
-TripPlan = StateGraph(State)   # Then use State
+@functools.lru_cache(maxsize=None)
+def get_hotel_api() -> HotelSearchAPI:
+    """Hotel search client (HTTP pool, caches, worker threads), created on first use"""
+    return HotelSearchAPI(api_key=os.getenv("RAPIDAPI_KEY"))
+
+@functools.lru_cache(maxsize=None)
+def get_tour_package_api() -> TourPackageAPI:
+    """Package catalog, opened and migrated on first use rather than at import"""
+    return TourPackageAPI()
+
+def deferred_method(factory, method):
+    """
+    Stand-in for `factory().<method>` that calls the factory only when invoked
 
-hotel_api = HotelSearchAPI(api_key=os.getenv("RAPIDAPI_KEY"))
+    Keeps the method's signature (without self) and docstring, so tools built
+    from it infer the same argument schema as from the bound method.
+    Pass the factory as `lambda: get_x()` so a replaced factory is picked up.
+    """
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            return await getattr(factory(), method.__name__)(*args, **kwargs)
+    else:
+        @functools.wraps(method)
+        def call(*args, **kwargs):
+            return getattr(factory(), method.__name__)(*args, **kwargs)
+    signature = inspect.signature(method)
+    call.__signature__ = signature.replace(parameters=list(signature.parameters.values())[1:])
+    return call
 
 search_hotels_tool = StructuredTool.from_function(
     name="search_hotels",
-    description="Search for hotels in a city with given details.",
-    func=hotel_api.search_hotels,
+    description="Search for hotels in a city with given details. Returns the cheapest and the best rated hotels in compact form.",
+    func=deferred_method(lambda: get_hotel_api(), HotelSearchAPI.search_hotels_ranked),
+    coroutine=deferred_method(lambda: get_hotel_api(), HotelSearchAPI.asearch_hotels_ranked),
+)
+
+hotel_details_tool = StructuredTool.from_function(
+    name="get_hotel_details",
+    description="Get the full details (description, location, original price) of a hotel returned by a hotel search, by its hotel_id.",
+    func=deferred_method(lambda: get_hotel_api(), HotelSearchAPI.get_hotel_details),
+)
+
+search_hotels_batch_tool = StructuredTool.from_function(
+    name="search_hotels_batch",
+    description="Search hotels for all cities of a multi-city itinerary in one step. Returns the 3 cheapest and 3 best rated hotels per city.",
+    func=lambda legs, **params: get_hotel_api().search_hotels_batch([dict(leg) for leg in legs], **params),
+    coroutine=lambda legs, **params: get_hotel_api().asearch_hotels_batch([dict(leg) for leg in legs], **params),
+    args_schema=SearchHotelsBatchParams
 )
 
-tour_package_api = TourPackageAPI()
 search_packages_tool = StructuredTool.from_function(
     name="search_packages",
-    description="Search for available tour packages based on location, tour type, price, and duration. Returns package details including package name, cities included, URL, and more.",
-    func=tour_package_api.search_packages,
+    description="Search for available tour packages based on location, tour type, price, and duration. Returns the best matches first (at most `limit`) as a compact summary per package: trip ID, package name, price, duration, cities included, hotel and URL, plus total_found and a next_cursor when more packages match.",
+    func=deferred_method(lambda: get_tour_package_api(), TourPackageAPI.search_packages),
+    coroutine=deferred_method(lambda: get_tour_package_api(), TourPackageAPI.asearch_packages),
     args_schema=SearchPackagesParams
 )
 
+package_itinerary_tool = StructuredTool.from_function(
+    name="get_package_itinerary",
+    description="Get the day-by-day itinerary of a tour package by its trip ID.",
+    func=deferred_method(lambda: get_tour_package_api(), TourPackageAPI.get_package_itinerary),
+    coroutine=deferred_method(lambda: get_tour_package_api(), TourPackageAPI.aget_package_itinerary),
+    args_schema=PackageItineraryParams
+)
+
 DB_update_tool = StructuredTool.from_function(
     name="write_to_database",
     description="Write the customer details and booking information to the database",
-    func=lambda **params: write_to_database({**params}),
+    func=lambda state, **params: write_to_database({**params}, state, current_thread_id()),
+    coroutine=lambda state, **params: awrite_to_database({**params}, state, current_thread_id()),
     args_schema=WriteToDatabaseParams
 )
 
-tools = [search_hotels_tool, search_packages_tool, DB_update_tool]  # Register the tools
-model_with_tools = model.bind_tools(tools, parallel_tool_calls=False)
+tools = [search_hotels_tool, search_hotels_batch_tool, hotel_details_tool, search_packages_tool, package_itinerary_tool, DB_update_tool]  # Register the tools
+
+@functools.lru_cache(maxsize=None)
+def get_model_with_tools():
+    return get_model().bind_tools(tools, parallel_tool_calls=False)
+
+def model_input(state: State) -> List[BaseMessage]:
+    """
+    Assemble the messages sent to the model for this state
+
+    Ordered from most to least stable: the static system prompt, the
+    conversation history (append only between compactions) and last the
+    summary and trip details, which change from turn to turn. Putting the
+    context last keeps everything before it cacheable.
+    """
+    messages = [SYSTEM_MESSAGE] + state["messages"]
+    context = conversation_context(state)
+    if context:
+        messages.append(SystemMessage(context))
+    return messages
+
+def prompt_usage(messages: List[BaseMessage]) -> Optional[Dict[str, int]]:
+    """Sum the input tokens of the model calls among `messages`, split by prompt cache hits"""
+    usage = {'calls': 0, 'input': 0, 'cached': 0}
+    for message in messages:
+        metadata = getattr(message, 'usage_metadata', None)
+        if not metadata:
+            continue
+        usage['calls'] += 1
+        usage['input'] += metadata.get('input_tokens', 0)
+        usage['cached'] += (metadata.get('input_token_details') or {}).get('cache_read', 0) or 0
+    if not usage['calls']:
+        return None
+    usage['uncached'] = usage['input'] - usage['cached']
+    return usage
+
+def report_prompt_usage(messages: List[BaseMessage]) -> None:
+    usage = prompt_usage(messages)
+    if usage:
+        share = usage['cached'] / usage['input'] * 100 if usage['input'] else 0.0
+        print(
+            f"Input tokens: {usage['input']} ({usage['cached']} cached, {usage['uncached']} uncached, "
+            f"{share:.0f}% from the prompt cache) over {usage['calls']} model call(s)"
+        )
+
+def turn_messages(messages: List[BaseMessage]) -> List[BaseMessage]:
+    """Messages added after the last user message"""
+    start = max((i for i, message in enumerate(messages) if isinstance(message, HumanMessage)), default=-1)
+    return messages[start + 1:]
+
+def opens_conversation(state: State) -> bool:
+    """
+    True while answering the first user message of a conversation
+
+    Later turns may depend on what was said before (a budget, a chosen
+    package), so only opening turns take the fast path or are answered
+    from or stored in the response cache.
+    """
+    messages = state["messages"]
+    start = max((i for i, message in enumerate(messages) if isinstance(message, HumanMessage)), default=None)
+    return start == 0 and not state.get("summary") and not state.get("trip_details")
+
+def remember_turn(state: State, response: BaseMessage) -> None:
+    """Offer a finished opening turn to the response cache"""
+    if not RESPONSE_CACHE_ENABLED or response.tool_calls or not opens_conversation(state):
+        return
+    messages = state["messages"]
+    start = max((i for i, message in enumerate(messages) if isinstance(message, HumanMessage)), default=None)
+    if start is None or not isinstance(messages[start].content, str):
+        return
+    get_response_cache().remember(messages[start].content, messages[start + 1:] + [response])
 
 def call_model(state: State):
-    # Store the current state
-    StateManager.set_state(state)
-    
-    model_with_message = prompt1.format_messages(messages=state["messages"])
-    response = model_with_tools.invoke(model_with_message)
+    response = get_model_with_tools().invoke(model_input(state))
+    remember_turn(state, response)
     
     return {
         "messages": [response],
@@ -547,17 +3338,296 @@ def call_model(state: State):
         "user_mobile": state.get("user_mobile")
     }
 
-TripPlan.add_node("model", call_model)
-TripPlan.add_node("tools", ToolNode(tools))
+async def acall_model(state: State):
+    response = await get_model_with_tools().ainvoke(model_input(state))
+    remember_turn(state, response)
 
-TripPlan.add_edge(START, "model")
-TripPlan.add_conditional_edges(
-    "model",
-    tools_condition,
-)
-TripPlan.add_edge("tools", "model")
-memory = MemorySaver()
-TravelAssistant = TripPlan.compile(checkpointer=memory)
+    return {
+        "messages": [response],
+        "user_email": state.get("user_email"),
+        "user_mobile": state.get("user_mobile")
+    }
+
+@functools.lru_cache(maxsize=None)
+def get_package_router() -> PackageQueryRouter:
+    return PackageQueryRouter(get_tour_package_api())
+
+@functools.lru_cache(maxsize=None)
+def get_response_cache() -> ResponseCache:
+    return ResponseCache(
+        get_tour_package_api(),
+        get_package_router(),
+        threshold=float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.85")),
+        max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+    )
+
+def fast_path_args(state: State) -> Optional[Dict]:
+    if not FAST_PATH_ENABLED:
+        return None
+    last = state["messages"][-1]
+    if not isinstance(last, HumanMessage) or not isinstance(last.content, str):
+        return None
+    # Constraints stated earlier in the conversation are left to the model
+    if not opens_conversation(state):
+        return None
+    return get_package_router().extract(last.content)
+
+def route_turn(state: State) -> str:
+    """Send plain package filter requests to the fast path, everything else to the response cache"""
+    return "fast_path" if fast_path_args(state) else "response_cache"
+
+def answer_package_query(state: State):
+    """
+    Answer a package filter request without the model
+
+    The search is recorded as a regular search_packages tool call and result,
+    so later model turns see the same history as if the model had made it.
+    """
+    args = {**fast_path_args(state), 'limit': FAST_PATH_MAX_PACKAGES}
+    call_id = f"call_{uuid.uuid4().hex[:24]}"
+    results = get_tour_package_api().search_packages(**args)
+    return {
+        "messages": [
+            AIMessage("", tool_calls=[{"name": "search_packages", "args": args, "id": call_id}]),
+            ToolMessage(content=json.dumps(results, ensure_ascii=False), name="search_packages", tool_call_id=call_id),
+            AIMessage(render_package_results(args, results))
+        ]
+    }
+
+def answer_from_cache(state: State):
+    """Replay the answer of an earlier, near-identical catalog question"""
+    last = state["messages"][-1]
+    if not RESPONSE_CACHE_ENABLED or not isinstance(last, HumanMessage) or not isinstance(last.content, str):
+        return {"messages": []}
+    if not opens_conversation(state):
+        return {"messages": []}
+    cached = get_response_cache().lookup(last.content)
+    if cached is None:
+        return {"messages": []}
+    return {"messages": replay_turn(cached)}
+
+def route_cache(state: State) -> str:
+    """End the turn on a cache hit, otherwise ask the model"""
+    last = state["messages"][-1]
+    return END if isinstance(last, AIMessage) and not last.tool_calls else "model"
+
+def build_travel_assistant():
+    """Wire and compile the conversation graph with its checkpointer"""
+    TripPlan = StateGraph(State)
+    TripPlan.add_node("compact", compact_context)
+    TripPlan.add_node("fast_path", answer_package_query)
+    TripPlan.add_node("response_cache", answer_from_cache)
+    TripPlan.add_node("model", RunnableLambda(call_model, afunc=acall_model))
+    TripPlan.add_node("tools", ToolNode(tools))
+
+    TripPlan.add_edge(START, "compact")
+    TripPlan.add_conditional_edges("compact", route_turn, ["fast_path", "response_cache"])
+    TripPlan.add_edge("fast_path", END)
+    TripPlan.add_conditional_edges("response_cache", route_cache, ["model", END])
+    TripPlan.add_conditional_edges(
+        "model",
+        tools_condition,
+    )
+    TripPlan.add_edge("tools", "model")
+
+    # Deliver confirmation emails left pending by an earlier run
+    email_outbox.start()
+    return TripPlan.compile(checkpointer=create_checkpointer())
+
+_travel_assistant = None
+_travel_assistant_lock = threading.Lock()
+
+def get_travel_assistant():
+    """
+    The compiled graph, built on first use
+
+    Importing this module stays cheap; the chat model client and the graph
+    are only created by the first turn (or by warm_up).
+    """
+    global _travel_assistant
+    if _travel_assistant is None:
+        with _travel_assistant_lock:
+            if _travel_assistant is None:
+                _travel_assistant = build_travel_assistant()
+    return _travel_assistant
+
+def warm_up() -> threading.Thread:
+    """Build the model client, the graph and the catalog in the background so the first turn doesn't wait"""
+    def build():
+        try:
+            get_model_with_tools()
+            get_travel_assistant()
+            get_tour_package_api().snapshot()
+            get_hotel_api()
+        except Exception as e:
+            print(f"Error warming up the assistant: {str(e)}")
+
+    thread = threading.Thread(target=build, name="assistant-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+def __getattr__(name: str):
+    # Module-level names of the objects that are now built lazily
+    if name == "TravelAssistant":
+        return get_travel_assistant()
+    if name == "memory":
+        return get_travel_assistant().checkpointer
+    if name == "model":
+        return get_model()
+    if name == "model_with_tools":
+        return get_model_with_tools()
+    if name == "hotel_api":
+        return get_hotel_api()
+    if name == "tour_package_api":
+        return get_tour_package_api()
+    if name == "package_router":
+        return get_package_router()
+    if name == "response_cache":
+        return get_response_cache()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+if os.getenv("LAZY_INIT", "true").lower() == "false":
+    get_travel_assistant()
+    get_tour_package_api()
+    get_hotel_api()
+
+# Progress messages shown while a tool runs
+TOOL_PROGRESS = {
+    "search_hotels": "Searching hotels…",
+    "search_hotels_batch": "Searching hotels in every city of the itinerary…",
+    "get_hotel_details": "Loading hotel details…",
+    "search_packages": "Searching tour packages…",
+    "get_package_itinerary": "Loading the itinerary…",
+    "write_to_database": "Confirming your booking…",
+}
+
+def turn_input(
+    user_input: str,
+    user_email: Optional[str] = None,
+    user_mobile: Optional[str] = None,
+    user_name: Optional[str] = None
+) -> Dict:
+    """Graph input for one turn: the new message plus the user details"""
+    return {
+        "messages": [HumanMessage(user_input)],
+        "user_email": user_email,
+        "user_mobile": user_mobile,
+        "user_name": user_name
+    }
+
+def run_turn(
+    thread_id: str,
+    user_input: str,
+    user_email: Optional[str] = None,
+    user_mobile: Optional[str] = None,
+    user_name: Optional[str] = None
+) -> BaseMessage:
+    """
+    Send one user message to the assistant and return its reply
+
+    Only the new HumanMessage is sent; earlier turns are restored from the
+    thread's checkpoint, so callers don't need to keep the full history.
+    """
+    config = {"configurable": {"thread_id": thread_id}}
+    output = get_travel_assistant().invoke(turn_input(user_input, user_email, user_mobile, user_name), config)
+    report_prompt_usage(turn_messages(output["messages"]))
+    return output["messages"][-1]
+
+async def arun_turn(
+    thread_id: str,
+    user_input: str,
+    user_email: Optional[str] = None,
+    user_mobile: Optional[str] = None,
+    user_name: Optional[str] = None
+) -> BaseMessage:
+    """Async variant of run_turn; the model, tools and checkpoints are awaited end to end"""
+    config = {"configurable": {"thread_id": thread_id}}
+    output = await get_travel_assistant().ainvoke(turn_input(user_input, user_email, user_mobile, user_name), config)
+    report_prompt_usage(turn_messages(output["messages"]))
+    return output["messages"][-1]
+
+def stream_events(mode: str, payload):
+    """Translate one ("messages" | "updates") graph stream item into chat events"""
+    if mode == "messages":
+        chunk, metadata = payload
+        if metadata.get("langgraph_node") == "model" and isinstance(chunk, AIMessageChunk) and chunk.content:
+            yield "token", chunk.content
+    elif "model" in payload:
+        message = payload["model"]["messages"][-1]
+        if message.tool_calls:
+            for call in message.tool_calls:
+                yield "status", TOOL_PROGRESS.get(call["name"], "Working on it…")
+        else:
+            yield "reply", message
+    elif "fast_path" in payload:
+        yield "reply", payload["fast_path"]["messages"][-1]
+    elif (payload.get("response_cache") or {}).get("messages"):
+        yield "reply", payload["response_cache"]["messages"][-1]
+
+def stream_turn(
+    thread_id: str,
+    user_input: str,
+    user_email: Optional[str] = None,
+    user_mobile: Optional[str] = None,
+    user_name: Optional[str] = None
+):
+    """
+    Streaming variant of run_turn
+
+    Yields ("token", text) for every model token, ("status", text) when a
+    tool starts running and finally ("reply", message) with the complete
+    reply. The time to first token and the input tokens served from the
+    prompt cache are printed for each turn.
+    """
+    config = {"configurable": {"thread_id": thread_id}}
+    started = time.perf_counter()
+    first_token = None
+    responses = []
+
+    for mode, payload in get_travel_assistant().stream(
+        turn_input(user_input, user_email, user_mobile, user_name),
+        config,
+        stream_mode=["messages", "updates"]
+    ):
+        if mode == "updates" and "model" in payload:
+            responses.extend(payload["model"]["messages"])
+        for kind, value in stream_events(mode, payload):
+            if kind == "token" and first_token is None:
+                first_token = time.perf_counter() - started
+            yield kind, value
+
+    if first_token is not None:
+        print(f"Time to first token: {first_token:.2f}s (turn completed in {time.perf_counter() - started:.2f}s)")
+    report_prompt_usage(responses)
+
+async def astream_turn(
+    thread_id: str,
+    user_input: str,
+    user_email: Optional[str] = None,
+    user_mobile: Optional[str] = None,
+    user_name: Optional[str] = None
+):
+    """Async variant of stream_turn"""
+    config = {"configurable": {"thread_id": thread_id}}
+    started = time.perf_counter()
+    first_token = None
+    responses = []
+
+    async for mode, payload in get_travel_assistant().astream(
+        turn_input(user_input, user_email, user_mobile, user_name),
+        config,
+        stream_mode=["messages", "updates"]
+    ):
+        if mode == "updates" and "model" in payload:
+            responses.extend(payload["model"]["messages"])
+        for kind, value in stream_events(mode, payload):
+            if kind == "token" and first_token is None:
+                first_token = time.perf_counter() - started
+            yield kind, value
+
+    if first_token is not None:
+        print(f"Time to first token: {first_token:.2f}s (turn completed in {time.perf_counter() - started:.2f}s)")
+    report_prompt_usage(responses)
 
 # Modify the main block to allow importing without running the chat
 if __name__ == "__main__":
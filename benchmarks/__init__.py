@@ -0,0 +1,7 @@
+"""
+Benchmarks for Chat.py
+
+Run each one from the repository root as a module, e.g.
+`python -m benchmarks.fast_path_benchmark`. Every script prints its report
+and exits with status 1 when its check fails.
+"""
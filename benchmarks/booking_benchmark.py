@@ -0,0 +1,137 @@
+"""
+Booking write throughput benchmark for Chat.write_to_database
+
+Concurrent sessions (threads) each store WRITES bookings of 1 or 5 packages
+in a scratch booking database, through write_to_database and through the
+row-by-row insert loop it replaced (reference_write below, same schema and
+indexes). The two are run interleaved `runs` times per configuration and the
+median, min and max rows per second are reported, plus the rate of retried
+writes whose bookings are all stored already. Confirmation emails are
+queued in the outbox but never sent. Exits with status 1 when the median of
+write_to_database falls below the reference in any configuration.
+
+Usage: python -m benchmarks.booking_benchmark [runs]
+"""
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+from benchmarks.common import import_chat, scratch_directory
+
+# (sessions, packages per booking)
+CONFIGURATIONS = [(8, 1), (32, 1), (8, 5), (32, 5)]
+WRITES = 100
+
+Chat = import_chat()
+
+def reference_write(data, current_state=None, thread_id=None):
+    """write_to_database before idempotent bookings: one INSERT per package, no Booking_key"""
+    if not isinstance(data, list):
+        data = [data]
+    current_state = current_state or {}
+    user_email = current_state.get("user_email")
+    with Chat.db_manager.connection(Chat.BOOKING_DB_PATH) as conn:
+        with conn:
+            for package in data:
+                print("Data: ", package)
+                conn.execute('''
+                    INSERT INTO tour_packages
+                    (Customer_name, Customer_email, Customer_mobile, Package_name, Package_id,
+                    Trip_Start_date, Origin_city, Tot_adults, Tot_children, Tot_cost, Hotel_bookings)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    current_state.get("user_name"), user_email, current_state.get("user_mobile"),
+                    package['Package_name'], package['Package_id'], package['Trip_Start_date'],
+                    package['Origin_city'], package['Tot_adults'], package.get('Tot_children', 0),
+                    package['Tot_cost'],
+                    json.dumps(package['Hotel_bookings']) if package.get('Hotel_bookings') else None
+                ))
+            if user_email:
+                Chat.email_outbox.enqueue(
+                    conn, user_email, "Your BlingDestinations Tour Package Confirmation",
+                    Chat.build_confirmation_email(current_state, data)
+                )
+    return True
+
+def booking(session, write, packages):
+    return [
+        {
+            "Package_name": f"Package {package}",
+            "Package_id": f"PKG{session:03d}-{write:03d}-{package}",
+            "Trip_Start_date": "2026-12-01",
+            "Origin_city": "Mumbai",
+            "Tot_adults": 2,
+            "Tot_children": 0,
+            "Tot_cost": "100000",
+        }
+        for package in range(packages)
+    ]
+
+def fresh_database(workdir, name):
+    """Point the booking functions at a new, empty database with its own outbox"""
+    path = os.path.join(workdir, f"{name}.db")
+    Chat.db_manager.register_schema(path, Chat.setup_booking_schema)
+    Chat.BOOKING_DB_PATH = path
+    Chat.email_outbox = Chat.EmailOutboxWorker(db_path=path)
+    Chat.email_outbox.notify = lambda: None
+
+def rows_per_second(write, sessions, packages):
+    """Run every session's WRITES bookings concurrently; returns stored rows per second"""
+    def run_session(session):
+        state = {
+            "user_email": f"customer{session}@example.com",
+            "user_name": f"Customer {session}",
+            "user_mobile": f"+91 90000 {session:05d}",
+        }
+        for write_number in range(WRITES):
+            if not write(booking(session, write_number, packages), state, f"thread-{session}"):
+                raise RuntimeError("booking write failed")
+
+    threads = [threading.Thread(target=run_session, args=(session,)) for session in range(sessions)]
+    started = time.perf_counter()
+    # Both variants print every booking; keep that out of the terminal
+    with contextlib.redirect_stdout(io.StringIO()):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return sessions * WRITES * packages / (time.perf_counter() - started)
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    regressions = []
+    with scratch_directory("booking-benchmark-") as workdir:
+        try:
+            print(f"{'configuration':22} {'reference':>26} {'write_to_database':>26} {'retried':>10}")
+            for sessions, packages in CONFIGURATIONS:
+                samples = {"reference": [], "current": [], "retried": []}
+                for run in range(runs):
+                    fresh_database(workdir, f"reference-{sessions}-{packages}-{run}")
+                    samples["reference"].append(rows_per_second(reference_write, sessions, packages))
+                    fresh_database(workdir, f"current-{sessions}-{packages}-{run}")
+                    samples["current"].append(rows_per_second(Chat.write_to_database, sessions, packages))
+                    # Same bookings again: every key is stored, nothing is inserted or queued
+                    samples["retried"].append(rows_per_second(Chat.write_to_database, sessions, packages))
+
+                def describe(values):
+                    return f"{statistics.median(values) / 1000:5.1f}k/s ({min(values) / 1000:.1f}-{max(values) / 1000:.1f})"
+                print(
+                    f"{sessions:3} sessions x {packages} pkg  {describe(samples['reference']):>26} "
+                    f"{describe(samples['current']):>26} {statistics.median(samples['retried']) / 1000:7.1f}k/s"
+                )
+                if statistics.median(samples["current"]) < statistics.median(samples["reference"]):
+                    regressions.append(f"{sessions} sessions x {packages} pkg")
+        finally:
+            Chat.db_manager.close_all()
+
+    if regressions:
+        print(f"FAIL: write_to_database is slower than the row loop for: {', '.join(regressions)}")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
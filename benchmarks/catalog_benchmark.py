@@ -0,0 +1,204 @@
+"""
+Package filter benchmark for the normalized, indexed catalog columns
+
+Builds a synthetic catalog (default 100k packages, prices stored as grouped
+text like the scraped data, e.g. "1 02 100") in a scratch directory and runs
+the same four filters two ways: the original SQL on the raw text columns
+(`Price <= ?` compares text with a number) and the SQL on the price_value /
+duration_days / location_lc / destination_type_lc columns added by
+migrate_catalog, with their indexes. Reports the mean time of `runs` runs
+and the rows returned next to the correct count. Exits with status 1 when a
+normalized query returns a wrong count or is slower than the original one.
+
+Usage: python -m benchmarks.catalog_benchmark [packages] [runs]
+"""
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import time
+
+from benchmarks.common import import_chat, scratch_directory
+
+LOCATIONS = [
+    "Bali", "Dubai", "Mauritius", "Europe", "Thailand", "South Africa", "Australia", "Japan", "Turkey",
+    "Egypt", "South Korea", "Sri Lanka"
+]
+CITIES = ["Paris", "Rome", "Ubud", "Kuta", "Tokyo", "Kyoto", "Cairo", "Luxor", "Sydney", "Cairns", "Bangkok", "Phuket"]
+DESTINATION_TYPES = ["Beach/Island", "Wildlife/Nature", "Culture", "Heritage", "Shopping", "Other"]
+
+# (label, filters); prices are per person in rupees
+QUERIES = [
+    ("price<=30000", dict(price=30000)),
+    ("price<=50000, duration=6", dict(price=50000, duration=6)),
+    ("Beach/Island, 5 days, <=80000", dict(destination_type="Beach/Island", duration=5, price=80000)),
+    ("location=Bali, price<=40000", dict(location="Bali", price=40000)),
+]
+
+# Columns of tour_packages before any migration
+ORIGINAL_SCHEMA = """
+    CREATE TABLE tour_packages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        location TEXT,
+        trip_id TEXT,
+        package_name TEXT,
+        url TEXT,
+        duration TEXT,
+        tour_type TEXT,
+        cities_included TEXT,
+        price TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        itinerary_data TEXT,
+        destination_type TEXT,
+        hotel TEXT
+    )
+"""
+
+def grouped_price(value):
+    """Price text in the scraped format: Indian digit grouping with spaces, "1 02 100" """
+    text = str(value)
+    head, tail = text[:-3], text[-3:]
+    groups = []
+    while len(head) > 2:
+        groups.insert(0, head[-2:])
+        head = head[:-2]
+    if head:
+        groups.insert(0, head)
+    return " ".join(groups + [tail])
+
+def synthetic_packages(count, seed=1):
+    """Package dicts with the tour_packages column names; prices from 15,000 to 2,50,000"""
+    rng = random.Random(seed)
+    for i in range(count):
+        location = rng.choice(LOCATIONS)
+        yield {
+            'location': location,
+            'trip_id': f"SYN{i:07d}",
+            'package_name': f"{location} Delight {i}",
+            'url': f"https://example.com/packages/{i}",
+            'duration': str(rng.randint(3, 12)),
+            'tour_type': "International",
+            'cities_included': "|".join(rng.sample(CITIES, 3)),
+            'price': grouped_price(rng.randint(150, 2500) * 100),
+            'itinerary_data': '[{"day_number": 1, "text": "Arrival and transfer to the hotel"}]',
+            'destination_type': rng.choice(DESTINATION_TYPES),
+            'hotel': rng.choice(["Included", "Not Included"]),
+        }
+
+def create_original_catalog(path, packages):
+    conn = sqlite3.connect(path)
+    conn.execute(ORIGINAL_SCHEMA)
+    columns = list(packages[0])
+    with conn:
+        conn.executemany(
+            f"INSERT INTO tour_packages ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [tuple(package[column] for column in columns) for package in packages]
+        )
+    conn.close()
+
+def original_query(conn, location=None, duration=None, price=None, destination_type=None):
+    """The search SQL before the migration"""
+    query = """
+        SELECT id, location, trip_id, package_name, url, duration, tour_type, cities_included, price,
+            created_at, itinerary_data, destination_type, hotel
+        FROM tour_packages
+        WHERE 1=1
+    """
+    params = []
+    if location:
+        query += " AND LOWER(Location) LIKE LOWER(?)"
+        params.append(f"%{location}%")
+    if price is not None:
+        query += " AND Price <= ?"
+        params.append(price)
+    if duration:
+        query += " AND Duration = ?"
+        params.append(duration)
+    if destination_type:
+        query += " AND destination_type = ?"
+        params.append(destination_type)
+    return conn.execute(query, params).fetchall()
+
+def normalized_query(conn, location=None, duration=None, price=None, destination_type=None):
+    """The same search on the normalized, indexed columns"""
+    query = """
+        SELECT id, location, trip_id, package_name, url, duration, tour_type, cities_included, price,
+            created_at, itinerary_data, destination_type, hotel
+        FROM tour_packages
+        WHERE 1=1
+    """
+    params = []
+    if location:
+        query += " AND location_lc LIKE ?"
+        params.append(f"%{location.strip().lower()}%")
+    if price is not None:
+        query += " AND price_value <= ?"
+        params.append(int(price))
+    if duration:
+        query += " AND duration_days = ?"
+        params.append(int(duration))
+    if destination_type:
+        query += " AND destination_type_lc = ?"
+        params.append(destination_type.strip().lower())
+    return conn.execute(query, params).fetchall()
+
+def expected_count(packages, location=None, duration=None, price=None, destination_type=None):
+    return sum(
+        1 for package in packages
+        if (location is None or location.lower() in package['location'].lower())
+        and (price is None or int(package['price'].replace(" ", "")) <= price)
+        and (duration is None or int(package['duration']) == duration)
+        and (destination_type is None or package['destination_type'] == destination_type)
+    )
+
+def mean_time(query, conn, filters, runs):
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        rows = query(conn, **filters)
+        times.append(time.perf_counter() - started)
+    return statistics.mean(times), len(rows)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    Chat = import_chat()
+
+    failures = []
+    with scratch_directory("catalog-benchmark-") as workdir:
+        packages = list(synthetic_packages(count))
+        original_path = os.path.join(workdir, "original.db")
+        migrated_path = os.path.join(workdir, "migrated.db")
+        create_original_catalog(original_path, packages)
+        shutil.copy(original_path, migrated_path)
+
+        migrated = sqlite3.connect(migrated_path)
+        started = time.perf_counter()
+        Chat.migrate_catalog(migrated)
+        print(f"{count:,} packages; migrate_catalog took {time.perf_counter() - started:.1f}s")
+        original = sqlite3.connect(original_path)
+
+        print(f"{'query':32} {'expected':>9} {'original':>20} {'normalized':>20}")
+        for label, filters in QUERIES:
+            expected = expected_count(packages, **filters)
+            before, before_rows = mean_time(original_query, original, filters, runs)
+            after, after_rows = mean_time(normalized_query, migrated, filters, runs)
+            print(
+                f"{label:32} {expected:>9,} {before * 1000:8.1f} ms {before_rows:>8,} "
+                f"{after * 1000:8.1f} ms {after_rows:>8,}"
+            )
+            if after_rows != expected:
+                failures.append(f"{label}: {after_rows} rows instead of {expected}")
+            if after > before:
+                failures.append(f"{label}: normalized query slower than the original")
+        original.close()
+        migrated.close()
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Package search benchmark for the catalog engines
+
+Loads a synthetic catalog (default sizes 1k, 100k and 1M packages, from
+benchmarks.catalog_benchmark.synthetic_packages) through load_packages and runs the
+same searches four ways: one plain SQL query on the normalized columns
+(sorted and paged like search_packages), and TourPackageAPI with the
+row-based snapshot (CATALOG_ENGINE=rows), the NumPy ColumnarCatalog
+(CATALOG_ENGINE=columnar) and the IndexedCatalog (CATALOG_ENGINE=sql, the
+default above CATALOG_SNAPSHOT_MAX_ROWS packages). Reports the time to
+build each engine and the median time per search. Exits with status 1 when
+they disagree on the number of matches or on the page returned.
+
+Usage: python -m benchmarks.catalog_engine_benchmark [packages ...]
+"""
+import itertools
+import os
+import sqlite3
+import statistics
+import sys
+import time
+
+from benchmarks.catalog_benchmark import ORIGINAL_SCHEMA, synthetic_packages
+from benchmarks.common import import_chat, scratch_directory
+
+LOAD_BATCH = 100000
+ENGINES = ("rows", "columnar", "sql")
+
+QUERIES = [
+    ("location + duration", dict(location="bali", duration=7)),
+    ("all four filters", dict(location="south", duration=5, price=100000, destination_type="Beach/Island")),
+    ("price only", dict(price=60000)),
+    ("no match", dict(location="atlantis")),
+    ("full text + price", dict(query="kyoto", price=150000)),
+]
+
+def sql_search(Chat, api, location=None, duration=None, price=None, destination_type=None, query=None):
+    """search_packages as a single SQL query: matches counted, first page sorted by relevance or price"""
+    where, params = [], []
+    fts_query = Chat.build_fts_query(query) if query else None
+    if fts_query:
+        source = "tour_packages p JOIN tour_packages_fts ON tour_packages_fts.rowid = p.id"
+        where.append("tour_packages_fts MATCH ?")
+        params.append(fts_query)
+        weights = ", ".join(str(w) for w in Chat.CATALOG_FTS_WEIGHTS)
+        order = f"bm25(tour_packages_fts, {weights}), p.id"
+    else:
+        source = "tour_packages p"
+        order = "p.price_value IS NULL, p.price_value, p.id"
+    if location:
+        where.append("p.location_lc LIKE ?")
+        params.append(f"%{location.strip().lower()}%")
+    if price is not None:
+        where.append("p.price_value <= ?")
+        params.append(int(price))
+    if duration:
+        where.append("p.duration_days = ?")
+        params.append(int(duration))
+    if destination_type:
+        where.append("p.destination_type_lc = ?")
+        params.append(destination_type.strip().lower())
+    condition = " AND ".join(where) or "1=1"
+    with api.db.connection(api.db_path) as conn:
+        total = conn.execute(f"SELECT COUNT(*) FROM {source} WHERE {condition}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT p.trip_id FROM {source} WHERE {condition} ORDER BY {order} LIMIT ?",
+            params + [Chat.SEARCH_PACKAGES_MAX_LIMIT]
+        ).fetchall()
+    return total, [row[0] for row in rows]
+
+def engine_search(Chat, api, **filters):
+    results = api.search_packages(**filters, limit=Chat.SEARCH_PACKAGES_MAX_LIMIT)
+    return results['total_found'], [package['trip_id'] for package in results['packages']]
+
+def median_time(search, runs):
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        search()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+def create_catalog(Chat, path, count):
+    conn = sqlite3.connect(path)
+    conn.execute(ORIGINAL_SCHEMA)
+    packages = synthetic_packages(count)
+    while True:
+        batch = list(itertools.islice(packages, LOAD_BATCH))
+        if not batch:
+            break
+        Chat.load_packages(conn, batch)
+    conn.close()
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 100000, 1000000]
+    Chat = import_chat()
+
+    failures = []
+    with scratch_directory("catalog-engine-benchmark-") as workdir:
+        for count in sizes:
+            path = os.path.join(workdir, f"catalog-{count}.db")
+            started = time.perf_counter()
+            create_catalog(Chat, path, count)
+            print(f"\n{count:,} packages (loaded in {time.perf_counter() - started:.1f}s)")
+
+            apis = {engine: Chat.TourPackageAPI(path, engine=engine) for engine in ENGINES}
+            builds = []
+            for engine, api in apis.items():
+                started = time.perf_counter()
+                api.snapshot()
+                builds.append(f"{engine} {(time.perf_counter() - started) * 1000:.0f} ms")
+            print(f"engine build: {', '.join(builds)}")
+
+            runs = 50 if count <= 1000 else 10 if count <= 100000 else 3
+            print(f"{'search':22} {'matches':>9} {'plain sql':>11} " + " ".join(f"{engine:>11}" for engine in ENGINES))
+            for label, filters in QUERIES:
+                searches = [lambda: sql_search(Chat, apis["rows"], **filters)] + [
+                    lambda api=api: engine_search(Chat, api, **filters) for api in apis.values()
+                ]
+                results = [search() for search in searches]
+                if any(result != results[0] for result in results[1:]):
+                    failures.append(f"{count:,} packages, {label}: the engines disagree")
+                times = [median_time(search, runs) for search in searches]
+                print(f"{label:22} {results[0][0]:>9,} " + " ".join(f"{t * 1000:8.2f} ms" for t in times))
+            Chat.db_manager.close_all()
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
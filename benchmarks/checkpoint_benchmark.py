@@ -0,0 +1,84 @@
+"""
+Checkpointer memory soak benchmark
+
+Runs `conversations` simulated conversations (default 10k) of three turns
+each through a one-node graph whose stub model returns a 2 KB reply, once
+with LangGraph's MemorySaver and once with BoundedSqliteSaver (keep_last=10,
+max_threads=2000) writing to a scratch database. Each backend runs in its
+own interpreter so their memory doesn't mix. Reports the process RSS after
+every fifth of the conversations and the final database size. Exits with
+status 1 when the RSS of the bounded checkpointer grows by more than
+RSS_GROWTH_BUDGET (default 0.25, i.e. 25%) from the first report to the last.
+
+Usage: python -m benchmarks.checkpoint_benchmark [conversations]
+"""
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.common import import_chat, python_env, scratch_directory
+
+REPLY = "Here are some packages: " + "x" * 2000
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+def soak(backend, conversations, db_path):
+    """Run the conversations in this process and print one line per fifth of them"""
+    Chat = import_chat()
+    from langchain_core.messages import AIMessage, HumanMessage
+    from langgraph.graph import END, START, MessagesState, StateGraph
+
+    graph = StateGraph(MessagesState)
+    graph.add_node("model", lambda state: {"messages": [AIMessage(REPLY)]})
+    graph.add_edge(START, "model")
+    graph.add_edge("model", END)
+    if backend == "memory":
+        saver = Chat.MemorySaver()
+    else:
+        saver = Chat.BoundedSqliteSaver.from_path(db_path, keep_last=10, max_threads=2000)
+    app = graph.compile(checkpointer=saver)
+
+    started = time.time()
+    step = max(conversations // 5, 1)
+    for i in range(conversations):
+        config = {"configurable": {"thread_id": f"customer{i}@example.com"}}
+        for turn in range(3):
+            app.invoke({"messages": [HumanMessage(f"turn {turn}")]}, config)
+        if (i + 1) % step == 0:
+            print(f"{i + 1} {rss_mb():.0f} {time.time() - started:.0f}", flush=True)
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--backend":
+        soak(sys.argv[2], int(sys.argv[3]), sys.argv[4])
+        return
+
+    conversations = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    budget = float(os.getenv("RSS_GROWTH_BUDGET", "0.25"))
+    growth = {}
+    with scratch_directory("checkpoint-benchmark-") as workdir:
+        for backend in ("memory", "sqlite"):
+            db_path = os.path.join(workdir, f"{backend}.db")
+            result = subprocess.run(
+                [sys.executable, "-m", __spec__.name, "--backend", backend, str(conversations), db_path],
+                capture_output=True, text=True, cwd=workdir, env=python_env()
+            )
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr[-2000:])
+            reports = [tuple(float(value) for value in line.split()) for line in result.stdout.splitlines()]
+            name = "MemorySaver" if backend == "memory" else "BoundedSqliteSaver"
+            print(f"{name}:")
+            for done, rss, elapsed in reports:
+                print(f"  {int(done):>7,} conversations  RSS {rss:6.0f} MB  {elapsed:5.0f}s")
+            if os.path.exists(db_path):
+                print(f"  database {os.path.getsize(db_path) / 2**20:.1f} MB")
+            growth[backend] = reports[-1][1] / reports[0][1] - 1
+
+    if growth["sqlite"] > budget:
+        print(f"FAIL: BoundedSqliteSaver RSS grew {growth['sqlite']:.0%}, more than the {budget:.0%} budget")
+    sys.exit(1 if growth["sqlite"] > budget else 0)
+
+if __name__ == "__main__":
+    main()
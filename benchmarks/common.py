@@ -0,0 +1,72 @@
+"""
+Setup shared by the benchmark scripts
+"""
+import contextlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+
+def import_chat(**settings):
+    """Import Chat.py with placeholder credentials; settings are put in os.environ first"""
+    # Chat.py requires these at import; nothing here reaches the network
+    for name in ("OPENAI_API_KEY", "LANGCHAIN_API_KEY", "LANGCHAIN_PROJECT", "RAPIDAPI_KEY"):
+        os.environ.setdefault(name, "benchmark")
+    os.environ.update(settings)
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    import Chat
+    os.environ["LANGCHAIN_TRACING_V2"] = "false"
+    return Chat
+
+def import_rapidapi_stub():
+    """The HTTPS booking-com15 stand-in the tests use"""
+    tests_dir = os.path.join(REPO_DIR, "tests")
+    if tests_dir not in sys.path:
+        sys.path.insert(0, tests_dir)
+    from rapidapi_stub import StubRapidAPI
+    return StubRapidAPI
+
+@contextlib.contextmanager
+def scratch_directory(prefix, catalog=False):
+    """
+    A temporary directory, removed on exit. With catalog=True it holds a
+    copy of tour_packages.db and is the working directory until exit, since
+    the catalog is opened (and migrated) by relative path.
+    """
+    workdir = tempfile.mkdtemp(prefix=prefix)
+    try:
+        if catalog:
+            shutil.copy(os.path.join(REPO_DIR, "tour_packages.db"), workdir)
+            os.chdir(workdir)
+        yield workdir
+    finally:
+        if catalog:
+            os.chdir(REPO_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def python_env(**settings):
+    """Environment for a child interpreter that imports Chat or the benchmarks from another directory"""
+    return {
+        **os.environ,
+        **settings,
+        "PYTHONPATH": os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])),
+    }
+
+def create_certificate(directory):
+    """Self-signed certificate for 127.0.0.1; returns (certfile, keyfile)"""
+    certfile, keyfile = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+            "-keyout", keyfile, "-out", certfile, "-subj", "/CN=127.0.0.1",
+            "-addext", "subjectAltName=IP:127.0.0.1",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return certfile, keyfile
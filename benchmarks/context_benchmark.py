@@ -0,0 +1,116 @@
+"""
+Model context size benchmark for the compact node
+
+Plays a scripted 40-turn conversation against a copy of tour_packages.db.
+A stub model alternates search_packages and get_package_itinerary calls,
+then answers with a fixed reply. The conversation runs twice: through a
+graph without the compact node (every earlier tool result stays in the
+prompt) and through one with it (digests, summary, trip details). Reports
+the approximate tokens sent to the model per turn
+(count_tokens_approximately over model_input) and in total. Exits with
+status 1 when the compacted per-turn size keeps growing: its maximum over
+the last 20 turns is more than 25% above the maximum over the first 20.
+
+Usage: python -m benchmarks.context_benchmark [turns]
+"""
+import statistics
+import sys
+import uuid
+
+from benchmarks.common import import_chat, scratch_directory
+
+LOCATIONS = ["Bali", "Dubai", "Europe", "Thailand", "Mauritius"]
+REPLY = "Here are the options I found for you. " * 15
+SUMMARY = "Customer is comparing Bali and Dubai packages for 2 adults in March. " * 4
+
+class ScriptedModel:
+    """Searches packages on odd turns and loads an itinerary on even ones, then replies"""
+    def __init__(self, trip_ids):
+        from langchain_core.messages.utils import count_tokens_approximately
+
+        self.count_tokens = count_tokens_approximately
+        self.trip_ids = trip_ids
+        self.turn = 0
+        self.tokens = []
+
+    def invoke(self, messages):
+        from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+        self.tokens.append(self.count_tokens(messages))
+        last = [message for message in messages if not isinstance(message, SystemMessage)][-1]
+        if not isinstance(last, HumanMessage):
+            return AIMessage(REPLY)
+        self.turn += 1
+        if self.turn % 2:
+            call = {"name": "search_packages", "args": {"location": LOCATIONS[self.turn % len(LOCATIONS)]}}
+        else:
+            call = {"name": "get_package_itinerary", "args": {"trip_id": self.trip_ids[self.turn % len(self.trip_ids)]}}
+        return AIMessage("", tool_calls=[{**call, "id": f"call_{uuid.uuid4().hex[:24]}"}])
+
+class SummaryModel:
+    def invoke(self, messages):
+        from langchain_core.messages import AIMessage
+
+        return AIMessage(SUMMARY)
+
+def build_graph(Chat, compact):
+    from langgraph.checkpoint.memory import InMemorySaver
+    from langgraph.graph import START, StateGraph
+    from langgraph.prebuilt import ToolNode, tools_condition
+
+    graph = StateGraph(Chat.State)
+    graph.add_node("model", Chat.call_model)
+    graph.add_node("tools", ToolNode(Chat.tools))
+    if compact:
+        graph.add_node("compact", Chat.compact_context)
+        graph.add_edge(START, "compact")
+        graph.add_edge("compact", "model")
+    else:
+        graph.add_edge(START, "model")
+    graph.add_conditional_edges("model", tools_condition)
+    graph.add_edge("tools", "model")
+    return graph.compile(checkpointer=InMemorySaver())
+
+def play(Chat, compact, turns, trip_ids):
+    """Tokens sent to the model in each turn"""
+    from langchain_core.messages import HumanMessage
+
+    model = ScriptedModel(trip_ids)
+    Chat.get_model_with_tools = lambda: model
+    app = build_graph(Chat, compact)
+    config = {"configurable": {"thread_id": "benchmark"}}
+    per_turn = []
+    for turn in range(turns):
+        calls = len(model.tokens)
+        app.invoke({"messages": [HumanMessage(f"Turn {turn}: tell me more please")]}, config)
+        per_turn.append(sum(model.tokens[calls:]))
+    return per_turn
+
+def main():
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    with scratch_directory("context-benchmark-", catalog=True):
+        # Every turn must reach the model
+        Chat = import_chat(FAST_PATH="false", RESPONSE_CACHE="false")
+        Chat.get_model = lambda: SummaryModel()
+        with Chat.db_manager.connection("tour_packages.db") as conn:
+            trip_ids = [row[0] for row in conn.execute("SELECT trip_id FROM tour_packages ORDER BY id LIMIT 20")]
+
+        results = {}
+        for label, compact in (("baseline", False), ("compaction", True)):
+            per_turn = play(Chat, compact, turns, trip_ids)
+            results[label] = per_turn
+            marks = "  ".join(f"turn {n} {per_turn[n - 1] / 1000:5.1f}k" for n in (10, 20, 40) if n <= turns)
+            print(
+                f"{label:11} {marks}  max {max(per_turn) / 1000:5.1f}k  "
+                f"mean {statistics.mean(per_turn) / 1000:5.1f}k  total {sum(per_turn) / 1e6:.2f}M"
+            )
+
+    compacted = results["compaction"]
+    half = len(compacted) // 2
+    growing = max(compacted[half:]) > 1.25 * max(compacted[:half])
+    if growing:
+        print("FAIL: the compacted context keeps growing")
+    sys.exit(1 if growing else 0)
+
+if __name__ == "__main__":
+    main()
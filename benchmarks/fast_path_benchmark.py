@@ -0,0 +1,78 @@
+"""
+Routing accuracy and latency benchmark for the package fast path
+
+Runs PackageQueryRouter.extract over the labeled queries in
+fast_path_queries.json: each one has the filters the fast path should answer
+it with, or null when it has to go to the model (follow-ups, bookings,
+destinations or constraints the catalog filters can't express). Reports
+precision and recall of the routing, the queries whose filters match
+exactly, and every mismatch. Then answers each fast-path query with
+answer_package_query on a copy of tour_packages.db and reports the
+extraction p50 and the answer p50 and max. Exits with status 1 on any
+mismatch.
+
+Usage: python -m benchmarks.fast_path_benchmark [queries.json]
+"""
+import json
+import os
+import statistics
+import sys
+import time
+
+from benchmarks.common import BENCHMARKS_DIR, import_chat, scratch_directory
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(BENCHMARKS_DIR, "fast_path_queries.json")
+    with open(path, encoding="utf-8") as f:
+        labeled = json.load(f)
+
+    with scratch_directory("fast-path-benchmark-", catalog=True):
+        Chat = import_chat(FAST_PATH="true")
+        router = Chat.get_package_router()
+
+        true_positives = false_positives = false_negatives = exact = 0
+        mismatches = []
+        extract_times = []
+        for item in labeled:
+            query, expected = item["query"], item["expected"]
+            started = time.perf_counter()
+            extracted = router.extract(query)
+            extract_times.append(time.perf_counter() - started)
+            if extracted is None and expected is None:
+                continue
+            if expected is None:
+                false_positives += 1
+            elif extracted is None:
+                false_negatives += 1
+            else:
+                true_positives += 1
+                exact += extracted == expected
+            if extracted != expected:
+                mismatches.append(f"{query!r}: got {extracted}, expected {expected}")
+
+        answer_times = []
+        for item in labeled:
+            if item["expected"] is None:
+                continue
+            state = {"messages": [Chat.HumanMessage(item["query"])]}
+            started = time.perf_counter()
+            Chat.answer_package_query(state)
+            answer_times.append(time.perf_counter() - started)
+
+    routed = true_positives + false_positives
+    expected_fast = true_positives + false_negatives
+    print(
+        f"{len(labeled)} queries, {routed} routed to the fast path: "
+        f"precision {true_positives / max(routed, 1):.2f}, recall {true_positives / max(expected_fast, 1):.2f}, "
+        f"exact filters {exact}/{true_positives}, false positives {false_positives}"
+    )
+    print(
+        f"extract p50 {statistics.median(extract_times) * 1e6:.0f} us; "
+        f"answer p50 {statistics.median(answer_times) * 1000:.2f} ms, max {max(answer_times) * 1000:.2f} ms"
+    )
+    for mismatch in mismatches:
+        print(f"FAIL: {mismatch}")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Import time regression benchmark for Chat.py
+
+Runs `python -X importtime -c "import Chat"` in fresh interpreters and reports
+the median import time, the slowest top-level imports and whether any of the
+lazily imported modules were loaded eagerly. Every run starts in a scratch
+directory holding an unmigrated copy of the catalog (original columns only),
+so a catalog migration or any other database write at import time shows up
+both in the timing and as a written file. Exits with status 1 when the median
+exceeds IMPORT_TIME_BUDGET (seconds, default 2.0), a lazy module leaks into
+the import or the import writes a file.
+
+Usage: python -m benchmarks.import_benchmark [runs]
+"""
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.common import REPO_DIR, python_env, scratch_directory
+
+# Modules Chat.py must not load at import time
+LAZY_MODULES = ["langchain_openai", "openai", "httpx", "smtplib", "email.mime.text", "streamlit", "numpy"]
+
+# Columns of tour_packages before any migration
+CATALOG_COLUMNS = [
+    "location", "trip_id", "package_name", "url", "duration", "tour_type", "cities_included",
+    "price", "itinerary_data", "destination_type", "hotel"
+]
+
+def unmigrated_catalog(path):
+    """Copy the packages of the repo catalog into a new database with the original schema only"""
+    source = sqlite3.connect(os.path.join(REPO_DIR, "tour_packages.db"))
+    rows = source.execute(f"SELECT {', '.join(CATALOG_COLUMNS)} FROM tour_packages").fetchall()
+    source.close()
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE tour_packages (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        + ", ".join(f"{column} TEXT" for column in CATALOG_COLUMNS)
+        + ", created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    )
+    with conn:
+        conn.executemany(
+            f"INSERT INTO tour_packages ({', '.join(CATALOG_COLUMNS)}) VALUES ({', '.join('?' * len(CATALOG_COLUMNS))})",
+            rows
+        )
+    conn.close()
+
+def directory_state(path):
+    return {name: os.stat(os.path.join(path, name)).st_mtime_ns for name in os.listdir(path)}
+
+def import_once():
+    with scratch_directory("import-benchmark-") as workdir:
+        unmigrated_catalog(os.path.join(workdir, "tour_packages.db"))
+        before = directory_state(workdir)
+        env = python_env(LANGCHAIN_TRACING_V2="false")
+        check = f"import sys, Chat; print('LOADED:' + ','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", check],
+            capture_output=True, text=True, env=env, cwd=workdir
+        )
+        elapsed = time.perf_counter() - started
+        after = directory_state(workdir)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    written = sorted(name for name, mtime in after.items() if before.get(name) != mtime)
+
+    top_level = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if name.startswith("   ") and not name.startswith("    "):
+            top_level.append((int(cumulative), name.strip()))
+    loaded = [line for line in result.stdout.splitlines() if line.startswith("LOADED:")]
+    leaked = [m for m in loaded[-1][len("LOADED:"):].split(",") if m] if loaded else []
+    return elapsed, sorted(top_level, reverse=True), leaked, written
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    budget = float(os.getenv("IMPORT_TIME_BUDGET", "2.0"))
+    samples = [import_once() for _ in range(runs)]
+
+    times = [elapsed for elapsed, _, _, _ in samples]
+    median = statistics.median(times)
+    print(f"import Chat: median {median:.2f}s, min {min(times):.2f}s, max {max(times):.2f}s over {runs} runs")
+    print("Slowest imports (last run):")
+    for cumulative, name in samples[-1][1][:10]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    leaked = samples[-1][2]
+    written = sorted({name for sample in samples for name in sample[3]})
+    if leaked:
+        print(f"FAIL: imported eagerly: {', '.join(leaked)}")
+    if written:
+        print(f"FAIL: import wrote to: {', '.join(written)}")
+    if median > budget:
+        print(f"FAIL: median import time {median:.2f}s exceeds the {budget:.2f}s budget")
+    sys.exit(1 if leaked or written or median > budget else 0)
+
+if __name__ == "__main__":
+    main()
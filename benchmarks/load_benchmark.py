@@ -0,0 +1,223 @@
+"""
+Concurrent conversation benchmark for the async execution path
+
+Starts two local stand-ins in a separate process: an OpenAI-compatible chat
+completions server (default 300 ms per call) and the HTTPS booking-com15
+stand-in from tests/rapidapi_stub.py (default 100 ms per request, three
+Dubai destinations). Each conversation is one turn, "hotels in Dubai from
+<date> to <date>": the model calls search_hotels, then answers from the
+result. Every conversation has its own dates, so the hotel result cache
+doesn't coalesce them. The conversations (default 200) run all at once
+through arun_turn and through run_turn on 16- and 64-thread pools, each
+mode in its own interpreter. Reports wall time, conversations per second,
+p50/p99 per conversation and the peak thread count. Exits with status 1
+when a reply is wrong or async is slower than the threaded runs.
+
+Needs openssl to create the stand-in's certificate.
+
+Usage: python -m benchmarks.load_benchmark [conversations] [llm_latency_ms] [hotel_latency_ms]
+"""
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.common import create_certificate, import_chat, import_rapidapi_stub, python_env, scratch_directory
+
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+REPLY = "Here are the three cheapest hotels and the best rated one."
+THREAD_POOLS = (16, 64)
+# Hotel questions must reach the model every time
+SETTINGS = dict(FAST_PATH="false", RESPONSE_CACHE="false")
+
+class ChatCompletionsHandler(BaseHTTPRequestHandler):
+    """Calls search_hotels for the dates in the question, then answers from the hotels found"""
+    protocol_version = "HTTP/1.1"
+    latency = 0.3
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.latency)
+        last = body["messages"][-1]
+        if last["role"] == "user":
+            arrival, departure = DATE_PATTERN.findall(last["content"])
+            arguments = {"city": "Dubai", "arrival_date": arrival, "departure_date": departure, "adults": 2}
+            message = {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [{
+                    "id": f"call_{uuid.uuid4().hex[:24]}",
+                    "type": "function",
+                    "function": {"name": "search_hotels", "arguments": json.dumps(arguments)},
+                }],
+            }
+        else:
+            found = last["role"] == "tool" and "Hotel " in str(last["content"])
+            message = {"role": "assistant", "content": REPLY if found else "No hotels found."}
+        document = json.dumps({
+            "id": "chatcmpl-benchmark",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(document)))
+        self.end_headers()
+        self.wfile.write(document)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve_stubs(certfile, keyfile, llm_latency, hotel_latency):
+    """Run both stand-ins until stdin closes; prints their ports first"""
+    import_chat(**SETTINGS)
+    StubRapidAPI = import_rapidapi_stub()
+
+    ChatCompletionsHandler.latency = llm_latency
+    ThreadingHTTPServer.request_queue_size = 1024
+    llm = ThreadingHTTPServer(("127.0.0.1", 0), ChatCompletionsHandler)
+    llm.daemon_threads = True
+    threading.Thread(target=llm.serve_forever, daemon=True).start()
+    hotels = StubRapidAPI(certfile, keyfile)
+    hotels.latency = hotel_latency
+    hotels.destinations["Dubai"] = ["-1", "-2", "-3"]
+    hotels.start()
+    print(llm.server_address[1], hotels.port, flush=True)
+    sys.stdin.read()
+
+def stay_dates(i):
+    arrival = date(2027, 1, 1) + timedelta(days=i)
+    return arrival.isoformat(), (arrival + timedelta(days=4)).isoformat()
+
+def run_conversations(mode, conversations, hotel_port, certfile):
+    """Run every conversation in this process and print one JSON result line"""
+    import asyncio
+    import ssl
+    from concurrent.futures import ThreadPoolExecutor
+
+    Chat = import_chat(**SETTINGS)
+    Chat.email_outbox.start = lambda: None
+    hotel_api = Chat.get_hotel_api()
+    hotel_api.client = Chat.RapidAPIClient(
+        "127.0.0.1", hotel_api.headers, port=hotel_port,
+        ssl_context=ssl.create_default_context(cafile=certfile), pool_size=64
+    )
+
+    peak_threads = threading.active_count()
+    sampling = True
+
+    def sample_threads():
+        nonlocal peak_threads
+        while sampling:
+            peak_threads = max(peak_threads, threading.active_count())
+            time.sleep(0.01)
+
+    latencies = []
+
+    def question(i):
+        return "hotels in Dubai from {} to {}".format(*stay_dates(i))
+
+    def converse(i):
+        started = time.perf_counter()
+        reply = Chat.run_turn(f"{mode}-{i}", question(i))
+        latencies.append(time.perf_counter() - started)
+        return reply.content
+
+    async def aconverse(i):
+        started = time.perf_counter()
+        reply = await Chat.arun_turn(f"{mode}-{i}", question(i))
+        latencies.append(time.perf_counter() - started)
+        return reply.content
+
+    async def run_all():
+        return await asyncio.gather(*(aconverse(i) for i in range(conversations)))
+
+    threading.Thread(target=sample_threads, daemon=True).start()
+    started = time.perf_counter()
+    if mode == "async":
+        replies = asyncio.run(run_all())
+    else:
+        with ThreadPoolExecutor(int(mode)) as pool:
+            replies = list(pool.map(converse, range(conversations)))
+    wall = time.perf_counter() - started
+    sampling = False
+
+    latencies.sort()
+    print(json.dumps({
+        "wall": wall,
+        "p50": latencies[len(latencies) // 2],
+        "p99": latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))],
+        "correct": sum(reply == REPLY for reply in replies),
+        "peak_threads": peak_threads,
+    }))
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--stubs":
+        serve_stubs(sys.argv[2], sys.argv[3], float(sys.argv[4]), float(sys.argv[5]))
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "--mode":
+        run_conversations(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]), sys.argv[5])
+        return
+
+    conversations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    llm_latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.3
+    hotel_latency = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.1
+    if shutil.which("openssl") is None:
+        sys.exit("openssl is needed to create the stand-in's certificate")
+
+    failures = []
+    with scratch_directory("load-benchmark-") as workdir:
+        certfile, keyfile = create_certificate(workdir)
+        stubs = subprocess.Popen(
+            [sys.executable, "-m", __spec__.name, "--stubs", certfile, keyfile, str(llm_latency), str(hotel_latency)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, cwd=workdir, env=python_env()
+        )
+        try:
+            llm_port, hotel_port = stubs.stdout.readline().split()
+            rates = {}
+            for mode in ["async"] + [str(size) for size in THREAD_POOLS]:
+                # Each mode gets its own checkpoint and destination cache databases
+                modedir = os.path.join(workdir, mode)
+                os.mkdir(modedir)
+                env = python_env(
+                    OPENAI_BASE_URL=f"http://127.0.0.1:{llm_port}/v1",
+                    CHECKPOINT_DB_PATH=os.path.join(modedir, "checkpoints.db")
+                )
+                result = subprocess.run(
+                    [sys.executable, "-m", __spec__.name, "--mode", mode, str(conversations), hotel_port, certfile],
+                    capture_output=True, text=True, cwd=modedir, env=env
+                )
+                if result.returncode != 0:
+                    raise RuntimeError(result.stderr[-2000:])
+                measured = json.loads(result.stdout.strip().splitlines()[-1])
+                rates[mode] = conversations / measured["wall"]
+                label = f"async, {conversations} concurrent" if mode == "async" else f"sync, {mode}-thread pool"
+                print(
+                    f"{label:26} {measured['wall']:6.1f} s wall {rates[mode]:6.1f} conv/s  "
+                    f"p50 {measured['p50']:5.2f} s  p99 {measured['p99']:5.2f} s  "
+                    f"{measured['peak_threads']:4} threads  {measured['correct']}/{conversations} correct"
+                )
+                if measured["correct"] != conversations:
+                    failures.append(f"{label}: {conversations - measured['correct']} wrong replies")
+        finally:
+            stubs.stdin.close()
+            stubs.wait(timeout=10)
+
+    if rates and rates["async"] < max(rate for mode, rate in rates.items() if mode != "async"):
+        failures.append("the async run is slower than a thread pool")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
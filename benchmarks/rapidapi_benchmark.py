@@ -0,0 +1,93 @@
+"""
+Hotel search latency benchmark for the keep-alive RapidAPI client
+
+Runs `calls` search_hotels calls (default 200) against the local HTTPS
+stand-in for the booking-com15 API in tests/rapidapi_stub.py, which answers
+after a fixed latency (default 5 ms). Every call searches a new city, so it
+makes one destination lookup and six parallel hotel searches and no cache
+answers for it. The calls run once with a client that opens a new
+connection per request (pool_size=0, as before the pool) and once with the
+pooled keep-alive client. Reports p50 and p99 per call and exits with
+status 1 when the pooled p50 is not lower.
+
+Needs openssl to create the stand-in's certificate.
+
+Usage: python -m benchmarks.rapidapi_benchmark [calls] [latency_ms]
+"""
+import contextlib
+import io
+import os
+import shutil
+import ssl
+import statistics
+import sys
+import time
+
+from benchmarks.common import create_certificate, import_chat, import_rapidapi_stub, scratch_directory
+
+DESTINATIONS_PER_CITY = 6
+MAX_CONCURRENCY = 6
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def measure(Chat, stub, workdir, label, pool_size, calls):
+    api = Chat.HotelSearchAPI(
+        api_key="benchmark",
+        max_concurrency=MAX_CONCURRENCY,
+        client=Chat.RapidAPIClient(
+            "127.0.0.1",
+            {"X-RapidAPI-Key": "benchmark"},
+            port=stub.port,
+            ssl_context=ssl.create_default_context(cafile=stub.certfile),
+            pool_size=pool_size
+        ),
+        destination_cache=Chat.DestinationCache(db_path=os.path.join(workdir, f"{label}.db")),
+        result_cache=Chat.HotelResultCache(),
+    )
+    accepted = stub.connections_accepted
+    latencies = []
+    for i in range(calls):
+        city = f"{label} city {i}"
+        stub.destinations[city] = [f"-{i}{j}" for j in range(DESTINATIONS_PER_CITY)]
+        # search_hotels prints every destination it searches
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            results = api.search_hotels(city, "2026-11-01", "2026-11-05", adults=2)
+            latencies.append(time.perf_counter() - started)
+        if results.get("partial") or not results.get("hotels"):
+            raise RuntimeError(f"incomplete results for {city}")
+    return latencies, stub.connections_accepted - accepted
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    if shutil.which("openssl") is None:
+        sys.exit("openssl is needed to create the stand-in's certificate")
+    Chat = import_chat()
+    StubRapidAPI = import_rapidapi_stub()
+
+    with scratch_directory("rapidapi-benchmark-") as workdir:
+        stub = StubRapidAPI(*create_certificate(workdir))
+        stub.latency = latency_ms / 1000
+        stub.start()
+        try:
+            results = {}
+            for label, pool_size in (("new connection per request", 0), ("pooled keep-alive client", MAX_CONCURRENCY + 1)):
+                latencies, connections = measure(Chat, stub, workdir, label.split()[0], pool_size, calls)
+                results[label] = latencies
+                print(
+                    f"{label:28} p50 {statistics.median(latencies) * 1000:6.1f} ms  "
+                    f"p99 {percentile(latencies, 0.99) * 1000:6.1f} ms  {connections} connections"
+                )
+        finally:
+            stub.stop()
+
+    new, pooled = (statistics.median(latencies) for latencies in results.values())
+    if pooled >= new:
+        print("FAIL: the pooled client is not faster than a new connection per request")
+    sys.exit(1 if pooled >= new else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Hit rate, false hits and lookup time of the semantic response cache
+
+Seeds a ResponseCache on a copy of tour_packages.db with eleven catalog
+questions, each stored with a search_packages turn whose arguments come
+from the question. Then reports:
+
+- hits for 19 rewordings of the seeds (should all hit)
+- false hits for 16 contrast questions: another location, number (also
+  in k or lakh), price comparison or superlative, or questions that are
+  not catalog searches (none should hit)
+- mean lookup time with 1000 entries
+- whether a change to tour_packages drops the cached answers
+
+Exits with status 1 on a missed rewording, a false hit or a cached answer
+that survives a catalog change.
+
+Usage: python -m benchmarks.response_cache_benchmark [lookups]
+"""
+import sqlite3
+import sys
+import time
+
+from benchmarks.common import import_chat, scratch_directory
+
+# (question, search_packages arguments)
+SEEDS = [
+    ("Do you have tour packages for Bali?", {"location": "Bali"}),
+    ("What packages are available for Dubai?", {"location": "Dubai"}),
+    ("Show me 6 day packages in Thailand", {"location": "Thailand", "duration": 6}),
+    ("Which Europe tours cost under 200000?", {"location": "Europe", "price": 200000}),
+    ("What honeymoon packages do you offer in Mauritius?", {"location": "Mauritius"}),
+    ("Tell me about family tours to Australia", {"location": "Australia"}),
+    ("Any adventure trips in South Africa?", {"location": "South Africa"}),
+    ("What are the cheapest packages for Japan?", {"location": "Japan", "sort_by": "price"}),
+    ("Do you have Bali packages with Ubud visits under 50k", {"location": "Bali", "query": "Ubud", "price": 50000}),
+    ("What Bali tours cost less than 50000 including Ubud", {"location": "Bali", "query": "Ubud", "price": 50000}),
+    ("Which Europe tours cost under 2 lakh", {"location": "Europe", "price": 200000}),
+]
+REWORDINGS = [
+    "do you have tour packages for bali", "Do you have any tour packages for Bali?",
+    "What packages are available for Dubai", "what packages are available in Dubai?",
+    "Show me 6 day packages in Thailand please", "show me 6-day packages in Thailand",
+    "Which Europe tours cost under 200000", "which europe tours cost under 200000?",
+    "What honeymoon packages do you have in Mauritius?", "what honeymoon packages do you offer for Mauritius",
+    "Tell me about family tours to Australia please", "family tours to Australia?",
+    "Any adventure trips in South Africa", "any adventure trips to south africa?",
+    "What are the cheapest packages for Japan", "what are the cheapest packages in Japan?",
+    "do you have bali packages with ubud visits under 50k?", "what bali tours cost less than 50000 including ubud?",
+    "which europe tours cost under 2 lakh?",
+]
+CONTRASTS = [
+    "Do you have tour packages for Dubai?", "Show me 7 day packages in Thailand",
+    "Which Europe tours cost under 300000?", "What honeymoon packages do you offer in Bali?",
+    "Tell me about family tours to Japan", "Any adventure trips in Australia?",
+    "What are the most expensive packages for Japan?", "Show me 6 day packages in Bali",
+    "Do you have luxury cruises?", "What is the visa process for Dubai?",
+    "Book the first one", "Show me the itinerary of that package",
+    # Amounts with a unit and the direction of a price comparison
+    "Do you have Bali packages with Ubud visits under 90k", "Do you have Bali packages with Ubud visits under 5k",
+    "What Bali tours cost more than 50000 including Ubud", "Which Europe tours cost over 2 lakh",
+]
+
+def search_turn(args, answer):
+    from langchain_core.messages import AIMessage, ToolMessage
+
+    return [
+        AIMessage("", tool_calls=[{"name": "search_packages", "args": args, "id": "call_1"}]),
+        ToolMessage("[]", tool_call_id="call_1", name="search_packages"),
+        AIMessage(answer),
+    ]
+
+def main():
+    lookups = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    failures = []
+    with scratch_directory("response-cache-benchmark-", catalog=True):
+        Chat = import_chat()
+        package_api, router = Chat.get_tour_package_api(), Chat.get_package_router()
+
+        cache = Chat.ResponseCache(package_api, router)
+        for question, args in SEEDS:
+            cache.remember(question, search_turn(args, f"answer to {question}"))
+        if cache.stats()["entries"] != len(SEEDS):
+            failures.append(f"only {cache.stats()['entries']} of {len(SEEDS)} seeds were stored")
+
+        missed = [question for question in REWORDINGS if cache.lookup(question) is None]
+        false_hits = [question for question in CONTRASTS if cache.lookup(question) is not None]
+        print(f"rewordings hit   {len(REWORDINGS) - len(missed)}/{len(REWORDINGS)}")
+        print(f"contrasts hit    {len(false_hits)}/{len(CONTRASTS)}")
+        failures += [f"missed rewording {question!r}" for question in missed]
+        failures += [f"false hit for {question!r}" for question in false_hits]
+
+        large = Chat.ResponseCache(package_api, router)
+        for i in range(1000):
+            question = f"packages for Bali under {i * 1000} with {i} nights"
+            large.remember(question, search_turn({"location": "Bali", "price": i * 1000, "duration": i}, str(i)))
+        started = time.perf_counter()
+        for i in range(lookups):
+            large.lookup(f"packages for bali under {i * 1000} with {i} nights?")
+        elapsed = (time.perf_counter() - started) / lookups
+        print(f"lookup with {large.stats()['entries']} entries  {elapsed * 1000:.2f} ms")
+
+        conn = sqlite3.connect(package_api.db_path)
+        with conn:
+            conn.execute("UPDATE tour_packages SET price = price WHERE id = (SELECT min(id) FROM tour_packages)")
+        conn.close()
+        stale = cache.lookup(REWORDINGS[0]) is not None
+        print(f"after a catalog update  {'stale answer served' if stale else 'cache dropped'} ({cache.stats()})")
+        if stale:
+            failures.append("a cached answer survived a catalog update")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Time to first visible output benchmark for stream_turn
+
+A stub chat model stands in for the provider: 0.4 s before its first chunk,
+then 30 ms per token. Each turn asks for Bali packages, so the model calls
+search_packages (on a copy of tour_packages.db) and then streams a 60-token
+answer. The turn runs `turns` times (default 3) through run_turn, where
+nothing is shown until the reply is complete, and through stream_turn.
+Reports the median time to the first status event, the first token and the
+complete turn. Exits with status 1 when stream_turn's first token does not
+arrive before run_turn returns.
+
+Usage: python -m benchmarks.streaming_benchmark [turns]
+"""
+import contextlib
+import io
+import statistics
+import sys
+import time
+import uuid
+
+from benchmarks.common import import_chat, scratch_directory
+
+FIRST_CHUNK_DELAY = 0.4
+TOKEN_DELAY = 0.03
+WORDS = ("Here are three great Bali packages for your dates that fit the budget . " * 5).split()
+
+def slow_model():
+    """A streaming chat model with the provider's latency profile"""
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.messages import AIMessageChunk, HumanMessage
+    from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+    class SlowModel(BaseChatModel):
+        @property
+        def _llm_type(self):
+            return "slow-stub"
+
+        def bind_tools(self, tools, **kwargs):
+            return self
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            message = None
+            for chunk in self._stream(messages, run_manager=run_manager):
+                message = chunk.message if message is None else message + chunk.message
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+            time.sleep(FIRST_CHUNK_DELAY)
+            if isinstance(messages[-1], HumanMessage):
+                yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[{
+                    "name": "search_packages", "args": '{"location": "Bali"}', "id": uuid.uuid4().hex, "index": 0
+                }]))
+                return
+            for word in WORDS:
+                time.sleep(TOKEN_DELAY)
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+                if run_manager:
+                    run_manager.on_llm_new_token(word + " ", chunk=chunk)
+                yield chunk
+
+    return SlowModel()
+
+def main():
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    with scratch_directory("streaming-benchmark-", catalog=True):
+        # Every turn must reach the model; checkpoints stay in memory
+        Chat = import_chat(FAST_PATH="false", RESPONSE_CACHE="false", CHECKPOINTER="memory")
+        model = slow_model()
+        Chat.get_model_with_tools = lambda: model
+        Chat.email_outbox.start = lambda: None
+
+        invoked, status, token, streamed = [], [], [], []
+        # The tools print their results; keep that out of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            for turn in range(turns):
+                started = time.perf_counter()
+                Chat.run_turn(f"invoke-{turn}", "Bali packages please")
+                invoked.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                first = {}
+                for kind, _ in Chat.stream_turn(f"stream-{turn}", "Bali packages please"):
+                    first.setdefault(kind, time.perf_counter() - started)
+                streamed.append(time.perf_counter() - started)
+                status.append(first["status"])
+                token.append(first["token"])
+
+    print(f"run_turn     first visible output {statistics.median(invoked):5.2f}s (the complete reply)")
+    print(
+        f"stream_turn  first status {statistics.median(status):5.2f}s  first token {statistics.median(token):5.2f}s  "
+        f"turn complete {statistics.median(streamed):5.2f}s"
+    )
+    late = statistics.median(token) >= statistics.median(invoked)
+    if late:
+        print("FAIL: the first streamed token does not arrive before run_turn returns")
+    sys.exit(1 if late else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
 import streamlit as st
-from Chat import TravelAssistant, HumanMessage, AIMessage, State
+from Chat import stream_turn, warm_up, HumanMessage, AIMessage
 import os
+import hashlib
+from typing import List
+from PIL import Image
 from dotenv import load_dotenv
-import time
+import uuid
 
 # Load environment variables
 load_dotenv()
@@ -76,12 +79,22 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Messages rendered individually; older ones are shown on request
+CHAT_HISTORY_WINDOW = 20
+
+@st.cache_resource
+def start_assistant():
+    """Build the model client and graph once per server process, in the background"""
+    return warm_up()
+
 def initialize_session_state():
     """Initialize session state variables"""
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
     if "chat_history" not in st.session_state:
         st.session_state.chat_history = []
+    if "rendered_history" not in st.session_state:
+        st.session_state.rendered_history = [
+            message_html(message, isinstance(message, HumanMessage)) for message in st.session_state.chat_history
+        ]
     if "last_input" not in st.session_state:
         st.session_state.last_input = None
     if "email" not in st.session_state:
@@ -90,9 +103,13 @@ def initialize_session_state():
         st.session_state.mobile = ""
     if "name" not in st.session_state:
         st.session_state.name = ""
+    if "thread_id" not in st.session_state:
+        # One conversation (checkpoint thread and booking keys) per browser session,
+        # so a second tab or a returning customer starts afresh
+        st.session_state.thread_id = str(uuid.uuid4())
 
-def display_message(message, is_user=False):
-    """Display a single message with appropriate styling"""
+def message_html(message, is_user=False) -> str:
+    """HTML of a single message with appropriate styling"""
     class_name = "user-message" if is_user else "assistant-message"
     
     if isinstance(message, (HumanMessage, AIMessage)):
@@ -100,13 +117,33 @@ def display_message(message, is_user=False):
     else:
         content = message
         
-    st.markdown(f'<div class="{class_name}">{content}</div>', unsafe_allow_html=True)
+    # An HTML block ends at the first blank line, so the bubble is kept on one line
+    content = "<br>".join(line.rstrip() for line in str(content).strip().splitlines())
+    return f'<div class="{class_name}">{content}</div>'
+
+def display_message(message, is_user=False):
+    """Display a single message with appropriate styling"""
+    st.markdown(message_html(message, is_user), unsafe_allow_html=True)
+
+def add_to_history(message):
+    """Append a message to the transcript together with its rendered HTML"""
+    st.session_state.chat_history.append(message)
+    st.session_state.rendered_history.append(message_html(message, isinstance(message, HumanMessage)))
 
 def display_chat_history():
-    """Display all messages in the chat history"""
-    for message in st.session_state.chat_history:
-        is_user = isinstance(message, HumanMessage)
-        display_message(message, is_user)
+    """
+    Display the recent messages in the chat history
+
+    Every message is rendered to HTML once, when it is added, and the visible
+    window is sent as a single element, so a rerun costs the same however
+    long the conversation is.
+    """
+    rendered = st.session_state.rendered_history
+    hidden = max(len(rendered) - CHAT_HISTORY_WINDOW, 0)
+    if hidden and st.toggle(f"Show {hidden} earlier messages", key="show_full_history"):
+        hidden = 0
+    if rendered[hidden:]:
+        st.markdown("\n\n".join(rendered[hidden:]), unsafe_allow_html=True)
 
 def process_user_input(user_input: str):
     """Process user input and get AI response"""
@@ -114,53 +151,104 @@ def process_user_input(user_input: str):
     if user_input != st.session_state.last_input:
         st.session_state.last_input = user_input
         
-        # Add user message to messages and chat history
+        # Add user message to the visible transcript
         human_message = HumanMessage(user_input)
-        st.session_state.messages.append(human_message)
-        st.session_state.chat_history.append(human_message)
+        add_to_history(human_message)
+        display_message(human_message, is_user=True)
         
         try:
-            # Create initial state with user details
-            initial_state = {
-                "messages": st.session_state.messages,
-                "user_email": st.session_state.email,
-                "user_mobile": st.session_state.mobile,
-                "user_name": st.session_state.name  # Add name to state
-            }
-            
-            # Add required configurable keys
-            config = {
-                "configurable": {
-                    "thread_id": st.session_state.email,
-                    "checkpoint_ns": "travel_assistant",
-                    "checkpoint_id": str(int(time.time()))
-                }
-            }
-            
-            # Invoke TravelAssistant with state and config
-            output = TravelAssistant.invoke(initial_state, config)
+            # Only the new message is sent; the rest of the conversation
+            # is restored from the checkpoint of this thread.
+            # Tokens and tool progress are shown as they arrive.
+            placeholder = st.empty()
+            streamed_text = ""
+            reply = None
+            for kind, payload in stream_turn(
+                st.session_state.thread_id,
+                user_input,
+                user_email=st.session_state.email,
+                user_mobile=st.session_state.mobile,
+                user_name=st.session_state.name
+            ):
+                if kind == "token":
+                    streamed_text += payload
+                    with placeholder.container():
+                        display_message(streamed_text + "▌")
+                elif kind == "status":
+                    streamed_text = ""
+                    with placeholder.container():
+                        display_message(f"<i>{payload}</i>")
+                else:
+                    reply = payload
             
-            # Update messages and chat history
-            st.session_state.messages = output['messages']
-            st.session_state.chat_history.append(output['messages'][-1])
+            if reply is not None:
+                add_to_history(reply)
+                with placeholder.container():
+                    display_message(reply)
             
         except Exception as e:
             error_message = f"An error occurred: {str(e)}"
             st.error(error_message)
 
+# List of image paths - update these with your actual image paths
+CAROUSEL_IMAGES = [
+    "assets/Australia.jpg",
+    "assets/Bali.jpg",
+    "assets/Dubai.jpg",
+    "assets/Europe1.jpg",
+    "assets/Europe2.jpg",
+    "assets/Mauritius.jpg",
+    "assets/SouthAfrica.jpg",
+    "assets/Thailand.jpg",
+]
+
+# Carousel columns are ~240px wide; twice that keeps images sharp on HiDPI screens
+THUMBNAIL_DIR = os.path.join("assets", "thumbnails")
+THUMBNAIL_WIDTH = 480
+THUMBNAIL_QUALITY = 80
+
+def build_thumbnail(image_path: str) -> str:
+    """
+    Write a resized, compressed copy of an image and return its path
+
+    The name carries a hash of the original and the thumbnail settings, so
+    a changed image or setting produces a new file and existing ones are
+    reused as they are.
+    """
+    with open(image_path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data + f"{THUMBNAIL_WIDTH}:{THUMBNAIL_QUALITY}".encode()).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    thumbnail_path = os.path.join(THUMBNAIL_DIR, f"{stem}-{digest}.jpg")
+    if os.path.exists(thumbnail_path):
+        return thumbnail_path
+
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    with Image.open(image_path) as image:
+        image = image.convert("RGB")
+        image.thumbnail((THUMBNAIL_WIDTH, THUMBNAIL_WIDTH * 4), Image.LANCZOS)
+        # Written under a temporary name so concurrent sessions never read a partial file
+        temp_path = f"{thumbnail_path}.{os.getpid()}.tmp"
+        image.save(temp_path, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True, progressive=True)
+    os.replace(temp_path, thumbnail_path)
+    return thumbnail_path
+
+@st.cache_resource
+def load_carousel_images() -> List[bytes]:
+    """Thumbnail bytes of the carousel images, built on first use and shared by all sessions"""
+    thumbnails = []
+    for image_path in CAROUSEL_IMAGES:
+        with open(build_thumbnail(image_path), "rb") as f:
+            thumbnails.append(f.read())
+    return thumbnails
+
 def create_image_carousel():
     """Create an image carousel with destination images showing 3 images at once"""
-    # List of image paths - update these with your actual image paths
-    images = [
-        "assets/Australia.jpg",
-        "assets/Bali.jpg",
-        "assets/Dubai.jpg",
-        "assets/Europe1.jpg",
-        "assets/Europe2.jpg",
-        "assets/Mauritius.jpg",
-        "assets/SouthAfrica.jpg",
-        "assets/Thailand.jpg",
-    ]
+    try:
+        images = load_carousel_images()
+    except FileNotFoundError:
+        st.error("Image files not found. Please ensure images are in the correct directory.")
+        return
     
     # Initialize carousel index in session state
     if "carousel_index" not in st.session_state:
@@ -174,21 +262,17 @@ def create_image_carousel():
             st.session_state.carousel_index = (st.session_state.carousel_index - 3) % len(images)
             
     # Display 3 images in the middle columns
-    try:
-        with col2:
-            idx = st.session_state.carousel_index % len(images)
-            st.image(images[idx], use_container_width=True)
+    with col2:
+        idx = st.session_state.carousel_index % len(images)
+        st.image(images[idx], use_container_width=True)
+    
+    with col3:
+        idx = (st.session_state.carousel_index + 1) % len(images)
+        st.image(images[idx], use_container_width=True)
         
-        with col3:
-            idx = (st.session_state.carousel_index + 1) % len(images)
-            st.image(images[idx], use_container_width=True)
-            
-        with col4:
-            idx = (st.session_state.carousel_index + 2) % len(images)
-            st.image(images[idx], use_container_width=True)
-            
-    except FileNotFoundError:
-        st.error("Image files not found. Please ensure images are in the correct directory.")
+    with col4:
+        idx = (st.session_state.carousel_index + 2) % len(images)
+        st.image(images[idx], use_container_width=True)
             
     with col5:
         if st.button("→"):
@@ -199,6 +283,9 @@ def main():
     # Initialize session state first
     initialize_session_state()
     
+    # Build the model client and graph in the background while the page renders
+    start_assistant()
+    
     # Sidebar for user details
     with st.sidebar:
         st.markdown("### User Details")
@@ -242,11 +329,10 @@ def main():
             key="user_input"
         )
         
-        # Process user input when Enter is pressed
+        # Process user input when Enter is pressed. The new messages are drawn
+        # as they arrive, so no extra rerun is needed (chat_input clears itself)
         if user_input:
             process_user_input(user_input)
-            # Clear the input after processing
-            st.rerun()
     else:
         st.info("Please enter your name and email address in the sidebar to start chatting.")
 
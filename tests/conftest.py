@@ -0,0 +1,114 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+import pytest
+from langchain_core.messages import AIMessage, SystemMessage, ToolMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+# Chat.py copies these into os.environ at import and fails when they are unset
+for name in ("OPENAI_API_KEY", "LANGCHAIN_API_KEY", "LANGCHAIN_PROJECT", "RAPIDAPI_KEY"):
+    os.environ.setdefault(name, "test")
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import Chat  # noqa: E402
+
+# Chat.py switches LangSmith tracing on at import; the tests must not reach the network
+os.environ["LANGCHAIN_TRACING_V2"] = "false"
+
+from rapidapi_stub import StubRapidAPI  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def tls_files(tmp_path_factory):
+    """Self-signed certificate and key for 127.0.0.1"""
+    if shutil.which("openssl") is None:
+        pytest.skip("openssl is needed to create the stub server's certificate")
+    directory = tmp_path_factory.mktemp("tls")
+    certfile, keyfile = str(directory / "cert.pem"), str(directory / "key.pem")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+            "-keyout", keyfile, "-out", certfile, "-subj", "/CN=127.0.0.1",
+            "-addext", "subjectAltName=IP:127.0.0.1",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return certfile, keyfile
+
+
+@pytest.fixture
+def rapidapi_stub(tls_files):
+    """Local HTTPS stand-in for the booking-com15 RapidAPI endpoints"""
+    stub = StubRapidAPI(*tls_files)
+    stub.start()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    """Copy of the package catalog that the lazily built catalog objects are created from"""
+    path = str(tmp_path / "tour_packages.db")
+    shutil.copy(os.path.join(REPO_DIR, "tour_packages.db"), path)
+    package_api = Chat.TourPackageAPI(db_path=path)
+    monkeypatch.setattr(Chat, "get_tour_package_api", lambda: package_api)
+    # The router and the response cache are built from get_tour_package_api
+    factories = (Chat.get_package_router, Chat.get_response_cache)
+    for factory in factories:
+        factory.cache_clear()
+    yield path
+    for factory in factories:
+        factory.cache_clear()
+
+
+class ScriptedModel:
+    """Stand-in for the chat model: searches Dubai packages within any budget the customer stated"""
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        conversation = [message for message in messages if not isinstance(message, SystemMessage)]
+        last = conversation[-1]
+        if isinstance(last, ToolMessage):
+            price = conversation[-2].tool_calls[0]["args"].get("price")
+            total = json.loads(last.content)["total_found"]
+            return AIMessage(f"I found {total} Dubai tours" + (f" under {price}" if price else "") + ".")
+        if "budget" in last.content:
+            return AIMessage("Noted, I'll keep to your budget.")
+
+        args = {"location": "Dubai"}
+        for message in conversation:
+            match = re.search(r"budget is (\d+)", str(message.content))
+            if match:
+                args["price"] = int(match.group(1))
+        return AIMessage("", tool_calls=[{"name": "search_packages", "args": args, "id": f"call_{self.calls}"}])
+
+    async def ainvoke(self, messages):
+        return self.invoke(messages)
+
+
+@pytest.fixture
+def assistant(catalog, monkeypatch):
+    """ask(thread_id, text) -> reply, through the full graph with a scripted model"""
+    model = ScriptedModel()
+    monkeypatch.setattr(Chat, "get_model_with_tools", lambda: model)
+    monkeypatch.setattr(Chat, "create_checkpointer", InMemorySaver)
+    monkeypatch.setattr(Chat.email_outbox, "start", lambda: None)
+    monkeypatch.setattr(Chat, "FAST_PATH_ENABLED", False)
+    monkeypatch.setattr(Chat, "RESPONSE_CACHE_ENABLED", True)
+    graph = Chat.build_travel_assistant()
+
+    def ask(thread_id, text):
+        output = graph.invoke(Chat.turn_input(text), {"configurable": {"thread_id": thread_id}})
+        return output["messages"][-1].content
+
+    ask.model = model
+    return ask
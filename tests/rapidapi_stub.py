@@ -0,0 +1,197 @@
+"""
+Local HTTPS stand-in for the booking-com15 RapidAPI endpoints
+
+Serves searchDestination and searchHotels with deterministic data, keeps
+connections alive (HTTP/1.1) and injects a configurable latency per
+request, so fan-out, pooling, retry and timeout behavior can be tested
+without the network.
+"""
+import json
+import random
+import socket
+import ssl
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import Chat
+
+
+class StubRapidAPI:
+    def __init__(self, certfile: str, keyfile: str):
+        self.certfile = certfile
+        # Seconds to wait before answering, for all requests or per dest_id / query
+        self.latency = 0.0
+        self.latency_for = {}
+        # HTTP status to answer with instead of results, per dest_id
+        self.status_for = {}
+        # city -> dest_ids returned by searchDestination
+        self.destinations = {}
+        self.hotels_per_destination = 20
+
+        self.requests = []
+        self.connections_accepted = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._sockets = set()
+
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        # The TLS handshake runs in the handler thread, not in the accept loop
+        self._server.socket = context.wrap_socket(
+            self._server.socket, server_side=True, do_handshake_on_connect=False
+        )
+        self._server.stub = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self.drop_connections()
+        self._server.server_close()
+
+    def drop_connections(self) -> None:
+        """Close every open connection from the server side, as an idle timeout would"""
+        with self._lock:
+            sockets, self._sockets = list(self._sockets), set()
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def paths(self, path: str):
+        """Query parameters of every request received for `path`"""
+        with self._lock:
+            return [params for request_path, params in self.requests if request_path == path]
+
+    def client(self, **kwargs) -> "Chat.RapidAPIClient":
+        """RapidAPIClient pointed at this server"""
+        return Chat.RapidAPIClient(
+            "127.0.0.1",
+            {"X-RapidAPI-Key": "test"},
+            port=self.port,
+            ssl_context=ssl.create_default_context(cafile=self.certfile),
+            **kwargs
+        )
+
+    def hotel_api(self, tmp_path, max_concurrency: int = 4, timeout: float = 5.0, max_retries: int = 0):
+        """HotelSearchAPI using this server, with caches private to the test"""
+        return Chat.HotelSearchAPI(
+            api_key="test",
+            max_concurrency=max_concurrency,
+            timeout=timeout,
+            client=self.client(
+                pool_size=max_concurrency + 1, timeout=timeout, max_retries=max_retries, backoff=0.01
+            ),
+            destination_cache=Chat.DestinationCache(db_path=str(tmp_path / "destination_cache.db")),
+            result_cache=Chat.HotelResultCache(),
+        )
+
+    def hotels(self, dest_id: str):
+        rng = random.Random(dest_id)
+        return [
+            {
+                "hotel_id": f"{dest_id}-{i}",
+                "accessibilityLabel": f"Hotel {i} in {dest_id}",
+                "property": {
+                    "name": f"Hotel {dest_id}-{i}",
+                    "reviewScore": round(rng.uniform(6.0, 9.8), 1),
+                    "reviewScoreWord": "Good",
+                    "photoUrls": [f"https://img.example/{dest_id}/{i}.jpg"],
+                    "priceBreakdown": {
+                        "grossPrice": {"value": rng.randint(150, 2000)},
+                        "strikethroughPrice": {},
+                    },
+                    "currency": "AED",
+                    "latitude": 25.0,
+                    "longitude": 55.0,
+                    "distanceFromCenter": rng.uniform(0.1, 20.0),
+                },
+            }
+            for i in range(self.hotels_per_destination)
+        ]
+
+    def respond(self, path: str, params):
+        """(status, document) for a request"""
+        if path == "/api/v1/hotels/searchDestination":
+            city = params.get("query", "")
+            return 200, {
+                "status": True,
+                "data": [
+                    {"dest_type": "city" if i == 0 else "district", "dest_id": dest_id, "name": f"{city} {i}"}
+                    for i, dest_id in enumerate(self.destinations.get(city, []))
+                ],
+            }
+        if path == "/api/v1/hotels/searchHotels":
+            dest_id = params.get("dest_id", "")
+            status = self.status_for.get(dest_id)
+            if status:
+                return status, {"status": False, "message": f"HTTP {status}"}
+            return 200, {"status": True, "data": {"hotels": self.hotels(dest_id)}}
+        return 404, {"status": False, "message": "not found"}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        stub = self.server.stub
+        # Headers and body are written separately; without this, Nagle's algorithm
+        # holds the body back until the client's delayed ACK (up to 40 ms)
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            self.request.do_handshake()
+        except (ssl.SSLError, OSError):
+            self.request.close()
+            raise
+        with stub._lock:
+            stub.connections_accepted += 1
+            stub._sockets.add(self.request)
+        super().setup()
+
+    def finish(self):
+        try:
+            super().finish()
+        finally:
+            with self.server.stub._lock:
+                self.server.stub._sockets.discard(self.request)
+
+    def do_GET(self):
+        stub = self.server.stub
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        with stub._lock:
+            stub.requests.append((url.path, params))
+            stub.in_flight += 1
+            stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+        try:
+            delay = stub.latency_for.get(params.get("dest_id") or params.get("query"), stub.latency)
+            if delay:
+                time.sleep(delay)
+            status, document = stub.respond(url.path, params)
+        finally:
+            with stub._lock:
+                stub.in_flight -= 1
+
+        body = json.dumps(document).encode("utf-8")
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            # The client gave up (timeout) and closed the connection
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
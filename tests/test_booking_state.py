@@ -0,0 +1,128 @@
+import asyncio
+import random
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.messages import AIMessage
+from langgraph.graph import END, START, StateGraph
+from langgraph.prebuilt import ToolNode
+
+import Chat
+
+CUSTOMERS = 40
+BOOKINGS_PER_CUSTOMER = 3
+WORKERS = 8
+
+
+@pytest.fixture
+def booking_db(tmp_path, monkeypatch):
+    """Private booking database and an outbox that never sends"""
+    path = str(tmp_path / "BookingInfo.db")
+    Chat.db_manager.register_schema(path, Chat.setup_booking_schema)
+    monkeypatch.setattr(Chat, "BOOKING_DB_PATH", path)
+    outbox = Chat.EmailOutboxWorker(db_path=path)
+    monkeypatch.setattr(outbox, "notify", lambda: None)
+    monkeypatch.setattr(Chat, "email_outbox", outbox)
+    return path
+
+
+@pytest.fixture(scope="module")
+def booking_graph():
+    """The booking tool behind a ToolNode, as in the assistant graph"""
+    graph = StateGraph(Chat.State)
+    graph.add_node("tools", ToolNode([Chat.DB_update_tool]))
+    graph.add_edge(START, "tools")
+    graph.add_edge("tools", END)
+    return graph.compile()
+
+
+def booking_turn(customer: int, booking: int):
+    """Graph input and config of one booking made by one customer's conversation"""
+    args = {
+        "Package_name": f"Package {customer}-{booking}",
+        "Package_id": f"PKG{customer:03d}-{booking}",
+        "Trip_Start_date": f"2026-12-{booking + 1:02d}",
+        "Origin_city": "Mumbai",
+        "Tot_adults": 2,
+        "Tot_children": 0,
+        "Tot_cost": "100000",
+    }
+    state = {
+        "messages": [AIMessage("", tool_calls=[
+            {"name": "write_to_database", "args": args, "id": f"call_{customer}_{booking}"}
+        ])],
+        "user_email": f"customer{customer}@example.com",
+        "user_name": f"Customer {customer}",
+        "user_mobile": f"+91 90000 {customer:05d}",
+    }
+    return state, {"configurable": {"thread_id": f"thread-{customer}"}}
+
+
+def all_turns():
+    turns = [(customer, booking) for customer in range(CUSTOMERS) for booking in range(BOOKINGS_PER_CUSTOMER)]
+    random.Random(14).shuffle(turns)
+    return turns
+
+
+def assert_bookings_belong_to_their_customers(path):
+    conn = sqlite3.connect(path)
+    rows = conn.execute(
+        "SELECT Customer_name, Customer_email, Customer_mobile, Package_id, Booking_key FROM tour_packages"
+    ).fetchall()
+    emails = conn.execute("SELECT recipient, body FROM email_outbox").fetchall()
+    conn.close()
+
+    assert len(rows) == CUSTOMERS * BOOKINGS_PER_CUSTOMER
+    for name, email, mobile, package_id, key in rows:
+        customer = int(package_id[3:6])
+        assert name == f"Customer {customer}"
+        assert email == f"customer{customer}@example.com"
+        assert mobile == f"+91 90000 {customer:05d}"
+        assert key.startswith(f"thread-{customer}|")
+
+    assert len(emails) == CUSTOMERS * BOOKINGS_PER_CUSTOMER
+    for recipient, body in emails:
+        customer = int(recipient[len("customer"):recipient.index("@")])
+        assert f"Customer {customer}" in body
+        assert "Customer " not in body.replace(f"Customer {customer}", "")
+
+
+def test_interleaved_bookings_from_many_threads(booking_db, booking_graph):
+    # Bookings start in waves of WORKERS, so different customers' writes overlap
+    barrier = threading.Barrier(WORKERS)
+
+    def book(turn):
+        state, config = booking_turn(*turn)
+        barrier.wait()
+        return booking_graph.invoke(state, config)
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        outputs = list(pool.map(book, all_turns()))
+
+    assert all(output["messages"][-1].content == "true" for output in outputs)
+    assert_bookings_belong_to_their_customers(booking_db)
+
+
+def test_interleaved_bookings_on_one_event_loop(booking_db, booking_graph):
+    async def book_all():
+        return await asyncio.gather(*(
+            booking_graph.ainvoke(*booking_turn(*turn)) for turn in all_turns()
+        ))
+
+    outputs = asyncio.run(book_all())
+
+    assert all(output["messages"][-1].content == "true" for output in outputs)
+    assert_bookings_belong_to_their_customers(booking_db)
+
+
+def test_retried_booking_is_stored_once(booking_db, booking_graph):
+    state, config = booking_turn(1, 0)
+    booking_graph.invoke(state, config)
+    booking_graph.invoke(state, config)
+
+    conn = sqlite3.connect(booking_db)
+    assert conn.execute("SELECT COUNT(*) FROM tour_packages").fetchone()[0] == 1
+    assert conn.execute("SELECT COUNT(*) FROM email_outbox").fetchone()[0] == 1
+    conn.close()
@@ -0,0 +1,33 @@
+import threading
+
+import Chat
+
+
+def test_schema_setup_of_one_database_does_not_block_another(tmp_path):
+    manager = Chat.SQLiteConnectionManager()
+    slow, fast = str(tmp_path / "slow.db"), str(tmp_path / "fast.db")
+    started, release = threading.Event(), threading.Event()
+
+    def slow_setup(conn):
+        started.set()
+        release.wait(5)
+
+    manager.register_schema(slow, slow_setup)
+    manager.register_schema(fast, lambda conn: conn.execute("CREATE TABLE t (x)"))
+    migrating = threading.Thread(target=manager.initialize, args=(slow,))
+    migrating.start()
+    try:
+        assert started.wait(5)
+        opened = threading.Event()
+
+        def use_fast():
+            with manager.connection(fast) as conn:
+                conn.execute("SELECT * FROM t").fetchall()
+            opened.set()
+
+        threading.Thread(target=use_fast, daemon=True).start()
+        assert opened.wait(2)
+    finally:
+        release.set()
+        migrating.join()
+        manager.close_all()
@@ -0,0 +1,26 @@
+import pytest
+
+import Chat
+
+
+@pytest.fixture
+def assistant(assistant, monkeypatch):
+    monkeypatch.setattr(Chat, "FAST_PATH_ENABLED", True)
+    return assistant
+
+
+def test_opening_filter_request_is_answered_without_the_model(assistant):
+    reply = assistant("a", "Dubai packages under 40k")
+
+    assert assistant.model.calls == 0
+    assert "packages in Dubai under ₹40,000 per person" in reply
+
+
+def test_filter_request_after_stated_constraints_goes_to_the_model(assistant):
+    assistant("a", "my budget is 40000")
+    calls = assistant.model.calls
+
+    reply = assistant("a", "Dubai packages")
+
+    assert assistant.model.calls > calls
+    assert "under 40000" in reply
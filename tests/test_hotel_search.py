@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import pytest
+
+DEST_IDS = ["-1", "-2", "-3", "-4", "-5", "-6"]
+SEARCH = dict(city="Dubai", arrival_date="2026-11-01", departure_date="2026-11-05", adults=2)
+HOTELS_PATH = "/api/v1/hotels/searchHotels"
+
+
+@pytest.fixture
+def stub(rapidapi_stub):
+    rapidapi_stub.destinations["Dubai"] = list(DEST_IDS)
+    return rapidapi_stub
+
+
+def prices(results):
+    return [hotel["price"]["current"] for hotel in results["hotels"]]
+
+
+def test_concurrent_search_matches_serial_search(stub, tmp_path):
+    serial = stub.hotel_api(tmp_path / "serial", max_concurrency=1).search_hotels(**SEARCH)
+    parallel = stub.hotel_api(tmp_path / "parallel", max_concurrency=6).search_hotels(**SEARCH)
+
+    assert parallel == serial
+    assert len(parallel["hotels"]) == len(DEST_IDS) * stub.hotels_per_destination
+    assert prices(parallel) == sorted(prices(parallel))
+    assert "partial" not in parallel
+
+
+def test_destinations_are_searched_in_parallel(stub, tmp_path):
+    stub.latency = 0.2
+    api = stub.hotel_api(tmp_path, max_concurrency=6)
+
+    started = time.monotonic()
+    results = api.search_hotels(**SEARCH)
+    elapsed = time.monotonic() - started
+
+    assert len(results["hotels"]) == len(DEST_IDS) * stub.hotels_per_destination
+    assert stub.max_in_flight == len(DEST_IDS)
+    # Serially: one destination lookup plus six hotel searches, 1.4 s
+    assert elapsed < 0.8
+
+
+def test_concurrency_limit_is_respected(stub, tmp_path):
+    stub.latency = 0.2
+    api = stub.hotel_api(tmp_path, max_concurrency=2)
+
+    started = time.monotonic()
+    api.search_hotels(**SEARCH)
+    elapsed = time.monotonic() - started
+
+    assert stub.max_in_flight == 2
+    assert elapsed >= 0.2 + 3 * 0.2
+
+
+def test_slow_destination_times_out_without_holding_up_the_rest(stub, tmp_path):
+    stub.latency_for["-3"] = 3.0
+    api = stub.hotel_api(tmp_path, max_concurrency=6, timeout=0.3)
+
+    started = time.monotonic()
+    results = api.search_hotels(**SEARCH)
+    elapsed = time.monotonic() - started
+
+    assert results["partial"] is True
+    assert len(results["hotels"]) == 5 * stub.hotels_per_destination
+    assert not any(hotel["hotel_id"].startswith("-3-") for hotel in results["hotels"])
+    assert elapsed < 1.5
+
+
+def test_failed_destination_is_skipped(stub, tmp_path):
+    stub.status_for["-2"] = 500
+    results = stub.hotel_api(tmp_path, max_concurrency=6).search_hotels(**SEARCH)
+
+    assert results["partial"] is True
+    assert len(results["hotels"]) == 5 * stub.hotels_per_destination
+
+
+def test_async_search_matches_sync_search(stub, tmp_path):
+    expected = stub.hotel_api(tmp_path / "sync", max_concurrency=6).search_hotels(**SEARCH)
+
+    stub.latency = 0.2
+    stub.max_in_flight = 0
+    api = stub.hotel_api(tmp_path / "async", max_concurrency=6)
+    started = time.monotonic()
+    results = asyncio.run(api.asearch_hotels(**SEARCH))
+    elapsed = time.monotonic() - started
+
+    assert results == expected
+    assert stub.max_in_flight == len(DEST_IDS)
+    assert elapsed < 0.8
@@ -0,0 +1,115 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import Chat
+
+
+@pytest.fixture(params=["rows", "columnar"])
+def package_api(catalog, request):
+    if request.param == "columnar":
+        pytest.importorskip("numpy")
+    return Chat.TourPackageAPI(db_path=catalog, engine=request.param)
+
+
+def add_package(path, trip_id):
+    conn = sqlite3.connect(path)
+    Chat.load_packages(conn, [{
+        "location": "Dubai", "trip_id": trip_id, "package_name": "Dubai Test Escape", "duration": "4",
+        "cities_included": "Dubai", "price": "10 000", "hotel": "Included", "url": "https://example.com",
+        "itinerary_data": '[{"day_number": 1, "text": "Arrive in Dubai"}]', "destination_type": "Shopping",
+    }])
+    conn.close()
+
+
+def test_itinerary_is_a_point_query_on_the_trip_id_index(package_api, catalog):
+    itinerary = package_api.get_package_itinerary("PKG012780")
+
+    assert itinerary["trip_id"] == "PKG012780"
+    assert itinerary["itinerary"] and all(day["text"] for day in itinerary["itinerary"])
+    assert package_api.get_package_itinerary("PKG000000") is None
+
+    conn = sqlite3.connect(catalog)
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT itinerary_data FROM tour_packages WHERE trip_id = ? ORDER BY id LIMIT 1", ("x",)
+    ).fetchall()
+    conn.close()
+    assert "idx_tour_packages_trip_id" in str(plan)
+
+
+def test_snapshot_does_not_hold_itineraries(package_api):
+    snapshot = package_api.snapshot()
+
+    assert "itinerary_data" not in snapshot.COLUMNS
+    assert not hasattr(snapshot, "itineraries")
+
+
+def test_searches_use_the_current_snapshot_while_it_is_rebuilt(package_api, catalog, monkeypatch):
+    before = package_api.search_packages(location="Dubai")["total_found"]
+    build = package_api._build_snapshot
+
+    def slow_build(version, rows):
+        time.sleep(1.0)
+        return build(version, rows)
+
+    monkeypatch.setattr(package_api, "_build_snapshot", slow_build)
+    add_package(catalog, "PKG999999")
+    rebuild = threading.Thread(target=package_api.snapshot)
+    rebuild.start()
+    time.sleep(0.1)
+
+    started = time.monotonic()
+    during = package_api.search_packages(location="Dubai")["total_found"]
+    assert time.monotonic() - started < 0.5
+    assert during == before
+
+    rebuild.join()
+    assert package_api.search_packages(location="Dubai")["total_found"] == before + 1
+    assert package_api.get_package_itinerary("PKG999999")["itinerary"] == [{"day_number": 1, "text": "Arrive in Dubai"}]
+
+
+@pytest.mark.parametrize("query", ["!!!", "???", "-"])
+def test_query_without_words_is_an_error(package_api, query):
+    results = package_api.search_packages(location="Dubai", query=query)
+
+    assert "error" in results and "packages" not in results
+
+
+def all_pages(package_api, **search):
+    pages, cursor = [], None
+    while True:
+        results = package_api.search_packages(**search, limit=7, cursor=cursor)
+        # Cursors are opaque; engines may encode the same sort key differently (27500 / 27500.0)
+        cursor = results.pop("next_cursor", None)
+        pages.append(results)
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("search", [
+    {"location": "dubai"},
+    {"location": "a", "price": 80000},
+    {"duration": 6, "sort_by": "price_desc"},
+    {"destination_type": "Beach/Island", "sort_by": "duration"},
+    {"duration": 5, "sort_by": "closest_duration"},
+    {"query": "beach"},
+    {"query": "temple", "price": 100000, "sort_by": "price"},
+    {"location": "atlantis"},
+])
+def test_indexed_sql_engine_matches_the_snapshot(catalog, search):
+    sql_api = Chat.TourPackageAPI(db_path=catalog, engine="sql")
+    rows_api = Chat.TourPackageAPI(db_path=catalog, engine="rows")
+    assert isinstance(sql_api.snapshot(), Chat.IndexedCatalog)
+
+    expected = all_pages(rows_api, **search)
+    assert all_pages(sql_api, **search) == expected
+    assert sql_api.list_locations() == rows_api.list_locations()
+
+
+def test_auto_engine_searches_the_database_for_large_catalogs(catalog, monkeypatch):
+    assert type(Chat.TourPackageAPI(db_path=catalog, engine="auto").snapshot()) is Chat.CatalogSnapshot
+
+    monkeypatch.setattr(Chat, "CATALOG_SNAPSHOT_MAX_ROWS", 10)
+    assert isinstance(Chat.TourPackageAPI(db_path=catalog, engine="auto").snapshot(), Chat.IndexedCatalog)
@@ -0,0 +1,64 @@
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+DESTINATION_PATH = "/api/v1/hotels/searchDestination"
+
+
+def test_keep_alive_connection_is_reused(rapidapi_stub):
+    rapidapi_stub.destinations["Dubai"] = ["-1"]
+    client = rapidapi_stub.client()
+
+    for _ in range(5):
+        assert client.get_json(DESTINATION_PATH, {"query": "Dubai"})["status"] is True
+
+    assert len(rapidapi_stub.paths(DESTINATION_PATH)) == 5
+    assert rapidapi_stub.connections_accepted == 1
+
+
+def test_dropped_keep_alive_connection_is_replaced_without_backoff(rapidapi_stub):
+    rapidapi_stub.destinations["Dubai"] = ["-1"]
+    # A counted retry would sleep at least backoff / 2
+    client = rapidapi_stub.client(backoff=5.0, max_retries=1)
+    client.get_json(DESTINATION_PATH, {"query": "Dubai"})
+
+    rapidapi_stub.drop_connections()
+    time.sleep(0.05)
+    started = time.monotonic()
+    assert client.get_json(DESTINATION_PATH, {"query": "Dubai"})["status"] is True
+
+    assert time.monotonic() - started < 1.0
+    assert rapidapi_stub.connections_accepted == 2
+
+
+def test_timeouts_on_reused_connections_count_against_max_retries(rapidapi_stub):
+    rapidapi_stub.destinations["Dubai"] = ["-1"]
+    client = rapidapi_stub.client(pool_size=4, timeout=0.2, max_retries=2, backoff=0.01)
+
+    # Fill the pool with four idle keep-alive connections
+    rapidapi_stub.latency = 0.1
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda _: client.get_json(DESTINATION_PATH, {"query": "Dubai"}), range(4)))
+    assert len(client._idle) == 4
+
+    rapidapi_stub.latency = 1.0
+    started = time.monotonic()
+    with pytest.raises(socket.timeout):
+        client.get_json(DESTINATION_PATH, {"query": "Dubai"})
+    elapsed = time.monotonic() - started
+
+    # The first attempt plus max_retries, not one extra attempt per pooled connection
+    assert len(rapidapi_stub.paths(DESTINATION_PATH)) == 4 + 3
+    assert elapsed < 3 * 0.2 + 0.5
+
+
+def test_server_errors_are_retried_then_raised(rapidapi_stub):
+    rapidapi_stub.status_for["-1"] = 503
+    client = rapidapi_stub.client(max_retries=2, backoff=0.01)
+
+    with pytest.raises(Exception, match="HTTP 503"):
+        client.get_json("/api/v1/hotels/searchHotels", {"dest_id": "-1"})
+
+    assert len(rapidapi_stub.paths("/api/v1/hotels/searchHotels")) == 3
@@ -0,0 +1,83 @@
+import pytest
+from langchain_core.messages import AIMessage, ToolMessage
+
+import Chat
+
+
+def test_opening_question_is_answered_from_cache(assistant):
+    first = assistant("a", "do you have Dubai tours")
+    calls = assistant.model.calls
+
+    assert assistant("b", "do you have any Dubai tours") == first
+    assert assistant.model.calls == calls
+    assert Chat.get_response_cache().stats()["hits"] == 1
+
+
+def test_stated_budget_does_not_leak_into_another_conversation(assistant):
+    assistant("a", "my budget is 40000")
+    assert "under 40000" in assistant("a", "do you have Dubai tours")
+    calls = assistant.model.calls
+
+    reply = assistant("b", "do you have Dubai tours")
+
+    assert "under" not in reply
+    assert assistant.model.calls > calls
+
+
+def test_later_turn_is_not_answered_from_cache(assistant):
+    assistant("a", "do you have Dubai tours")
+    assistant("b", "my budget is 40000")
+
+    assert "under 40000" in assistant("b", "do you have Dubai tours")
+    assert Chat.get_response_cache().stats()["hits"] == 0
+
+
+def search_turn(args):
+    return [AIMessage("", tool_calls=[{"name": "search_packages", "args": args, "id": "call_1"}])]
+
+
+UBUD_UNDER_50K = ("Do you have Bali packages with Ubud visits under 50k", {"location": "Bali", "query": "Ubud", "price": 50000})
+UBUD_LESS_THAN_50000 = ("What Bali tours cost less than 50000 including Ubud", {"location": "Bali", "query": "Ubud", "price": 50000})
+EUROPE_UNDER_2_LAKH = ("Which Europe tours cost under 2 lakh", {"location": "Europe", "price": 200000})
+
+
+@pytest.mark.parametrize("stored, question, hit", [
+    (UBUD_UNDER_50K, "do you have bali packages with ubud visits under 50k?", True),
+    (UBUD_UNDER_50K, "Do you have Bali packages with Ubud visits under 90k", False),
+    (UBUD_UNDER_50K, "Do you have Bali packages with Ubud visits under 5k", False),
+    (UBUD_LESS_THAN_50000, "What Bali tours cost less than 50000 including Ubud?", True),
+    (UBUD_LESS_THAN_50000, "What Bali tours cost more than 50000 including Ubud", False),
+    (EUROPE_UNDER_2_LAKH, "which europe tours cost under 2 lakh?", True),
+    (EUROPE_UNDER_2_LAKH, "Which Europe tours cost over 2 lakh", False),
+])
+def test_amounts_and_price_direction_must_match(catalog, stored, question, hit):
+    cache = Chat.get_response_cache()
+    stored_question, args = stored
+    cache.remember(stored_question, search_turn(args) + [AIMessage("cached answer")])
+    assert cache.stats()["entries"] == 1
+
+    assert (cache.lookup(question) is not None) is hit
+
+
+@pytest.mark.parametrize("question, args, grounded", [
+    ("Dubai tours under 40k", {"location": "Dubai", "price": 40000}, True),
+    ("Dubai tours for 2 lakh", {"location": "Dubai", "price": 200000.0}, True),
+    ("beach packages for a week", {"destination_type": "Beach/Island", "duration": 7}, True),
+    ("Dubai tours", {"location": "Dubai", "limit": 5, "sort_by": "price"}, True),
+    ("Dubai tours", {"location": "Dubai", "price": 40000}, False),
+    ("packages in Bali", {"location": "Dubai"}, False),
+    ("Dubai tours", {"location": "Dubai", "cursor": "WyJhIiwgMSwgMl0="}, False),
+])
+def test_tool_arguments_must_come_from_the_question(question, args, grounded):
+    assert Chat.grounded_in_question(question, search_turn(args)) is grounded
+
+
+def test_trip_id_may_come_from_an_earlier_result_of_the_turn():
+    itinerary_call = AIMessage("", tool_calls=[
+        {"name": "get_package_itinerary", "args": {"trip_id": "PKG012780"}, "id": "call_2"}
+    ])
+    result = ToolMessage(content='{"packages": [{"trip_id": "PKG012780"}]}', name="search_packages", tool_call_id="call_1")
+    question = "itinerary of the cheapest Dubai tour"
+
+    assert Chat.grounded_in_question(question, search_turn({"location": "Dubai"}) + [result, itinerary_call])
+    assert not Chat.grounded_in_question(question, search_turn({"location": "Dubai"}) + [itinerary_call])